@@ -0,0 +1,411 @@
+"""
+契約容量最佳化 JSON API 服務
+
+提供給其他系統 (例如帳務系統) 以 HTTP/JSON 呼叫的計算服務，
+只依賴 utils/calculator.py 與 utils/validators.py，不會匯入 Streamlit
+或 Matplotlib。批次最佳化交給背景工作池處理，工作池滿載時回傳 503。
+
+用法:
+    python api_server.py --port 8000 --workers 4
+
+端點:
+    GET  /health          服務狀態
+    GET  /metrics         各端點與計算階段耗時 (Prometheus 文字格式，加上 ?format=json 為 JSON)
+    POST /calculate       {"capacity": 25, "monthly_demands": [12 個月]}
+    POST /optimize        {"monthly_demands": [12 個月], "current_capacity": 25, "step": 1}
+    POST /batch-optimize  {"capacities": [...], "monthly_demands": [[12 個月], ...], "step": 1}
+
+每個回應都帶有 X-Process-Time 標頭 (毫秒)，JSON 內容也包含 elapsed_ms。
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.cache import cached_find_optimal_capacity
+from utils.calculator import (
+    calculate_annual_fee,
+    calculate_waste_and_penalty,
+    find_optimal_capacity,
+    optimize_portfolio
+)
+from utils import startup
+from utils.instrumentation import RECORDER, metrics_response
+from utils.validators import validate_capacity, validate_monthly_demands, validate_portfolio
+
+logger = logging.getLogger("optipower.api")
+
+# 單次請求內容的上限，避免一次送入過大的批次
+MAX_BODY_BYTES = 32 * 1024 * 1024
+# 單次批次最多列數
+MAX_BATCH_ROWS = 200_000
+
+
+class ApiError(Exception):
+    """回傳給用戶端的錯誤 (含 HTTP 狀態碼)"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_ready(value: Any) -> Any:
+    """將 numpy 陣列與數值轉為可輸出 JSON 的型別 (nan 轉為 null)"""
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, dict):
+        return {str(k): _json_ready(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_ready(v) for v in value]
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+def _require(payload: Dict[str, Any], key: str) -> Any:
+    """取得必要欄位"""
+    if key not in payload:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"缺少欄位: {key}")
+    return payload[key]
+
+
+def _number(value: Any, name: str) -> float:
+    """轉為有限的數值，格式錯誤或為 NaN / Infinity 時回傳 400"""
+    if isinstance(value, bool):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} 必須為數值")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} 必須為數值") from None
+    # json 模組接受 NaN 與 Infinity，需另外排除
+    if not math.isfinite(number):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} 必須為有效數字 (不可為 NaN 或 Infinity)")
+    return number
+
+
+def _checked_demands(payload: Dict[str, Any]) -> list:
+    """檢查 12 個月需量"""
+    demands = _require(payload, "monthly_demands")
+    if not isinstance(demands, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "monthly_demands 必須為 12 個數值的陣列")
+    demands = [_number(d, f"monthly_demands[{idx}]") for idx, d in enumerate(demands)]
+    is_valid, error_msg = validate_monthly_demands(demands)
+    if not is_valid:
+        raise ApiError(HTTPStatus.BAD_REQUEST, error_msg)
+    return demands
+
+
+def _checked_capacity(value: Any, name: str = "capacity") -> float:
+    """檢查契約容量"""
+    capacity = _number(value, name)
+    is_valid, error_msg = validate_capacity(capacity)
+    if not is_valid:
+        raise ApiError(HTTPStatus.BAD_REQUEST, error_msg)
+    return capacity
+
+
+def _checked_step(payload: Dict[str, Any]) -> Optional[float]:
+    """檢查容量級距 (null 表示不限制)"""
+    step = payload.get("step", 1)
+    if step is None:
+        return None
+    step = _number(step, "step")
+    if step <= 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "容量級距必須大於 0")
+    return step
+
+
+def handle_calculate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """計算指定契約容量的年度基本電費、浪費與罰款"""
+    capacity = _checked_capacity(_require(payload, "capacity"))
+    demands = _checked_demands(payload)
+    waste, penalty = calculate_waste_and_penalty(capacity, demands)
+    return {
+        "capacity": capacity,
+        "annual_fee": calculate_annual_fee(capacity, demands),
+        "waste": waste,
+        "penalty": penalty,
+    }
+
+
+def handle_optimize(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """尋找最佳契約容量，提供目前容量時一併回傳可節省金額"""
+    demands = _checked_demands(payload)
+    step = _checked_step(payload)
+
+    try:
+        if step == 1:
+            optimal_capacity, optimal_fee, details = cached_find_optimal_capacity(demands)
+        else:
+            optimal_capacity, optimal_fee, details = find_optimal_capacity(demands, step)
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e)) from None
+
+    result = {
+        "optimal_capacity": optimal_capacity,
+        "optimal_fee": optimal_fee,
+        "waste": details["waste"],
+        "penalty": details["penalty"],
+    }
+
+    if payload.get("current_capacity") is not None:
+        current_capacity = _checked_capacity(payload["current_capacity"], "current_capacity")
+        current_fee = calculate_annual_fee(current_capacity, demands)
+        saved_fee = current_fee - optimal_fee
+        result.update({
+            "current_capacity": current_capacity,
+            "current_fee": current_fee,
+            "saved_fee": saved_fee,
+            "saved_percentage": (saved_fee / current_fee * 100) if current_fee else 0,
+        })
+    return result
+
+
+def _validation_errors(monthly_demands: list, capacities: list) -> Dict[int, str]:
+    """
+    以 validate_portfolio 檢查各列 (與 /optimize 相同的上限與規則)
+
+    格式錯誤 (不是 12 個數值) 的列略過，由 optimize_portfolio 逐列回報。
+
+    Returns:
+        列索引 -> 錯誤訊息
+    """
+    try:
+        demands = np.asarray(monthly_demands, dtype=float)
+        values = np.asarray(capacities, dtype=float)
+        rows = np.arange(len(monthly_demands))
+        well_formed = demands.shape == (len(rows), 12) and values.shape == (len(rows),)
+    except (TypeError, ValueError):
+        well_formed = False
+
+    if not well_formed:
+        demands, values, rows = [], [], []
+        for idx, (row, capacity) in enumerate(zip(monthly_demands, capacities)):
+            try:
+                row_values = np.asarray(row, dtype=float)
+                capacity = float(capacity)
+            except (TypeError, ValueError):
+                continue
+            if row_values.shape == (12,):
+                demands.append(row_values)
+                values.append(capacity)
+                rows.append(idx)
+        demands = np.array(demands).reshape(-1, 12)
+        values = np.array(values, dtype=float)
+
+    report = validate_portfolio(demands, values)
+    return {int(rows[row]): report.error_message(row) for row in np.flatnonzero(~report.valid)}
+
+
+def run_batch(monthly_demands: list, capacities: list, step: Optional[float]) -> Dict[str, Any]:
+    """
+    在工作池中執行批次最佳化 (需為模組層級函數，才能傳給子程序)
+
+    驗證規則與 /optimize 相同，未通過驗證的列結果為 null，錯誤訊息列在 errors 中。
+
+    Returns:
+        可直接輸出 JSON 的結果字典
+    """
+    results = optimize_portfolio(monthly_demands, capacities, step=step)
+    invalid = _validation_errors(monthly_demands, capacities)
+    if invalid:
+        errors = {**results['errors'], **invalid}
+        results['errors'] = {row: errors[row] for row in sorted(errors)}
+        rows = list(invalid)
+        results['valid'][rows] = False
+        for key in ('optimal_capacity', 'optimal_fee', 'current_fee', 'waste', 'penalty', 'savings'):
+            results[key][rows] = np.nan
+    return _json_ready(results)
+
+
+def _parse_batch(payload: Dict[str, Any]) -> Tuple[list, list, Optional[float]]:
+    """檢查批次請求格式 (各列內容的錯誤由 run_batch 逐列回報)"""
+    demands = _require(payload, "monthly_demands")
+    capacities = _require(payload, "capacities")
+    if not isinstance(demands, list) or not isinstance(capacities, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "monthly_demands 與 capacities 必須為陣列")
+    if len(demands) != len(capacities):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "契約容量數量必須與需量資料列數相同")
+    if len(demands) > MAX_BATCH_ROWS:
+        raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"單次批次最多 {MAX_BATCH_ROWS} 列")
+    return demands, capacities, _checked_step(payload)
+
+
+class BatchPool:
+    """
+    批次最佳化的工作池，限制同時等待與執行中的工作數
+
+    名額在批次真正結束時才歸還；等待逾時的批次仍在工作池中執行，
+    會繼續佔用名額，避免同時執行的批次超過上限。
+
+    Args:
+        executor: 執行批次的工作池
+        max_pending: 最多同時等待與執行中的批次數，超過時拒絕新的批次
+        timeout: 等待單一批次結果的秒數，逾時回傳 504
+    """
+
+    def __init__(self, executor: Executor, max_pending: int, timeout: float = 300.0):
+        self.executor = executor
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """執行批次並等待結果，工作池滿載時回傳 503，逾時回傳 504"""
+        demands, capacities, step = _parse_batch(payload)
+        if not self._slots.acquire(blocking=False):
+            raise ApiError(HTTPStatus.SERVICE_UNAVAILABLE, "批次工作已滿，請稍後再試")
+        try:
+            future = self.executor.submit(run_batch, demands, capacities, step)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # 尚未開始的批次直接取消；已在執行的批次結束後才歸還名額
+            future.cancel()
+            raise ApiError(HTTPStatus.GATEWAY_TIMEOUT, "批次計算逾時，請減少列數後再試") from None
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """JSON API 請求處理"""
+
+    server_version = "OptiPowerAPI/1.0"
+    batch_pool: Optional[BatchPool] = None
+
+    def _send_json(self, status: HTTPStatus, body: Dict[str, Any], started: float) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        body = dict(body, elapsed_ms=round(elapsed_ms, 3))
+        data = json.dumps(_json_ready(body), ensure_ascii=False).encode("utf-8")
+        if status != HTTPStatus.NOT_FOUND:
+            RECORDER.record(f"api {self.command} {self.path.partition('?')[0]}", elapsed_ms / 1000)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Process-Time", f"{elapsed_ms:.3f}")
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+        logger.info("%s %s %d %.1fms", self.command, self.path, status, elapsed_ms)
+
+    def _send_metrics(self, query: str) -> None:
+        status, content_type, body = metrics_response(query)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "請求內容過大")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "請求內容必須為 JSON") from None
+        if not isinstance(payload, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "請求內容必須為 JSON 物件")
+        return payload
+
+    def do_GET(self) -> None:
+        started = time.perf_counter()
+        path, _, query = self.path.partition("?")
+        if path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"}, started)
+        elif path == "/metrics":
+            self._send_metrics(query)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "找不到此端點"}, started)
+
+    def do_POST(self) -> None:
+        started = time.perf_counter()
+        routes = {
+            "/calculate": handle_calculate,
+            "/optimize": handle_optimize,
+            "/batch-optimize": self.batch_pool.run if self.batch_pool else None,
+        }
+        handler = routes.get(self.path)
+        try:
+            if handler is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, "找不到此端點")
+            self._send_json(HTTPStatus.OK, handler(self._read_json()), started)
+        except ApiError as e:
+            self._send_json(e.status, {"error": e.message}, started)
+        except Exception as e:
+            logger.exception("未預期的錯誤")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"計算錯誤: {e}"}, started)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """存取紀錄改由 _send_json 輸出 (含處理時間)"""
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8000, workers: int = 0,
+                  max_pending: int = 0, use_threads: bool = False) -> ThreadingHTTPServer:
+    """
+    建立 API 伺服器 (呼叫 serve_forever 開始服務)
+
+    Args:
+        host: 監聽位址
+        port: 監聽埠號 (0 表示自動選擇)
+        workers: 批次工作數，0 表示 CPU 核心數
+        max_pending: 最多同時等待與執行中的批次數，0 表示 workers 的 2 倍
+        use_threads: 以執行緒取代子程序執行批次 (測試或單核環境使用)
+    """
+    workers = workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(workers) if use_threads else ProcessPoolExecutor(workers)
+    handler = type("BoundApiHandler", (ApiHandler,), {
+        "batch_pool": BatchPool(executor, max_pending or workers * 2),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="契約容量最佳化 JSON API 服務")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址 (預設 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="監聽埠號 (預設 8000)")
+    parser.add_argument("--workers", type=int, default=0, help="批次工作數 (預設為 CPU 核心數)")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="最多同時等待與執行中的批次數 (預設為工作數的 2 倍)")
+    parser.add_argument("--threads", action="store_true", help="以執行緒取代子程序執行批次")
+    args = parser.parse_args(argv)
+
+    startup.configure_logging()
+    server = create_server(args.host, args.port, args.workers, args.max_pending, args.threads)
+    logger.info("listening on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.batch_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
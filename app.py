@@ -2,24 +2,28 @@
 契約容量最佳化計算工具
 ✨ 使用 st.form 優化,避免不必要的重新渲染
 """
+import time
+
+from utils import startup
+
+_imports_started = time.perf_counter()
+
+import csv
+import io
 import json
-import streamlit as st
-from utils.sheet_tracker import log_visit, get_stats
-import matplotlib.font_manager as fm
-import matplotlib.pyplot as plt
+import math
 import os
+import streamlit as st
+from utils.sheet_tracker import log_visit
 import warnings
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # 匯入自定義模組
-from utils.calculator import (
-    calculate_annual_fee,
-    calculate_waste_and_penalty,
-    find_optimal_capacity,
-    get_fee_distribution
-)
+# ✨ Matplotlib 與 Google Sheets 相關套件改為需要時才匯入，加快冷啟動
+from utils import instrumentation
+from utils.cache import cached_analyze_capacity
 
 from utils.validators import (
     validate_capacity,
@@ -28,6 +32,9 @@ from utils.validators import (
     format_validation_messages
 )
 from components.sidebar import render_sidebar
+from components.chart import render_chart
+
+startup.record_stage("import app modules", time.perf_counter() - _imports_started)
 
 
 # 頁面設定
@@ -239,18 +246,57 @@ def inject_seo_metadata():
     )
 
 
-def setup_matplotlib_font():
-    """設定 Matplotlib 中文字體"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    font_path = os.path.join(current_dir, 'fonts', 'NotoSansTC-Regular.ttf')
+def _read_interval_upload(uploaded):
+    """解析上傳的 15 分鐘需量檔 (同一個檔案只解析一次)"""
+    cached = st.session_state.get("interval_peaks")
+    if cached and cached[0] == uploaded.file_id:
+        return cached[1]
 
-    if os.path.exists(font_path):
-        fm.fontManager.addfont(font_path)
-        font_prop = fm.FontProperties(fname=font_path)
-        plt.rcParams['font.family'] = font_prop.get_name()
-        plt.rcParams['axes.unicode_minus'] = False
+    from utils.interval_data import read_interval_csv, read_interval_parquet
+
+    data = io.BytesIO(uploaded.getvalue())
+    if uploaded.name.lower().endswith((".parquet", ".pq")):
+        peaks = read_interval_parquet(data)
     else:
-        st.warning("⚠️ 找不到中文字體檔案，圖表可能無法正確顯示中文")
+        peaks = read_interval_csv(io.TextIOWrapper(data, encoding="utf-8-sig", newline=""))
+    st.session_state["interval_peaks"] = (uploaded.file_id, peaks)
+    return peaks
+
+
+def render_interval_upload():
+    """由電表 15 分鐘需量檔自動帶入 12 個月的最高需量"""
+    with st.expander("📂 由智慧電表 15 分鐘需量檔自動帶入（CSV / Parquet）"):
+        uploaded = st.file_uploader(
+            "上傳需量檔",
+            type=["csv", "parquet"],
+            help="欄位需包含 timestamp (時間) 與 demand_kw (需量)，多個電表時加上 meter_id"
+        )
+        if uploaded is None:
+            return
+
+        try:
+            peaks = _read_interval_upload(uploaded)
+            meter = st.selectbox("電表", peaks.meters) if len(peaks.meters) > 1 else None
+            demands = peaks.monthly_demands(meter)
+            incomplete = peaks.incomplete_months(meter)
+        except (ImportError, ValueError, csv.Error) as e:
+            st.error(f"❌ 無法讀取需量檔: {e}")
+            return
+
+        if peaks.negative_rows:
+            st.warning(f"⚠️ 有 {peaks.negative_rows} 筆需量為負數 (資料錯誤或逆送電)，已略過不計")
+        if incomplete:
+            st.warning("⚠️ 以下月份的資料不完整，最高需量可能低於實際值，帶入前請確認：" + "、".join(
+                f"{month} ({ratio:.0%})" for month, ratio in incomplete
+            ))
+        st.caption("最近 12 個月的最高需量：" + "、".join(
+            f"{month}月 {demand:g}" for month, demand in enumerate(demands, start=1)
+        ))
+        if st.button("帶入下方表單"):
+            # 保留一位小數並無條件進位，避免低估最高需量
+            st.session_state["uploaded_demands"] = [
+                max(1.0, math.ceil(round(d * 10, 6)) / 10) for d in demands
+            ]
 
 
 def render_input_section():
@@ -258,6 +304,8 @@ def render_input_section():
     渲染輸入區塊
     ✨ 使用 st.form 包裝,只有提交時才重新渲染
     """
+    render_interval_upload()
+
     # ✨ 使用 form 包裝所有輸入元件
     with st.form("calculation_form"):
         # 契約容量輸入
@@ -273,6 +321,7 @@ def render_input_section():
         st.caption("通常在電費帳單➞最高需量(千瓦)➞經常(尖峰)需量")
 
         monthly_demands = []
+        uploaded_demands = st.session_state.get("uploaded_demands")
         months_per_row = 4
         rows = (12 + months_per_row - 1) // months_per_row
 
@@ -283,14 +332,25 @@ def render_input_section():
                 if month_index >= 12:
                     break
                 with cols[col_idx]:
-                    default_value = max(1, int(current_capacity * 0.8))
-                    demand = st.number_input(
-                        f"{month_index + 1}月",
-                        min_value=1,
-                        value=default_value,
-                        key=f"month_{month_index}",
-                        help=f"{month_index + 1}月的最高需量"
-                    )
+                    # 由需量檔帶入時以檔案的最高需量 (一位小數) 作為預設值
+                    if uploaded_demands:
+                        demand = st.number_input(
+                            f"{month_index + 1}月",
+                            min_value=1.0,
+                            value=uploaded_demands[month_index],
+                            step=0.1,
+                            format="%.1f",
+                            key=f"month_{month_index}",
+                            help=f"{month_index + 1}月的最高需量"
+                        )
+                    else:
+                        demand = st.number_input(
+                            f"{month_index + 1}月",
+                            min_value=1,
+                            value=max(1, int(current_capacity * 0.8)),
+                            key=f"month_{month_index}",
+                            help=f"{month_index + 1}月的最高需量"
+                        )
                     monthly_demands.append(demand)
 
         # ✨ 提交按鈕必須在 form 內部
@@ -375,33 +435,23 @@ def render_intro_section():
     )
 
 
-def render_current_status(current_capacity, monthly_demands):
+def render_current_status(result):
     """渲染目前狀態區塊"""
     try:
-        # 計算目前的年基本電費
-        current_fee = calculate_annual_fee(current_capacity, monthly_demands)
+        st.write(f"## 目前契約容量 {result.current_capacity} 千瓦，一年基本電費總額為：{result.current_fee:.2f} 元")
 
-        st.write(f"## 目前契約容量 {current_capacity} 千瓦，一年基本電費總額為：{current_fee:.2f} 元")
-
-        # 計算浪費與罰款
-        waste_total, penalty_total = calculate_waste_and_penalty(current_capacity, monthly_demands)
-
-        st.write(f"### 🧊 尚未用滿契約容量的浪費金額（年）：{waste_total:.2f} 元")
-        st.write(f"### 🔥 超過契約容量的罰款金額（年）：{penalty_total:.2f} 元")
+        st.write(f"### 🧊 尚未用滿契約容量的浪費金額（年）：{result.current_waste:.2f} 元")
+        st.write(f"### 🔥 超過契約容量的罰款金額（年）：{result.current_penalty:.2f} 元")
         st.write("---")
 
-        return current_fee, waste_total, penalty_total
-
     except Exception as e:
         st.error(f"❌ 計算錯誤: {e}")
-        return None, None, None
 
 
-def render_optimization_results(monthly_demands, current_fee):
+def render_optimization_results(result):
     """渲染最佳化結果區塊"""
     try:
-        # 尋找最佳容量
-        optimal_capacity, optimal_fee, details = find_optimal_capacity(monthly_demands)
+        optimal_capacity = result.optimal_capacity
 
         # 使用 HTML 和 CSS 為最佳容量加上鮮明背景色
         st.markdown(
@@ -423,15 +473,10 @@ def render_optimization_results(monthly_demands, current_fee):
             unsafe_allow_html=True
         )
 
-        st.write(f"### 🌟 最低一年基本電費總額：{optimal_fee:.2f} 元")
-
-        st.write(f"### 🧊 優化後契約容量({optimal_capacity}kW)下的浪費金額（年）：{details['waste']:.2f} 元")
-        st.write(f"### 🔥 優化後契約容量({optimal_capacity}kW)下的罰款金額（年）：{details['penalty']:.2f} 元")
+        st.write(f"### 🌟 最低一年基本電費總額：{result.optimal_fee:.2f} 元")
 
-        # 計算節省金額
-        saved_fee = current_fee - optimal_fee
-        monthly_saved_fee = saved_fee / 12
-        saved_percentage = (saved_fee / current_fee * 100) if current_fee else 0
+        st.write(f"### 🧊 優化後契約容量({optimal_capacity}kW)下的浪費金額（年）：{result.optimal_waste:.2f} 元")
+        st.write(f"### 🔥 優化後契約容量({optimal_capacity}kW)下的罰款金額（年）：{result.optimal_penalty:.2f} 元")
 
         st.markdown(
             f"### 💰 優化後一年可節省金額："
@@ -440,7 +485,7 @@ def render_optimization_results(monthly_demands, current_fee):
             f"text-decoration-color: #000;"
             f"text-decoration-thickness: 3px;"
             f"text-decoration-skip-ink: none;'>"
-            f"{saved_fee:.2f} 元</span>",
+            f"{result.saved_fee:.2f} 元</span>",
             unsafe_allow_html=True
         )
         st.markdown(
@@ -450,7 +495,7 @@ def render_optimization_results(monthly_demands, current_fee):
             f"text-decoration-color: #000;"
             f"text-decoration-thickness: 3px;"
             f"text-decoration-skip-ink: none;'>"
-            f"{monthly_saved_fee:.2f} 元</span>",
+            f"{result.monthly_saved_fee:.2f} 元</span>",
             unsafe_allow_html=True
         )
         st.markdown(
@@ -460,51 +505,59 @@ def render_optimization_results(monthly_demands, current_fee):
             f"text-decoration-color: #000;"
             f"text-decoration-thickness: 3px;"
             f"text-decoration-skip-ink: none;'>"
-            f"{saved_percentage:.1f}%</span>"
+            f"{result.saved_percentage:.1f}%</span>"
             f" 的基本電費",
             unsafe_allow_html=True
         )
 
-        return optimal_capacity, optimal_fee
-
     except Exception as e:
         st.error(f"❌ 最佳化計算錯誤: {e}")
-        return None, None
 
 
-def render_chart(monthly_demands, optimal_capacity, optimal_fee):
-    """渲染圖表"""
-    try:
-        st.write("#### 以下圖表顯示在不同契約容量下的基本電費總額變化")
-
-        # 取得費用分布資料
-        capacities, fees = get_fee_distribution(monthly_demands)
-
-        # 繪製圖表
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.bar(capacities, fees, color='skyblue', label='基本電費')
-        ax.bar(optimal_capacity, optimal_fee, color='orange', label='最佳容量')
-
-        ax.set_xlabel("契約容量(千瓦)")
-        ax.set_ylabel("基本電費總額(元)")
-        ax.set_title("契約容量 vs 一年基本電費總額")
-
-        # 標註最佳容量
-        ax.text(
-            optimal_capacity, optimal_fee,
-            f'{optimal_fee:.2f} 元',
-            ha='center', va='bottom',
-            fontsize=10, color='black'
+@st.fragment
+def render_what_if_panel():
+    """
+    即時試算其他契約容量
+    ✨ 使用 st.fragment,拖動滑桿時只重新執行這個區塊,數值直接從費用曲線查表
+    """
+    result = st.session_state.get("analysis_result")
+    if result is None:
+        return
+
+    st.write("---")
+    st.markdown("### 🎚️ 試算其他契約容量")
+    lowest, highest = int(result.capacities[0]), int(result.capacities[-1])
+    if lowest == highest:
+        # 費用曲線只有一個容量時無法拖動 (slider 的最小值必須小於最大值)
+        what_if = result.what_if(lowest)
+        st.write(
+            f"需量範圍內只有 {lowest} 千瓦一種契約容量可試算："
+            f"一年基本電費總額 {what_if['fee']:,.0f} 元，"
+            f"浪費金額 {what_if['waste']:,.0f} 元，罰款金額 {what_if['penalty']:,.0f} 元"
         )
+        return
+
+    capacity = st.slider(
+        "契約容量（千瓦）",
+        min_value=lowest,
+        max_value=highest,
+        value=min(max(int(result.optimal_capacity), lowest), highest),
+        key="what_if_capacity"
+    )
 
-        # 加入網格
-        ax.grid(axis='y', linestyle='--', alpha=0.5)
-        ax.legend()
-
-        st.pyplot(fig)
+    what_if = result.what_if(capacity)
+    cols = st.columns(3)
+    cols[0].metric(
+        "一年基本電費總額", f"{what_if['fee']:,.0f} 元",
+        delta=f"{what_if['vs_optimal']:+,.0f} 元 (相較最佳容量)", delta_color="inverse"
+    )
+    cols[1].metric("浪費金額（年）", f"{what_if['waste']:,.0f} 元")
+    cols[2].metric("罰款金額（年）", f"{what_if['penalty']:,.0f} 元")
+    st.caption(
+        f"與目前契約容量相比：{what_if['vs_current']:+,.2f} 元／年；"
+        f"再增加 1 千瓦，一年基本電費變化 {what_if['marginal_fee']:+,.2f} 元"
+    )
 
-    except Exception as e:
-        st.error(f"❌ 圖表繪製錯誤: {e}")
 
 def render_faq_section():
     """呈現常見問題與補充說明"""
@@ -514,7 +567,9 @@ def render_faq_section():
         st.write(
             "目前工具聚焦於台電的「低壓電力」、「非時間電價」且採用「非營業用」的方案。"
             "這類用戶通常包含中小型社區大樓、小型社區。"
-            "若您使用的是高壓或時間電價方案，建議改用台電官方工具或諮詢能源顧問。"
+            "低壓時間電價 (經常、半尖峰、週六半尖峰、離峰多種契約容量) 的最佳化目前只提供"
+            "Python 函式庫 (utils/tou_calculator.py)，網頁與 API 尚未支援；"
+            "若您使用的是高壓電價方案，建議改用台電官方工具或諮詢能源顧問。"
         )
 
     with st.expander("Q2. 契約容量調整需要多少時間？"):
@@ -545,50 +600,85 @@ def render_footer():
 
 def main():
     """主程式"""
-    # 設定字體
-    setup_matplotlib_font()
+    startup.configure_logging()
+
+    # 設定 OPTIPOWER_METRICS_PORT 時提供 /metrics (各階段耗時 p50/p95/p99)
+    metrics_port = os.environ.get("OPTIPOWER_METRICS_PORT")
+    if metrics_port:
+        startup.run_once(
+            "metrics_server",
+            lambda: instrumentation.start_metrics_server(int(metrics_port))
+        )
+
+    # ✨ 每個區塊都以 span 計時，重新執行結束時輸出一行各階段耗時
+    # (cProfile 分析只能由伺服器端的環境變數開啟，結果只寫入紀錄與 .prof 檔)
+    with instrumentation.rerun():
+        render_page()
+
+
+def render_page():
+    """依序渲染頁面各區塊"""
+    span = instrumentation.span
 
     # 注入 SEO 資訊 (需在版面主內容前)
-    inject_seo_metadata()
+    with span("inject_seo_metadata"):
+        inject_seo_metadata()
 
     # 記錄訪客 (可選,如果需要的話)
     if "initialized" not in st.session_state:
-        log_visit()
+        with span("log_visit"):
+            log_visit()
         st.session_state["initialized"] = True
 
     # 渲染側邊欄
-    render_sidebar()
+    with span("render_sidebar"):
+        render_sidebar()
 
     # 首屏靜態內容
-    render_intro_section()
+    with span("render_intro_section"):
+        render_intro_section()
 
     # ✨ 渲染輸入區塊 (使用 form,會返回提交狀態)
-    current_capacity, monthly_demands, submitted = render_input_section()
+    with span("render_input_section"):
+        current_capacity, monthly_demands, submitted = render_input_section()
 
     # ✨ 只有當表單提交且驗證通過時才計算和顯示結果
     if submitted and current_capacity is not None:
-        # 渲染目前狀態
-        current_result = render_current_status(current_capacity, monthly_demands)
-        if current_result[0] is None:
+        # ✨ 一次完成所有計算，各區塊共用同一份結果
+        try:
+            with span("cached_analyze_capacity"):
+                result = cached_analyze_capacity(current_capacity, monthly_demands)
+        except Exception as e:
+            st.error(f"❌ 計算錯誤: {e}")
             return
 
-        current_fee, waste_total, penalty_total = current_result
+        # 渲染目前狀態
+        with span("render_current_status"):
+            render_current_status(result)
 
         # 渲染最佳化結果
-        optimal_result = render_optimization_results(monthly_demands, current_fee)
-        if optimal_result[0] is None:
-            return
+        with span("render_optimization_results"):
+            render_optimization_results(result)
 
-        optimal_capacity, optimal_fee = optimal_result
+        # 即時試算 (結果存入 session_state,拖動滑桿時只重跑這個區塊)
+        st.session_state["analysis_result"] = result
+        with span("render_what_if_panel"):
+            render_what_if_panel()
 
         # 渲染圖表
-        render_chart(monthly_demands, optimal_capacity, optimal_fee)
+        with span("render_chart"):
+            render_chart(result)
 
     # FAQ 與補充說明
-    render_faq_section()
+    with span("render_faq_section"):
+        render_faq_section()
 
     # 渲染頁尾
-    render_footer()
+    with span("render_footer"):
+        render_footer()
+
+    # 第一次完成渲染時輸出啟動時間報告
+    startup.mark_first_render()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+"""
+圖表記憶體回歸檢查
+
+以 Streamlit AppTest 無頭執行 app.py，連續送出表單 (每次都是不同的需量，
+快取不會命中)，確認整個頁面流程 (計算、繪圖、結果區塊) 的常駐記憶體
+(RSS) 不會隨送出次數持續增加。訪客統計改用暫存的 SQLite。
+
+前一百多次送出 RSS 會上升 (字型、字形與 numpy / Matplotlib / Streamlit 的
+內部配置)，之後應保持平坦。Matplotlib 的文字尺寸快取以 renderer 為 key，
+每張圖都是新畫布，draw_fee_chart 在超過 TEXT_CACHE_LIMIT 筆時清空。
+計算結果與圖表的共用快取有容量上限 (增加量有界)，預設每次送出後清空，
+只量測其他來源的增加；--keep-caches 保留快取以觀察實際部署的情況。
+tests/test_chart_memory.py 以小尺寸、低解析度與較少的次數執行同一檢查。
+
+用法:
+    python -m benchmarks.chart_memory [--submits 1000] [--dpi 200] [--max-growth-mb 5]
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def current_rss_mb() -> float:
+    """目前的常駐記憶體 (MB)，非 Linux 系統改用峰值記憶體"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run(submits: int = 1000, warmup: int = 150, seed: int = 0,
+        figsize=None, dpi=None, max_demand: int = 200, keep_caches: bool = False):
+    """
+    以 AppTest 連續送出 submits 次表單
+
+    Args:
+        submits: 模擬送出次數
+        warmup: 暖機次數，之後的 RSS 作為比較基準
+        seed: 亂數種子
+        figsize: 圖表尺寸 (英吋)，None 表示與網頁相同
+        dpi: 圖表解析度，None 表示與網頁相同
+        max_demand: 隨機需量的上限 (千瓦)，越小長條越少、繪製越快
+        keep_caches: 是否保留計算結果與圖表的共用快取
+
+    Returns:
+        (暖機後 RSS, 結束時 RSS) 的元組 (MB)
+
+    Raises:
+        RuntimeError: 頁面執行發生例外時
+    """
+    from streamlit.testing.v1 import AppTest
+
+    from components import chart
+    from utils import sheet_tracker
+    from utils.cache import CALCULATION_CACHE, CHART_CACHE
+    from utils.stats_backends import SQLiteBackend
+
+    tmp_dir = tempfile.mkdtemp(prefix="optipower-memory-")
+    sheet_tracker.set_backend(SQLiteBackend(os.path.join(tmp_dir, "stats.sqlite3")))
+    original_size = (chart.CHART_FIGSIZE, chart.CHART_DPI)
+    chart.CHART_FIGSIZE = figsize or chart.CHART_FIGSIZE
+    chart.CHART_DPI = dpi or chart.CHART_DPI
+
+    rng = np.random.default_rng(seed)
+    baseline = None
+    try:
+        at = AppTest.from_file(os.path.join(PROJECT_DIR, "app.py"), default_timeout=120)
+        at.run()
+        for i in range(submits):
+            demands = rng.integers(10, max_demand, 12)
+            at.number_input[0].set_value(int(rng.integers(10, max_demand)))
+            for month_index, demand in enumerate(demands.tolist()):
+                at.number_input(key=f"month_{month_index}").set_value(demand)
+            at.button[0].click()
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            if not keep_caches:
+                CALCULATION_CACHE.clear()
+                CHART_CACHE.clear()
+            if i + 1 == warmup:
+                baseline = current_rss_mb()
+    finally:
+        chart.CHART_FIGSIZE, chart.CHART_DPI = original_size
+    return baseline, current_rss_mb()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="圖表記憶體回歸檢查")
+    parser.add_argument("--submits", type=int, default=1000, help="模擬送出次數")
+    parser.add_argument("--warmup", type=int, default=150, help="暖機次數 (之後才開始比較)")
+    parser.add_argument("--dpi", type=int, default=None, help="圖表解析度 (預設與網頁相同)")
+    parser.add_argument("--keep-caches", action="store_true", help="保留計算結果與圖表的共用快取")
+    parser.add_argument("--max-growth-mb", type=float, default=5.0, help="容許的 RSS 增加量 (MB)")
+    args = parser.parse_args(argv)
+
+    # 與 app.py 相同忽略字型缺字等警告
+    warnings.filterwarnings("ignore")
+
+    warmup = min(args.warmup, args.submits)
+    baseline, final = run(args.submits, warmup, dpi=args.dpi, keep_caches=args.keep_caches)
+    growth = final - baseline
+    print(f"RSS after {warmup} submits: {baseline:.1f} MB, after {args.submits} submits: "
+          f"{final:.1f} MB, growth: {growth:+.1f} MB")
+
+    if growth > args.max_growth_mb:
+        print(f"FAIL: RSS grew more than {args.max_growth_mb} MB")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+原始逐月迴圈版本的電費計算 (效能量測的對照組)
+
+保留最初的純 Python 實作，用來確認改寫後的計算結果與原本完全相同。
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.calculator import BASIC_FEE_NON_SUMMER, BASIC_FEE_SUMMER, SUMMER_MONTHS
+
+
+def calculate_monthly_fee(capacity: float, demand: float, month: int) -> float:
+    """計算單月基本電費"""
+    basic_fee_rate = BASIC_FEE_SUMMER if month in SUMMER_MONTHS else BASIC_FEE_NON_SUMMER
+    excess = demand - capacity
+
+    if excess <= 0:
+        return capacity * basic_fee_rate
+
+    allowed_10_percent = capacity * 0.10
+    if excess <= allowed_10_percent:
+        return capacity * basic_fee_rate + excess * basic_fee_rate * 2
+    return (capacity * basic_fee_rate +
+            allowed_10_percent * basic_fee_rate * 2 +
+            (excess - allowed_10_percent) * basic_fee_rate * 3)
+
+
+def calculate_annual_fee(capacity: float, monthly_demands: List[float]) -> float:
+    """計算年度基本電費總額"""
+    total_fee = 0
+    for month_idx, demand in enumerate(monthly_demands):
+        total_fee += calculate_monthly_fee(capacity, demand, month_idx + 1)
+    return total_fee
+
+
+def calculate_waste_and_penalty(capacity: float, monthly_demands: List[float]) -> Tuple[float, float]:
+    """計算年度浪費金額與罰款金額"""
+    waste_total = 0
+    penalty_total = 0
+
+    for month_idx, demand in enumerate(monthly_demands):
+        month = month_idx + 1
+        rate = BASIC_FEE_SUMMER if month in SUMMER_MONTHS else BASIC_FEE_NON_SUMMER
+        excess = demand - capacity
+
+        if excess <= 0:
+            waste_total += (capacity - demand) * rate
+        else:
+            allowed = capacity * 0.10
+            if excess <= allowed:
+                penalty_total += excess * rate * 2
+            else:
+                penalty_total += allowed * rate * 2 + (excess - allowed) * rate * 3
+
+    return waste_total, penalty_total
+
+
+def get_fee_distribution(monthly_demands: List[float]) -> Tuple[np.ndarray, List[float]]:
+    """以整數容量逐一計算費用分布"""
+    min_demand = max(1, int(min(monthly_demands) * 0.8))
+    max_demand = int(max(monthly_demands) * 1.5)
+    capacities = np.arange(min_demand, max_demand + 1)
+    fees = [calculate_annual_fee(cap, monthly_demands) for cap in capacities]
+    return capacities, fees
+
+
+def find_optimal_capacity(monthly_demands: List[float]) -> Tuple[int, float]:
+    """在 80% ~ 150% 的整數範圍內逐一搜尋最佳契約容量"""
+    capacities, fees = get_fee_distribution(monthly_demands)
+    optimal_idx = int(np.argmin(fees))
+    return int(capacities[optimal_idx]), fees[optimal_idx]
@@ -0,0 +1,305 @@
+"""
+計算模組與頁面流程的效能量測
+
+量測各計算函數在小型 (25 kW)、中型 (500 kW) 與驗證上限 (10,000 kW)
+規模下的耗時、批次最佳化 (1k / 100k 筆) 的耗時，以及透過 Streamlit
+AppTest 以無頭模式執行整個 app.main 的耗時 (訪客統計改用本機 SQLite)。
+同時與原始逐月迴圈版本 (benchmarks/reference.py) 比對計算結果。
+
+用法:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.2
+
+與基準檔比較時，任一項目的中位數耗時超過基準的 (1 + threshold) 倍，
+或計算結果與對照組不一致，都會以結束碼 1 結束。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks import reference
+from utils import calculator
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 典型社區的季節用電型態 (以最高需量為 1)
+SEASONAL_SHAPE = [0.72, 0.70, 0.75, 0.80, 0.88, 0.97, 1.00, 0.99, 0.93, 0.84, 0.76, 0.73]
+SCALES = {"small": 25, "medium": 500, "max": 10000}
+BATCH_SIZES = {"1k": 1_000, "100k": 100_000}
+
+
+def seasonal_profile(peak: float) -> List[float]:
+    """依季節型態產生 12 個月的需量"""
+    return [round(peak * factor, 1) for factor in SEASONAL_SHAPE]
+
+
+def random_profiles(count: int, peak: float, seed: int = 0) -> np.ndarray:
+    """產生 count 組隨機需量 (以季節型態加上 ±20% 擾動)"""
+    rng = np.random.default_rng(seed)
+    noise = rng.uniform(0.8, 1.2, (count, 12))
+    return np.round(np.asarray(SEASONAL_SHAPE) * noise * peak, 1)
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.05) -> Dict[str, float]:
+    """
+    量測單次呼叫的耗時
+
+    先自動決定每輪的呼叫次數 (每輪至少 min_time 秒)，再重複 repeat 輪。
+
+    Returns:
+        每次呼叫的中位數、最小值 (秒) 與每輪呼叫次數
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def calculator_benchmarks(with_reference: bool) -> Dict[str, Dict[str, float]]:
+    """各規模下的計算函數耗時"""
+    results = {}
+    for scale_name, peak in SCALES.items():
+        demands = seasonal_profile(peak)
+        capacity = round(peak * 0.9, 1)
+        cases = {
+            "calculate_monthly_fee": lambda: [
+                calculator.calculate_monthly_fee(capacity, d, m + 1) for m, d in enumerate(demands)
+            ],
+            "calculate_annual_fee": lambda: calculator.calculate_annual_fee(capacity, demands),
+            "calculate_waste_and_penalty": lambda: calculator.calculate_waste_and_penalty(capacity, demands),
+            "find_optimal_capacity": lambda: calculator.find_optimal_capacity(demands),
+            "get_fee_distribution": lambda: calculator.get_fee_distribution(demands),
+            "analyze_capacity": lambda: calculator.analyze_capacity(capacity, demands),
+        }
+        if with_reference:
+            cases["reference.find_optimal_capacity"] = lambda: reference.find_optimal_capacity(demands)
+            cases["reference.get_fee_distribution"] = lambda: reference.get_fee_distribution(demands)
+
+        for name, func in cases.items():
+            repeat = 3 if name.startswith("reference.") else 5
+            results[f"calculator.{name}[{scale_name}]"] = measure(func, repeat=repeat)
+    return results
+
+
+def batch_benchmarks(sizes: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    """批次最佳化耗時"""
+    results = {}
+    for size_name, count in sizes.items():
+        demands = random_profiles(count, SCALES["medium"], seed=1)
+        capacities = np.full(count, float(SCALES["medium"]))
+        repeat = 3 if count >= 100_000 else 5
+        results[f"batch.optimize_portfolio[{size_name}]"] = measure(
+            lambda: calculator.optimize_portfolio(demands, capacities), repeat=repeat, min_time=0
+        )
+    return results
+
+
+def app_benchmarks() -> Dict[str, Dict[str, float]]:
+    """以 Streamlit AppTest 無頭執行整個頁面 (訪客統計改用暫存的 SQLite)"""
+    from streamlit.testing.v1 import AppTest
+
+    from utils import sheet_tracker
+    from utils.cache import CALCULATION_CACHE, CHART_CACHE
+    from utils.stats_backends import SQLiteBackend
+
+    tmp_dir = tempfile.mkdtemp(prefix="optipower-bench-")
+    sheet_tracker.set_backend(SQLiteBackend(os.path.join(tmp_dir, "stats.sqlite3")))
+    app_path = os.path.join(PROJECT_DIR, "app.py")
+
+    def first_render():
+        at = AppTest.from_file(app_path, default_timeout=120)
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    def submit(clear_cache):
+        at = AppTest.from_file(app_path, default_timeout=120)
+        at.run()
+        if clear_cache:
+            CALCULATION_CACHE.clear()
+            CHART_CACHE.clear()
+        at.button[0].click()
+        started = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - started
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return elapsed
+
+    results = {"app.first_render": measure(first_render, repeat=3, min_time=0)}
+    for name, clear_cache in (("app.submit_cold", True), ("app.submit_cached", False)):
+        samples = [submit(clear_cache) for _ in range(3)]
+        results[name] = {
+            "median_s": statistics.median(samples),
+            "min_s": min(samples),
+            "number": 1,
+            "repeat": len(samples),
+        }
+    return results
+
+
+def check_parity(profile_count: int = 40) -> List[str]:
+    """
+    與原始逐月迴圈版本比對計算結果
+
+    費用、浪費、罰款與費用分布必須完全相同；最佳容量在費用完全相同
+    (平坦區段) 時可能選到不同的整數，因此以對照組在該容量的費用是否
+    等於最低費用來判斷。
+
+    Returns:
+        不一致項目的說明列表 (空列表表示全部一致)
+    """
+    failures = []
+    for scale_name, peak in SCALES.items():
+        count = profile_count if peak < 10000 else max(3, profile_count // 10)
+        for idx, row in enumerate(random_profiles(count, peak, seed=2)):
+            demands = row.tolist()
+            capacity = round(peak * 0.9, 1)
+            label = f"{scale_name}#{idx}"
+
+            if calculator.calculate_annual_fee(capacity, demands) != reference.calculate_annual_fee(capacity, demands):
+                failures.append(f"{label}: calculate_annual_fee")
+            if (calculator.calculate_waste_and_penalty(capacity, demands)
+                    != reference.calculate_waste_and_penalty(capacity, demands)):
+                failures.append(f"{label}: calculate_waste_and_penalty")
+            for month, demand in enumerate(demands, start=1):
+                if (calculator.calculate_monthly_fee(capacity, demand, month)
+                        != reference.calculate_monthly_fee(capacity, demand, month)):
+                    failures.append(f"{label}: calculate_monthly_fee[{month}]")
+                    break
+
+            ref_capacities, ref_fees = reference.get_fee_distribution(demands)
+            capacities, fees = calculator.get_fee_distribution(demands)
+            if not np.array_equal(capacities, ref_capacities) or fees != ref_fees:
+                failures.append(f"{label}: get_fee_distribution")
+
+            optimal_capacity, optimal_fee, _ = calculator.find_optimal_capacity(demands)
+            ref_fee_at_optimal = reference.calculate_annual_fee(optimal_capacity, demands)
+            if abs(optimal_fee - min(ref_fees)) > 1e-6 or abs(ref_fee_at_optimal - min(ref_fees)) > 1e-6:
+                failures.append(f"{label}: find_optimal_capacity")
+
+    # 批次結果需與逐筆計算完全相同
+    demands = random_profiles(200, SCALES["medium"], seed=3)
+    capacities = np.full(len(demands), float(SCALES["medium"]))
+    batch = calculator.optimize_portfolio(demands, capacities)
+    for idx, row in enumerate(demands):
+        optimal_capacity, optimal_fee, details = calculator.find_optimal_capacity(row.tolist())
+        if (batch["optimal_capacity"][idx] != optimal_capacity or batch["optimal_fee"][idx] != optimal_fee
+                or batch["waste"][idx] != details["waste"] or batch["penalty"][idx] != details["penalty"]):
+            failures.append(f"batch#{idx}: optimize_portfolio")
+
+    return failures
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+                          threshold: float) -> List[str]:
+    """找出中位數耗時比基準慢超過 threshold 的項目"""
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        ratio = stats["median_s"] / previous["median_s"] if previous["median_s"] else float("inf")
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{name}: {previous['median_s'] * 1000:.3f}ms -> {stats['median_s'] * 1000:.3f}ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OptiPower 效能量測")
+    parser.add_argument("--output", help="結果 JSON 檔路徑 (預設輸出到 stdout)")
+    parser.add_argument("--baseline", help="要比較的基準結果 JSON 檔")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="容許的變慢比例 (預設 0.2，即慢 20%% 以上視為退步)")
+    parser.add_argument("--quick", action="store_true",
+                        help="略過 100k 批次、對照組與頁面量測")
+    parser.add_argument("--skip-app", action="store_true", help="略過 Streamlit 頁面量測")
+    args = parser.parse_args(argv)
+
+    # 與 app.py 相同忽略字型缺字等警告
+    warnings.filterwarnings("ignore")
+
+    results: Dict[str, Dict[str, float]] = {}
+    results.update(calculator_benchmarks(with_reference=not args.quick))
+    results.update(batch_benchmarks({"1k": BATCH_SIZES["1k"]} if args.quick else BATCH_SIZES))
+    if not (args.quick or args.skip_app):
+        results.update(app_benchmarks())
+
+    parity_failures = check_parity(profile_count=10 if args.quick else 40)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+        "parity": {"ok": not parity_failures, "failures": parity_failures},
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, stats in results.items():
+        print(f"{name:60s} {stats['median_s'] * 1000:12.3f} ms", file=sys.stderr)
+
+    exit_code = 0
+    if parity_failures:
+        print(f"FAIL: {len(parity_failures)} parity mismatches", file=sys.stderr)
+        for failure in parity_failures:
+            print(f"  {failure}", file=sys.stderr)
+        exit_code = 1
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"FAIL: {len(regressions)} regressions over {args.threshold:.0%}", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            exit_code = 1
+        else:
+            print(f"OK: no regressions over {args.threshold:.0%}", file=sys.stderr)
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
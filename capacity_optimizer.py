@@ -1,3 +1,297 @@
-# capacity_optimizer.py
+"""
+契約容量最佳化命令列工具
+
+從標準輸入或檔案逐列讀取 CSV / JSONL 格式的目前契約容量與 12 個月
+最高需量，計算最佳契約容量後逐批寫到標準輸出，適合在排程中處理
+所有電表。只依賴 utils/calculator.py，不會匯入 Streamlit、Matplotlib
+或 gspread。
+
+用法:
+    python capacity_optimizer.py meters.csv > result.csv
+    cat meters.jsonl | python capacity_optimizer.py --jobs 4 > result.jsonl
+
+輸入格式:
+    CSV:   標題列需包含 capacity, m1 ~ m12 (可另有 meter_id 欄位)
+    JSONL: {"meter_id": "A01", "capacity": 25, "monthly_demands": [12 個月]}
+           或以 m1 ~ m12 欄位提供需量
+
+輸出欄位依序為 meter_id (輸入沒有時留白)、capacity、optimal_capacity、
+optimal_fee、current_fee、waste、penalty、savings、error，順序與輸入相同。
+無效的列不會中斷處理，只會在 error 欄位記錄原因。
+
+以 `streamlit run capacity_optimizer.py` 執行時仍會啟動網頁介面。
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
 import runpy
-runpy.run_module("app", run_name="__main__")
\ No newline at end of file
+import sys
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+MONTH_COLUMNS = [f"m{month}" for month in range(1, 13)]
+RESULT_COLUMNS = ['optimal_capacity', 'optimal_fee', 'current_fee', 'waste', 'penalty', 'savings']
+FORMATS = ("csv", "jsonl")
+
+# (識別碼, 契約容量, 12 個月需量, 解析錯誤)
+Row = Tuple[Optional[str], Any, Any, Optional[str]]
+
+
+def _detect_format(stream: TextIO, path: str) -> str:
+    """依副檔名判斷格式，標準輸入則看第一個非空白字元是否為 {"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    head = stream.buffer.peek(64)[:64] if hasattr(stream, "buffer") and hasattr(stream.buffer, "peek") else b""
+    return "jsonl" if head.lstrip().startswith(b"{") else "csv"
+
+
+def read_csv_rows(stream: TextIO, id_column: str) -> Iterator[Row]:
+    """
+    逐列讀取 CSV
+
+    Raises:
+        ValueError: 當標題列缺少必要欄位時
+    """
+    reader = csv.DictReader(stream)
+    fields = reader.fieldnames
+    if fields is None:
+        return
+    missing = [column for column in ["capacity"] + MONTH_COLUMNS if column not in fields]
+    if missing:
+        raise ValueError(f"CSV 缺少欄位: {', '.join(missing)}")
+
+    for record in reader:
+        demands = [record.get(column) for column in MONTH_COLUMNS]
+        yield record.get(id_column), record.get("capacity"), demands, None
+
+
+def read_jsonl_rows(stream: TextIO, id_column: str) -> Iterator[Row]:
+    """逐列讀取 JSONL，空白列會略過"""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, None, None, "無法解析 JSON"
+            continue
+        if not isinstance(record, dict):
+            yield None, None, None, "每列必須為 JSON 物件"
+            continue
+
+        identifier = record.get(id_column)
+        identifier = None if identifier is None else str(identifier)
+        demands = record.get("monthly_demands")
+        if demands is None:
+            demands = [record.get(column) for column in MONTH_COLUMNS]
+        yield identifier, record.get("capacity"), demands, None
+
+
+def open_inputs(paths: List[str]) -> List[Tuple[str, TextIO]]:
+    """
+    在輸出任何結果前開啟所有輸入 ("-" 表示標準輸入)
+
+    Raises:
+        OSError: 任一檔案無法開啟時 (已開啟的檔案會先關閉)
+    """
+    streams: List[Tuple[str, TextIO]] = []
+    try:
+        for path in paths:
+            stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+            streams.append((path, stream))
+    except OSError:
+        close_inputs(streams)
+        raise
+    return streams
+
+
+def close_inputs(streams: List[Tuple[str, TextIO]]) -> None:
+    for _, stream in streams:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def iter_rows(streams: List[Tuple[str, TextIO]], input_format: str, id_column: str) -> Iterator[Row]:
+    """依序讀取所有已開啟的輸入"""
+    for path, stream in streams:
+        file_format = _detect_format(stream, path) if input_format == "auto" else input_format
+        reader = read_jsonl_rows if file_format == "jsonl" else read_csv_rows
+        yield from reader(stream, id_column)
+
+
+def _to_number(value: Any) -> Any:
+    """CSV 的空字串視為缺值"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return value
+
+
+def optimize_rows(rows: List[Row], step: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    計算一批資料的最佳化結果 (需為模組層級函數，才能傳給子程序)
+
+    Returns:
+        與輸入順序相同的結果字典列表
+    """
+    from utils.calculator import optimize_portfolio
+
+    demands = [None if row[2] is None else [_to_number(value) for value in row[2]] for row in rows]
+    capacities = [_to_number(row[1]) for row in rows]
+    results = optimize_portfolio(demands, capacities, step=step, chunk_size=max(1, len(rows)))
+
+    output = []
+    for idx, (identifier, capacity, _, parse_error) in enumerate(rows):
+        record: Dict[str, Any] = {'meter_id': identifier, 'capacity': capacity}
+        for key in RESULT_COLUMNS:
+            value = float(results[key][idx])
+            record[key] = None if math.isnan(value) else round(value, 2)
+        record['error'] = parse_error or results['errors'].get(idx)
+        output.append(record)
+    return output
+
+
+def _ordered_map(pool: Any, func: Any, chunks: Iterable[List[Row]], window: int) -> Iterator[Any]:
+    """
+    依輸入順序取得平行計算的結果
+
+    與 Pool.imap 不同，最多只有 window 個批次在等待或計算中，
+    讀取輸入的速度不會超過計算速度，記憶體用量固定。
+    """
+    pending: Deque[Any] = deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(func, (chunk,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _chunks(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultWriter:
+    """
+    逐批寫出結果，CSV 的標題列在第一批結果前才輸出
+
+    輸入一開始就有錯誤 (例如缺少欄位) 時，標準輸出不會留下只有標題列的檔案。
+    """
+
+    def __init__(self, stream: TextIO, output_format: str):
+        self.stream = stream
+        self.output_format = output_format
+        self.columns = ['meter_id', 'capacity'] + RESULT_COLUMNS + ['error']
+        self.csv_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(stream, self.columns, extrasaction="ignore", lineterminator="\n")
+        self._header_written = False
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self.csv_writer is not None and not self._header_written:
+            self.csv_writer.writeheader()
+            self._header_written = True
+        for record in records:
+            if self.csv_writer is not None:
+                self.csv_writer.writerow({k: "" if v is None else v for k, v in record.items()})
+            else:
+                self.stream.write(json.dumps(
+                    {k: record[k] for k in self.columns}, ensure_ascii=False
+                ) + "\n")
+        self.stream.flush()
+
+
+def _parse_step(value: str) -> Optional[float]:
+    if value.lower() == "none":
+        return None
+    step = float(value)
+    if step <= 0:
+        raise argparse.ArgumentTypeError("容量級距必須大於 0")
+    return step
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批次計算最佳契約容量 (CSV / JSONL 串流)")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="輸入檔案，省略或 - 表示標準輸入")
+    parser.add_argument("--format", choices=("auto",) + FORMATS, default="auto", help="輸入格式 (預設依副檔名判斷)")
+    parser.add_argument("--output-format", choices=FORMATS, help="輸出格式 (預設與第一個輸入相同)")
+    parser.add_argument("--step", type=_parse_step, default=1.0, help="容量級距 (千瓦)，none 表示不限制")
+    parser.add_argument("--id-column", default="meter_id", help="原樣帶到輸出的識別欄位 (預設 meter_id)")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="每批次的列數 (預設 1024)")
+    parser.add_argument("--jobs", type=int, default=1, help="使用的程序數，0 表示 CPU 核心數 (預設 1)")
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0:
+        parser.error("批次大小必須大於 0")
+
+    output_format = args.output_format
+    if output_format is None:
+        first = args.inputs[0]
+        if args.format != "auto":
+            output_format = args.format
+        elif first == "-":
+            output_format = _detect_format(sys.stdin, first)
+        else:
+            output_format = "jsonl" if first.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+    try:
+        streams = open_inputs(args.inputs)
+    except OSError as e:
+        print(f"錯誤: 無法開啟輸入檔: {e}", file=sys.stderr)
+        return 2
+
+    jobs = args.jobs or os.cpu_count() or 1
+    chunks = _chunks(iter_rows(streams, args.format, args.id_column), args.chunk_size)
+    writer = ResultWriter(sys.stdout, output_format)
+    total = failed = 0
+
+    pool = None
+    try:
+        if jobs > 1:
+            import multiprocessing
+            from functools import partial
+            pool = multiprocessing.Pool(jobs)
+            results = _ordered_map(pool, partial(optimize_rows, step=args.step), chunks, jobs * 2)
+        else:
+            results = (optimize_rows(chunk, args.step) for chunk in chunks)
+
+        for records in results:
+            writer.write(records)
+            total += len(records)
+            failed += sum(record['error'] is not None for record in records)
+        # 沒有任何資料列時仍輸出 CSV 標題列
+        writer.write([])
+    except ValueError as e:
+        print(f"錯誤: {e}", file=sys.stderr)
+        return 2
+    except BrokenPipeError:
+        # 下游 (例如 head) 提早關閉時安靜結束
+        sys.stderr.close()
+        return 0
+    except OSError as e:
+        print(f"錯誤: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if pool is not None:
+            pool.terminate()
+        close_inputs(streams)
+
+    print(f"完成 {total} 列，{failed} 列無效", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    if "streamlit" in sys.modules:
+        # devcontainer 以 `streamlit run capacity_optimizer.py` 啟動網頁介面
+        runpy.run_module("app", run_name="__main__")
+    else:
+        sys.exit(main())
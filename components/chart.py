@@ -0,0 +1,167 @@
+"""
+費用曲線圖表元件模組
+"""
+import hashlib
+import io
+import os
+
+import numpy as np
+import streamlit as st
+
+from utils import startup
+from utils.cache import CHART_CACHE
+from utils.instrumentation import timed
+
+# 圖表最多顯示的長條數，容量範圍更寬時會先降採樣
+MAX_CHART_BARS = 400
+# 輸出 PNG 的尺寸 (英吋) 與解析度
+CHART_FIGSIZE = (10, 6)
+CHART_DPI = 200
+# Matplotlib 文字尺寸快取的上限 (一張圖約 40 筆)
+TEXT_CACHE_LIMIT = 512
+
+
+def _register_matplotlib_font():
+    """註冊中文字體，回傳是否找到字體檔案"""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    font_path = os.path.join(project_dir, 'fonts', 'NotoSansTC-Regular.ttf')
+
+    if not os.path.exists(font_path):
+        return False
+
+    matplotlib = startup.timed_import("matplotlib")
+    fm = startup.timed_import("matplotlib.font_manager")
+    fm.fontManager.addfont(font_path)
+    font_prop = fm.FontProperties(fname=font_path)
+    matplotlib.rcParams['font.family'] = font_prop.get_name()
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return True
+
+
+@timed()
+def setup_matplotlib_font():
+    """設定 Matplotlib 中文字體 (整個程序只註冊一次)"""
+    if not startup.run_once("matplotlib_font", _register_matplotlib_font):
+        st.warning("⚠️ 找不到中文字體檔案，圖表可能無法正確顯示中文")
+
+
+def downsample_curve(capacities, fees, max_bars=MAX_CHART_BARS):
+    """
+    將過寬的費用曲線降採樣成最多 max_bars 個長條
+
+    每個區段取費用最低的點，保留曲線的谷底形狀。
+
+    Args:
+        capacities: 容量陣列
+        fees: 費用陣列
+        max_bars: 最多長條數
+
+    Returns:
+        (容量陣列, 費用陣列, 長條寬度) 的元組
+    """
+    capacities = np.asarray(capacities)
+    fees = np.asarray(fees)
+    if len(capacities) <= max_bars:
+        return capacities, fees, 0.8
+
+    buckets = np.array_split(np.arange(len(capacities)), max_bars)
+    picked = np.array([bucket[np.argmin(fees[bucket])] for bucket in buckets])
+    width = 0.8 * (capacities[-1] - capacities[0]) / max_bars
+    return capacities[picked], fees[picked], width
+
+
+def chart_cache_key(result):
+    """以費用曲線與最佳解的雜湊值作為圖表快取的 key"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(result.capacities, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(result.fees, dtype=float).tobytes())
+    digest.update(repr((result.optimal_capacity, result.optimal_fee)).encode())
+    return ('chart', digest.hexdigest())
+
+
+def _trim_text_metrics_cache():
+    """
+    Matplotlib 的文字尺寸快取超過 TEXT_CACHE_LIMIT 筆時清空
+
+    快取的 key 含 renderer，每張圖都是新的畫布，畫完後這些項目不會再命中，
+    卻會留到 LRU 額滿 (4096 筆) 才被淘汰，常駐記憶體因此在前幾百次繪圖
+    持續增加。只在超過上限時清空，其他圖表繪製中的快取多半不受影響。
+    這是 Matplotlib 的內部函數，不存在時略過。
+    """
+    text_module = startup.timed_import("matplotlib.text")
+    cache = getattr(text_module, "_get_text_metrics_with_cache_impl", None)
+    if not (hasattr(cache, "cache_info") and hasattr(cache, "cache_clear")):
+        return
+    if cache.cache_info().currsize > TEXT_CACHE_LIMIT:
+        cache.cache_clear()
+
+
+@timed()
+def draw_fee_chart(result, figsize=None, dpi=None):
+    """
+    繪製費用曲線圖並輸出為 PNG 位元組
+
+    直接使用 Figure + Agg 畫布，不經過 pyplot，圖表不會留在
+    pyplot 的全域圖表清單中，繪製完即可被回收；以畫布為 key 的
+    文字尺寸快取超過上限時清空。
+
+    Args:
+        result: 含 capacities、fees、optimal_capacity、optimal_fee 的結果物件
+        figsize: 圖表尺寸 (英吋)，預設為 CHART_FIGSIZE
+        dpi: 輸出解析度，預設為 CHART_DPI
+
+    Returns:
+        PNG 位元組
+    """
+    startup.run_once("matplotlib_font", _register_matplotlib_font)
+    figure_module = startup.timed_import("matplotlib.figure")
+    backend_agg = startup.timed_import("matplotlib.backends.backend_agg")
+
+    optimal_capacity = result.optimal_capacity
+    optimal_fee = result.optimal_fee
+    capacities, fees, width = downsample_curve(result.capacities, result.fees)
+
+    fig = figure_module.Figure(figsize=figsize or CHART_FIGSIZE)
+    backend_agg.FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.bar(capacities, fees, width=width, color='skyblue', label='基本電費')
+    ax.bar(optimal_capacity, optimal_fee, width=width, color='orange', label='最佳容量')
+
+    ax.set_xlabel("契約容量(千瓦)")
+    ax.set_ylabel("基本電費總額(元)")
+    ax.set_title("契約容量 vs 一年基本電費總額")
+
+    # 標註最佳容量
+    ax.text(
+        optimal_capacity, optimal_fee,
+        f'{optimal_fee:.2f} 元',
+        ha='center', va='bottom',
+        fontsize=10, color='black'
+    )
+
+    # 加入網格
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    ax.legend()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi or CHART_DPI, bbox_inches='tight')
+    fig.clear()
+    _trim_text_metrics_cache()
+    return buffer.getvalue()
+
+
+def render_chart(result):
+    """渲染圖表"""
+    try:
+        st.write("#### 以下圖表顯示在不同契約容量下的基本電費總額變化")
+        setup_matplotlib_font()
+
+        # 相同的費用曲線直接使用快取的圖片
+        chart_png = CHART_CACHE.get_or_compute(
+            chart_cache_key(result),
+            lambda: draw_fee_chart(result)
+        )
+        st.image(chart_png, use_container_width=True)
+
+    except Exception as e:
+        st.error(f"❌ 圖表繪製錯誤: {e}")
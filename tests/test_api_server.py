@@ -0,0 +1,135 @@
+"""JSON API 服務的測試"""
+import json
+import threading
+import urllib.error
+import urllib.request
+from http import HTTPStatus
+
+import pytest
+
+import api_server
+
+DEMANDS = [20, 22, 25, 28, 30, 35, 38, 37, 33, 27, 24, 21]
+
+
+@pytest.fixture
+def base_url():
+    server = api_server.create_server(port=0, workers=1, max_pending=1, use_threads=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.RequestHandlerClass.batch_pool.shutdown()
+
+
+def _post(base_url, path, body):
+    # json.dumps 預設會輸出 NaN / Infinity，與 json 模組可解析的內容相同
+    request = urllib.request.Request(base_url + path, data=json.dumps(body).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_calculate(base_url):
+    status, body = _post(base_url, "/calculate", {"capacity": 30, "monthly_demands": DEMANDS})
+    assert status == HTTPStatus.OK
+    assert body["annual_fee"] > 0
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_calculate_rejects_non_finite_capacity(base_url, value):
+    status, body = _post(base_url, "/calculate", {"capacity": value, "monthly_demands": DEMANDS})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "capacity" in body["error"]
+
+
+def test_optimize_rejects_non_finite_demand(base_url):
+    demands = list(DEMANDS)
+    demands[3] = float("nan")
+    status, body = _post(base_url, "/optimize", {"monthly_demands": demands})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "monthly_demands[3]" in body["error"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"monthly_demands": DEMANDS, "current_capacity": float("inf")},
+    {"monthly_demands": DEMANDS, "step": float("nan")},
+])
+def test_optimize_rejects_non_finite_options(base_url, payload):
+    status, body = _post(base_url, "/optimize", payload)
+    assert status == HTTPStatus.BAD_REQUEST
+    field = "current_capacity" if "current_capacity" in payload else "step"
+    assert field in body["error"]
+
+
+def test_batch_reports_non_finite_rows(base_url):
+    status, body = _post(base_url, "/batch-optimize", {
+        "monthly_demands": [DEMANDS, [float("nan")] + DEMANDS[1:], DEMANDS],
+        "capacities": [30, 30, float("inf")],
+    })
+    assert status == HTTPStatus.OK
+    assert body["valid"] == [True, False, False]
+    assert set(body["errors"]) == {"1", "2"}
+
+
+def test_batch_applies_optimize_validation(base_url):
+    status, body = _post(base_url, "/batch-optimize", {
+        "monthly_demands": [DEMANDS, [20000] + DEMANDS[1:], DEMANDS, [-1] + DEMANDS[1:]],
+        "capacities": [30, 30, 20000, 30],
+    })
+    assert status == HTTPStatus.OK
+    assert body["valid"] == [True, False, False, False]
+    assert body["errors"] == {
+        "1": "1月需量過大 (超過 10,000 kW)，請確認輸入是否正確",
+        "2": "契約容量過大 (超過 10,000 kW)，請確認輸入是否正確",
+        "3": "1月需量不能為負數",
+    }
+    assert body["optimal_capacity"][0] is not None
+    assert body["optimal_capacity"][1:] == [None, None, None]
+
+
+def test_batch_validation_skips_malformed_rows():
+    results = api_server.run_batch([DEMANDS, DEMANDS[:11], [20000] + DEMANDS[1:]], [30, 30, 30], 1)
+    assert results["valid"] == [True, False, False]
+    assert results["errors"]["1"] == "必須提供 12 個月的需量資料"
+    assert "超過 10,000 kW" in results["errors"]["2"]
+
+
+def test_batch_timeout_keeps_slot_until_worker_finishes(monkeypatch):
+    finish = threading.Event()
+    started = threading.Event()
+
+    def slow_batch(demands, capacities, step):
+        started.set()
+        finish.wait(5)
+        return {"done": True}
+
+    monkeypatch.setattr(api_server, "run_batch", slow_batch)
+    executor = api_server.ThreadPoolExecutor(2)
+    pool = api_server.BatchPool(executor, max_pending=1, timeout=0.05)
+    payload = {"monthly_demands": [DEMANDS], "capacities": [30]}
+    try:
+        with pytest.raises(api_server.ApiError) as timeout_error:
+            pool.run(payload)
+        assert timeout_error.value.status == HTTPStatus.GATEWAY_TIMEOUT
+        assert started.is_set()
+
+        # 逾時的批次仍在執行，名額尚未歸還
+        with pytest.raises(api_server.ApiError) as busy_error:
+            pool.run(payload)
+        assert busy_error.value.status == HTTPStatus.SERVICE_UNAVAILABLE
+
+        # 批次結束後名額由 done callback 歸還
+        finish.set()
+        pool.timeout = 5
+        for _ in range(100):
+            if pool._slots.acquire(timeout=0.05):
+                pool._slots.release()
+                break
+        assert pool.run(payload) == {"done": True}
+    finally:
+        finish.set()
+        pool.shutdown()
@@ -0,0 +1,43 @@
+"""試算其他契約容量區塊的 AppTest"""
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    # 瀏覽人數改用本機 SQLite，不連線 Google Sheets
+    monkeypatch.setenv("OPTIPOWER_STATS_BACKEND", "sqlite")
+    monkeypatch.setenv("OPTIPOWER_STATS_PATH", str(tmp_path / "stats.db"))
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    return at
+
+
+def _submit(at, capacity, demand):
+    at.number_input[0].set_value(capacity)
+    for month_index in range(12):
+        at.number_input(key=f"month_{month_index}").set_value(demand)
+    at.button[0].click()
+    at.run()
+    assert not at.exception, at.exception
+
+
+def test_what_if_slider(app):
+    _submit(app, 25, 20)
+    slider = app.slider(key="what_if_capacity")
+    assert slider.min < slider.max
+
+    slider.set_value(slider.max)
+    app.run()
+    assert not app.exception, app.exception
+
+
+def test_what_if_single_capacity(app):
+    # 需量皆為 1 時費用曲線只有 1 千瓦一個容量，不能顯示 slider
+    _submit(app, 1, 1)
+    assert len(app.slider) == 0
+    assert any("只有 1 千瓦" in str(markdown.value) for markdown in app.markdown)
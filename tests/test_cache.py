@@ -0,0 +1,80 @@
+"""共用計算結果快取的測試"""
+import dataclasses
+import json
+
+import pytest
+
+from utils import cache, instrumentation
+from utils.cache import LRUCache, make_key
+from utils.tariffs import get_tariff
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    lru = LRUCache(maxsize=4, ttl=10, timer=clock)
+    lru.set("a", 1)
+
+    clock.now = 9.9
+    assert lru.get("a") == 1
+    clock.now = 10.0
+    assert lru.get("a", "missing") == "missing"
+    assert len(lru) == 0
+    assert lru.stats()["expirations"] == 1
+
+
+def test_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # b 成為最久未使用
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_counters():
+    lru = LRUCache(maxsize=1)
+    calls = []
+    for key in ("a", "a", "b", "a"):
+        lru.get_or_compute(key, lambda: calls.append(key) or key)
+
+    assert calls == ["a", "b", "a"]
+    assert lru.stats() == {
+        'hits': 1, 'misses': 3, 'evictions': 2, 'expirations': 0, 'size': 1, 'maxsize': 1,
+    }
+    lru.clear()
+    assert len(lru) == 0 and lru.stats()["hits"] == 1
+
+
+def test_rejects_non_positive_maxsize():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_key_normalizes_inputs_and_includes_tariff_version(monkeypatch):
+    demands = [25] * 12
+    key = make_key("optimal", demands)
+    assert key == make_key("optimal", [25.0] * 12)
+    assert key != make_key("optimal", demands, capacity=30)
+    assert key[1] == get_tariff().version
+
+    new_tariff = dataclasses.replace(get_tariff(), version="test-v2", summer_rate=250.0)
+    monkeypatch.setattr(cache, "get_tariff", lambda: new_tariff)
+    assert make_key("optimal", demands) == ("optimal", "test-v2", None, (25.0,) * 12)
+
+
+def test_stats_are_exported_with_metrics():
+    assert 'optipower_cache_maxsize{cache="calculation"} 1024' in instrumentation.prometheus_text()
+    report = json.loads(instrumentation.json_report())
+    assert report["collectors"]["cache"]["chart"]["maxsize"] == 128
@@ -0,0 +1,141 @@
+"""電費計算模組的測試：單筆的純 Python 路徑必須與向量化引擎逐位元一致"""
+import numpy as np
+import pytest
+
+from benchmarks import reference
+from utils import calculator
+
+
+def _random_cases(count=500, seed=0):
+    rng = np.random.default_rng(seed)
+    for idx in range(count):
+        scale = rng.choice([10, 100, 5000])
+        demands = (rng.random(12) * scale).round(int(rng.integers(0, 4))).tolist()
+        capacity = max(0.5, float(np.round(rng.random() * max(demands) * 1.6, int(rng.integers(0, 3)))))
+        if idx % 3 == 0:
+            capacity = int(max(1, capacity))
+            demands = [int(d) for d in demands]
+        yield capacity, demands
+
+
+def test_scalar_paths_match_matrix_engine():
+    for capacity, demands in _random_cases():
+        assert calculator.calculate_annual_fee(capacity, demands) == \
+            float(calculator.calculate_annual_fees([capacity], demands)[0])
+
+        waste, penalty = calculator.calculate_waste_and_penalty_matrix([capacity], demands)
+        assert calculator.calculate_waste_and_penalty(capacity, demands) == (
+            float(calculator.sum_months(waste)[0]), float(calculator.sum_months(penalty)[0])
+        )
+
+        monthly = [calculator.calculate_monthly_fee(capacity, demand, month)
+                   for month, demand in enumerate(demands, start=1)]
+        assert monthly == calculator.calculate_fee_matrix([capacity], demands)[0].tolist()
+
+
+def test_scalar_paths_match_reference():
+    for capacity, demands in _random_cases(seed=1):
+        assert calculator.calculate_annual_fee(capacity, demands) == \
+            reference.calculate_annual_fee(capacity, demands)
+        assert calculator.calculate_waste_and_penalty(capacity, demands) == \
+            reference.calculate_waste_and_penalty(capacity, demands)
+
+
+def test_scalar_validation():
+    with pytest.raises(ValueError):
+        calculator.calculate_monthly_fee(0, 10, 1)
+    with pytest.raises(ValueError):
+        calculator.calculate_monthly_fee(10, -1, 1)
+    with pytest.raises(ValueError):
+        calculator.calculate_monthly_fee(10, 10, 13)
+    with pytest.raises(ValueError):
+        calculator.calculate_annual_fee(10, [10] * 11)
+    for months in (11, 13):
+        with pytest.raises(ValueError):
+            calculator.calculate_waste_and_penalty(10, [10] * months)
+
+
+def _brute_force_optimum(demands, step):
+    """在 step 的整數倍格點上逐一計算年費，回傳 (最低費用的最小容量, 最低費用)"""
+    grid = np.arange(1, int(np.ceil(max(demands) * 1.2 / step)) + 2) * step
+    fees = calculator.calculate_annual_fees(grid, demands)
+    best = int(np.flatnonzero(fees <= fees.min() + 1e-6)[0])
+    return float(grid[best]), float(fees.min())
+
+
+@pytest.mark.parametrize("step", [0.1, 0.5, 2.5])
+def test_breakpoint_optimizer_matches_brute_force_grid(step):
+    rng = np.random.default_rng(3)
+    terms = calculator.monthly_terms(None)
+    for _ in range(30):
+        demands = np.round(rng.uniform(0, 150, 12), int(rng.integers(0, 3))).tolist()
+        expected_capacity, expected_fee = _brute_force_optimum(demands, step)
+
+        capacity, fee, _ = calculator.find_optimal_capacity(demands, step=step)
+        assert fee == pytest.approx(expected_fee, rel=1e-12)
+        assert capacity == pytest.approx(expected_capacity)
+        assert np.isclose(calculator.candidate_capacities(np.array(demands), step, terms),
+                          expected_capacity).any()
+
+
+def _portfolio(count=23, seed=2):
+    rng = np.random.default_rng(seed)
+    demands = np.round(rng.uniform(0, 150, (count, 12)), int(rng.integers(0, 2)))
+    capacities = np.round(rng.uniform(5, 200, count))
+    return demands, capacities
+
+
+@pytest.mark.parametrize("step", [1, 0.5, None])
+def test_portfolio_matches_single_optimizer(step):
+    demands, capacities = _portfolio()
+    results = calculator.optimize_portfolio(demands, capacities, step=step, chunk_size=5)
+
+    assert results["errors"] == {}
+    for row, (row_demands, capacity) in enumerate(zip(demands.tolist(), capacities.tolist())):
+        optimal, fee, details = calculator.find_optimal_capacity(row_demands, step=step)
+        assert results["optimal_capacity"][row] == optimal
+        assert results["optimal_fee"][row] == pytest.approx(fee, rel=1e-12)
+        assert results["current_fee"][row] == pytest.approx(
+            calculator.calculate_annual_fee(capacity, row_demands), rel=1e-12)
+        assert results["waste"][row] == pytest.approx(details["waste"], abs=1e-6)
+        assert results["penalty"][row] == pytest.approx(details["penalty"], abs=1e-6)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 23, 24, 100])
+def test_portfolio_chunk_size_and_input_type_do_not_change_results(chunk_size):
+    demands, capacities = _portfolio()
+    expected = calculator.optimize_portfolio(demands, capacities, chunk_size=256)
+    from_array = calculator.optimize_portfolio(demands, capacities, chunk_size=chunk_size)
+    from_iterable = calculator.optimize_portfolio(
+        (row for row in demands.tolist()), iter(capacities.tolist()), chunk_size=chunk_size)
+
+    for results in (from_array, from_iterable):
+        for key in ("optimal_capacity", "optimal_fee", "current_fee", "waste", "penalty", "savings"):
+            np.testing.assert_array_equal(results[key], expected[key])
+        assert results["valid"].all()
+
+
+def test_portfolio_records_row_errors_across_chunks():
+    demands, capacities = _portfolio(count=6)
+    rows = demands.tolist()
+    rows[1] = rows[1][:11]
+    rows[3] = ["x"] * 12
+    rows[4][0] = -1
+    capacity_list = capacities.tolist()
+    capacity_list[5] = 0
+
+    results = calculator.optimize_portfolio(rows, capacity_list, chunk_size=4)
+
+    assert sorted(results["errors"]) == [1, 3, 4, 5]
+    assert results["valid"].tolist() == [True, False, True, False, False, False]
+    assert np.isnan(results["optimal_capacity"][[1, 3, 4, 5]]).all()
+    assert results["optimal_capacity"][2] == calculator.find_optimal_capacity(rows[2])[0]
+
+
+@pytest.mark.parametrize("capacity_count", [2, 4])
+def test_portfolio_rejects_length_mismatch(capacity_count):
+    demands, _ = _portfolio(count=3)
+    with pytest.raises(ValueError):
+        calculator.optimize_portfolio(demands, [10] * capacity_count)
+    with pytest.raises(ValueError):
+        calculator.optimize_portfolio(iter(demands.tolist()), [10] * capacity_count)
@@ -0,0 +1,51 @@
+"""契約容量最佳化命令列工具的測試"""
+import capacity_optimizer
+
+HEADER = "meter_id,capacity," + ",".join(capacity_optimizer.MONTH_COLUMNS)
+ROW = "A01,25,20,22,25,28,30,35,38,37,33,27,24,21"
+
+
+def test_optimizes_csv(tmp_path, capsys):
+    path = tmp_path / "meters.csv"
+    path.write_text(f"{HEADER}\n{ROW}\n", encoding="utf-8")
+
+    assert capacity_optimizer.main([str(path)]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("meter_id,capacity,optimal_capacity")
+    assert lines[1].startswith("A01,25,33.0,")
+
+
+def test_missing_input_writes_nothing(tmp_path, capsys):
+    path = tmp_path / "meters.csv"
+    path.write_text(f"{HEADER}\n{ROW}\n", encoding="utf-8")
+
+    assert capacity_optimizer.main([str(path), str(tmp_path / "missing.csv")]) == 2
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "missing.csv" in captured.err
+    assert "Traceback" not in captured.err
+
+
+def test_directory_input_is_reported(tmp_path, capsys):
+    assert capacity_optimizer.main([str(tmp_path)]) == 2
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "錯誤" in captured.err
+
+
+def test_missing_columns_write_no_header(tmp_path, capsys):
+    path = tmp_path / "meters.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+
+    assert capacity_optimizer.main([str(path)]) == 2
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "缺少欄位" in captured.err
+
+
+def test_empty_csv_still_writes_header(tmp_path, capsys):
+    path = tmp_path / "meters.csv"
+    path.write_text("", encoding="utf-8")
+
+    assert capacity_optimizer.main([str(path)]) == 0
+    assert capsys.readouterr().out.startswith("meter_id,capacity,")
@@ -0,0 +1,43 @@
+"""圖表記憶體的測試 (與 benchmarks/chart_memory.py 相同的 AppTest 送出流程，縮小尺寸與次數)"""
+import json
+import subprocess
+import sys
+
+import matplotlib.text
+import pytest
+
+from benchmarks.chart_memory import PROJECT_DIR
+from components import chart
+from utils.calculator import analyze_capacity
+
+# 沒有中文字體時的缺字警告
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+# 暖機 60 次後再送出 100 次，RSS 容許增加的量 (MB)
+MAX_GROWTH_MB = 3.0
+
+
+def test_text_metrics_cache_stays_bounded():
+    cache = matplotlib.text._get_text_metrics_with_cache_impl
+    for demand in range(20, 60):
+        chart.draw_fee_chart(analyze_capacity(demand, [demand] * 12), figsize=(4, 3), dpi=40)
+        assert cache.cache_info().currsize <= chart.TEXT_CACHE_LIMIT
+
+
+# 在獨立的程序中量測，不受其他測試留下的配置影響
+RUN_SCRIPT = """
+import json, warnings
+warnings.filterwarnings("ignore")
+from benchmarks import chart_memory
+print(json.dumps(chart_memory.run(submits=160, warmup=60, figsize=(4, 3), dpi=40, max_demand=40)))
+"""
+
+
+def test_rss_stays_flat_over_app_submits():
+    completed = subprocess.run(
+        [sys.executable, "-c", RUN_SCRIPT], cwd=PROJECT_DIR, capture_output=True, text=True,
+        timeout=600,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    baseline, final = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert final - baseline < MAX_GROWTH_MB
@@ -0,0 +1,54 @@
+"""多年度契約容量調整排程的測試：動態規劃結果與逐一列舉所有容量的結果相同"""
+import numpy as np
+import pytest
+
+from utils.calculator import fee_terms
+from utils.contract_planner import ChangeRules, plan_capacity_changes
+from utils.tariffs import compile_terms
+
+
+def _brute_force_cost(demands, start_month, current_capacity, rules):
+    """在每個整數容量 (含目前容量) 間列舉所有轉移的最低總成本"""
+    months = np.datetime64(start_month, 'M') + np.arange(len(demands))
+    terms = compile_terms(months.astype('datetime64[D]').tolist())
+    grid = np.unique(np.append(np.arange(1, int(demands.max()) + 3, dtype=float), current_capacity))
+    fees = fee_terms(grid[:, np.newaxis], demands, terms)
+
+    costs = np.full(len(grid), np.inf)
+    costs[np.searchsorted(grid, current_capacity)] = 0.0
+    for month_idx in range(len(demands)):
+        transition = np.zeros((len(grid), len(grid)))
+        for i in range(len(grid)):
+            for j in range(len(grid)):
+                if j > i:
+                    transition[i, j] = (rules.change_cost(grid[i], grid[j])
+                                        if month_idx >= rules.lead_time_months else np.inf)
+                elif j < i:
+                    transition[i, j] = rules.decrease_fee
+        costs = (costs[:, np.newaxis] + transition).min(axis=0) + fees[:, month_idx]
+    return costs.min()
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_plan_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n_months = int(rng.integers(3, 18))
+    growth = np.linspace(1, rng.uniform(1, 2.5), n_months)
+    demands = np.round(rng.uniform(10, 40) * growth * rng.uniform(0.7, 1.3, n_months), 1)
+    rules = ChangeRules(float(rng.choice([0, 500, 3000])), float(rng.choice([0, 100, 800])),
+                        int(rng.integers(0, 4)), float(rng.choice([0, 0, 200])))
+    current_capacity = float(rng.integers(5, 50))
+
+    plan = plan_capacity_changes(demands, "2026-03", current_capacity, rules)
+    expected = _brute_force_cost(demands, "2026-03", current_capacity, rules)
+    assert plan.total_cost == pytest.approx(expected, rel=1e-9)
+    assert plan.total_cost <= plan.baseline_cost + 1e-9
+
+
+def test_keeps_current_capacity_when_changes_are_expensive():
+    # 目前容量不在任何轉折點上，仍必須是可選的狀態
+    rules = ChangeRules(increase_fixed_fee=1e9, increase_fee_per_kw=0, decrease_fee=1e9)
+    plan = plan_capacity_changes([20.0] * 12, "2026-01", 33.5, rules, step=None)
+    assert plan.changes == []
+    assert plan.capacities.tolist() == [33.5] * 12
+    assert plan.total_cost == pytest.approx(plan.baseline_cost)
@@ -0,0 +1,63 @@
+"""整數精確計費的測試"""
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from utils.exact_fees import (
+    MICRO_PER_NTD,
+    exact_annual_fees,
+    find_optimal_capacity_exact,
+    round_half_up,
+    to_units,
+)
+from utils.tariffs import get_tariff
+
+
+def _fraction_fee(capacity, demand, month):
+    tariff = get_tariff()
+    rate = Fraction(str(tariff.summer_rate if month in tariff.summer_months else tariff.non_summer_rate))
+    allowance = Fraction(str(tariff.allowance))
+    capacity, demand = Fraction(str(capacity)), Fraction(str(demand))
+    excess = demand - capacity
+    if excess <= 0:
+        return capacity * rate
+    allowed = capacity * allowance
+    if excess <= allowed:
+        return capacity * rate + excess * rate * 2
+    return capacity * rate + allowed * rate * 2 + (excess - allowed) * rate * 3
+
+
+def test_annual_fees_match_fractions():
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        demands = np.round(rng.uniform(0, 400, 12), 1)
+        capacities = np.round(rng.uniform(1, 450, 10), 1)
+        for capacity, fee in zip(capacities, exact_annual_fees(capacities, demands)):
+            expected = sum(_fraction_fee(capacity, demand, month)
+                           for month, demand in enumerate(demands, start=1))
+            assert Fraction(int(fee), MICRO_PER_NTD) == expected
+
+
+@pytest.mark.parametrize("rounding", ["none", "month"])
+@pytest.mark.parametrize("step", [1, 0.5, 2.5])
+def test_optimum_matches_full_grid(rounding, step):
+    rng = np.random.default_rng(4)
+    for trial in range(10):
+        demands = np.round(rng.uniform(0, 200, 12), 1)
+        if trial % 2:
+            # 需量剛好是 1.1 的倍數時 d/1.1 會落在格點上
+            demands = np.round(rng.integers(1, 150, 12) * 1.1, 1)
+        capacity, fee, _ = find_optimal_capacity_exact(demands, step, rounding=rounding)
+
+        grid = np.arange(1, int(250 / step)) * step
+        fees = exact_annual_fees(grid, demands, rounding=rounding)
+        best = int(np.argmin(fees))
+        assert capacity == pytest.approx(grid[best])
+        assert fee == fees[best]
+
+
+def test_unit_conversion_and_rounding():
+    assert to_units([37.25, 0.15, 0.05, 1.04999]).tolist() == [373, 2, 1, 10]
+    assert round_half_up(np.array([1_500_000, 2_499_999, 2_500_000])).tolist() == \
+        [2_000_000, 2_000_000, 3_000_000]
@@ -0,0 +1,29 @@
+"""執行階段計時模組的測試"""
+from utils import instrumentation
+
+
+def test_rerun_records_stages():
+    recorder_before = instrumentation.RECORDER.snapshot().get("test_rerun", {}).get("count", 0)
+    with instrumentation.rerun("test_rerun") as trace:
+        with instrumentation.span("test_stage"):
+            pass
+    assert [name for name, _ in trace.stages] == ["test_stage"]
+    assert trace.seconds is not None
+    assert trace.profile_report is None
+    assert instrumentation.RECORDER.snapshot()["test_rerun"]["count"] == recorder_before + 1
+
+
+def test_profile_files_are_capped(monkeypatch, tmp_path):
+    monkeypatch.setenv(instrumentation.PROFILE_ENV, "1")
+    monkeypatch.setenv(instrumentation.PROFILE_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(instrumentation.PROFILE_KEEP_ENV, "3")
+    (tmp_path / "unrelated.prof").write_text("")
+
+    for _ in range(6):
+        with instrumentation.rerun("test_profile") as trace:
+            sum(range(1000))
+        assert trace.profile_report
+
+    profiles = sorted(path.name for path in tmp_path.glob("optipower-test_profile-*.prof"))
+    assert len(profiles) == 3
+    assert (tmp_path / "unrelated.prof").exists()
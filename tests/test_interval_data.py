@@ -0,0 +1,75 @@
+"""15 分鐘需量資料讀取模組的測試"""
+import csv
+import io
+import os
+
+import numpy as np
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from utils.interval_data import read_interval_csv
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _csv(start: str, end: str, skip_day: str = None) -> io.StringIO:
+    """產生單一電表 start ~ end (不含) 每 15 分鐘一筆的 CSV，可略過某一天"""
+    stamps = np.arange(np.datetime64(start, 'm'), np.datetime64(end, 'm'), 15)
+    lines = ["timestamp,demand_kw"]
+    for idx, stamp in enumerate(stamps):
+        if skip_day and str(stamp).startswith(skip_day):
+            continue
+        lines.append(f"{str(stamp).replace('T', ' ')},{10 + idx % 7}")
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+def test_incomplete_months_lists_partial_months():
+    peaks = read_interval_csv(_csv("2024-01-01", "2025-01-01", skip_day="2024-03-05"))
+    assert len(peaks.monthly_demands()) == 12
+
+    incomplete = peaks.incomplete_months()
+    assert [str(month) for month, _ in incomplete] == ["2024-03"]
+    assert incomplete[0][1] == pytest.approx(30 / 31)
+
+
+def test_complete_year_has_no_incomplete_months():
+    peaks = read_interval_csv(_csv("2024-01-01", "2025-01-01"))
+    assert peaks.incomplete_months() == []
+
+
+def test_oversized_field_raises_csv_error():
+    field_limit = csv.field_size_limit()
+    data = io.StringIO("timestamp,demand_kw\n" + "x" * (field_limit + 1) + ",1\n")
+    with pytest.raises(csv.Error):
+        read_interval_csv(data)
+
+
+def test_negative_readings_are_flagged_and_excluded():
+    data = io.StringIO(
+        "timestamp,demand_kw\n"
+        "2024-01-01 00:00,12.5\n"
+        "2024-01-01 00:15,-80\n"
+        "2024-01-01 00:30,-3\n"
+        "2024-02-01 00:00,-1\n"
+        "2024-02-01 00:15,4\n"
+    )
+    peaks = read_interval_csv(data)
+    assert peaks.negative_rows == 3
+    assert peaks.skipped_rows == 0
+    assert peaks.peaks[0, 0] == 12.5
+    assert peaks.peaks[0, 1] == 4
+    assert peaks.readings[0].tolist() == [1, 1]
+
+
+def test_uploaded_demands_keep_one_decimal(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPTIPOWER_STATS_BACKEND", "sqlite")
+    monkeypatch.setenv("OPTIPOWER_STATS_PATH", str(tmp_path / "stats.db"))
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.session_state["uploaded_demands"] = [20.3] * 11 + [24.7]
+    at.run()
+
+    assert at.number_input(key="month_0").value == pytest.approx(20.3)
+    assert at.number_input(key="month_11").value == pytest.approx(24.7)
+    at.button[0].click()
+    at.run()
+    assert not at.exception, at.exception
@@ -0,0 +1,47 @@
+"""蒙地卡羅穩健契約容量的測試"""
+import numpy as np
+import pytest
+
+from utils.calculator import monthly_terms
+from utils.monte_carlo import (
+    expected_annual_fees,
+    generate_scenarios,
+    robust_optimal_capacity,
+    scenario_annual_fees,
+)
+
+DEMANDS = [20, 22, 25, 28, 30, 35, 38, 37, 33, 27, 24, 21]
+
+
+def test_expected_fees_match_scenario_average():
+    terms = monthly_terms(None)
+    scenarios = generate_scenarios(DEMANDS, 2000, seed=1)
+    for capacity in (20, 31, 38.5, 45):
+        assert expected_annual_fees([capacity], scenarios, terms)[0] == pytest.approx(
+            scenario_annual_fees(capacity, scenarios, terms).mean(), rel=1e-9)
+
+
+@pytest.mark.parametrize("objective", ["expected", "cvar"])
+@pytest.mark.parametrize("step", [1, 2.5])
+def test_result_is_grid_optimum(objective, step):
+    result = robust_optimal_capacity(DEMANDS, n_scenarios=2000, objective=objective, step=step, seed=3)
+    terms = monthly_terms(None)
+    scenarios = generate_scenarios(DEMANDS, 2000, seed=3)
+
+    grid = np.arange(1, 80) * step
+    if objective == "expected":
+        costs = expected_annual_fees(grid, scenarios, terms)
+        best = result.expected_fee
+    else:
+        tail = int(np.ceil(2000 * (1 - result.alpha)))
+        costs = np.array([np.sort(scenario_annual_fees(c, scenarios, terms))[-tail:].mean() for c in grid])
+        best = result.cvar_fee
+
+    assert result.capacity % step == 0
+    assert best == pytest.approx(costs.min(), rel=1e-9)
+
+
+def test_same_seed_is_reproducible():
+    first = robust_optimal_capacity(DEMANDS, n_scenarios=1000, seed=7)
+    second = robust_optimal_capacity(DEMANDS, n_scenarios=1000, seed=7)
+    assert first == second
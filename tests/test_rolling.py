@@ -0,0 +1,28 @@
+"""滾動 12 個月分析的測試"""
+import numpy as np
+import pytest
+
+from utils.calculator import calculate_annual_fee, find_optimal_capacity
+from utils.rolling import rolling_optimal_capacity
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_each_window_matches_single_year_optimum(seed):
+    rng = np.random.default_rng(seed)
+    demands = np.round(rng.uniform(5, 120, 40), 1)
+    # 從 1 月開始，每個區間的月份順序與 1~12 月相同時才能直接比較
+    analysis = rolling_optimal_capacity(demands, "2024-01", current_capacity=60)
+
+    assert len(analysis) == len(demands) - 11
+    for window in range(0, len(analysis), 12):
+        window_demands = demands[window:window + 12].tolist()
+        _, optimal_fee, details = find_optimal_capacity(window_demands)
+        assert analysis.optimal_fees[window] == pytest.approx(optimal_fee, rel=1e-12)
+        assert analysis.wastes[window] == pytest.approx(details["waste"], abs=1e-6)
+        assert analysis.current_fees[window] == pytest.approx(
+            calculate_annual_fee(60, window_demands), rel=1e-12)
+
+
+def test_grid_respects_step():
+    analysis = rolling_optimal_capacity([0.3] * 6 + [12.4] * 18, "2024-01", step=2.5)
+    assert all(capacity % 2.5 == 0 and capacity >= 2.5 for capacity in analysis.optimal_capacities)
@@ -0,0 +1,408 @@
+"""訪客統計 (工作表連線、增量彙總、背景寫入、側邊欄快取) 的測試，以假工作表取代 Google Sheets"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+
+import pytest
+from google.auth.exceptions import RefreshError
+from gspread.exceptions import APIError
+from streamlit.testing.v1 import AppTest
+
+from components import sidebar
+from utils import sheet_tracker
+from utils.cache import LRUCache
+from utils.sheet_tracker import GoogleSheetsBackend, SheetConnection, VisitStats, VisitWriter
+
+
+class FakeResponse:
+    """gspread APIError 需要的最小 HTTP 回應"""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "error", "status": "ERROR"}}
+
+
+class FakeWorksheet:
+    def __init__(self, number):
+        self.number = number
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+class FakeSheet:
+    """以串列保存各列的假工作表，記錄每次讀取的範圍"""
+
+    def __init__(self, rows=()):
+        self.rows = [["日期", "訪客 ID"]] + [list(row) for row in rows]
+        self.requests = []
+        self.appends = []
+        self.failures = 0
+
+    def get(self, a1_range):
+        self.requests.append(a1_range)
+        start_row = int(re.fullmatch(r"A(\d+):A", a1_range).group(1))
+        return [row[:1] for row in self.rows[start_row - 1:]]
+
+    def append_rows(self, rows):
+        """寫入多列，failures 大於 0 時先失敗該次數"""
+        if self.failures:
+            self.failures -= 1
+            raise APIError(FakeResponse(503))
+        self.appends.append(len(rows))
+        self.rows.extend(list(row) for row in rows)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """以假工作表取代整個程序共用的連線"""
+    sheet = FakeSheet()
+    monkeypatch.setattr(sheet_tracker, "_connection", SheetConnection(connect=lambda: sheet))
+    return sheet
+
+
+class FakeConnect:
+    """每次呼叫建立新的假工作表，並記錄握手次數"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return FakeWorksheet(self.calls)
+
+
+def test_single_handshake_is_reused():
+    connect = FakeConnect()
+    connection = SheetConnection(connect=connect)
+
+    sheets = [connection.run(lambda sheet: sheet) for _ in range(5)]
+
+    assert connect.calls == 1
+    assert all(sheet is sheets[0] for sheet in sheets)
+    stats = connection.stats()
+    assert stats["handshakes"] == 1
+    assert stats["reuses"] == 4
+    assert stats["reconnects"] == 0
+
+
+@pytest.mark.parametrize("error", [
+    RefreshError("token revoked"),
+    APIError(FakeResponse(401)),
+])
+def test_reconnects_once_on_auth_error(error):
+    connect = FakeConnect()
+    connection = SheetConnection(connect=connect)
+    seen = []
+
+    def operation(sheet):
+        seen.append(sheet.number)
+        if sheet.number == 1:
+            raise error
+        return "ok"
+
+    assert connection.run(operation) == "ok"
+    assert seen == [1, 2]
+    assert connect.calls == 2
+    assert connection.stats()["reconnects"] == 1
+
+    # 重新連線後繼續使用新的工作表
+    assert connection.run(lambda sheet: sheet.number) == 2
+    assert connect.calls == 2
+
+
+def test_auth_error_after_reconnect_is_raised():
+    connection = SheetConnection(connect=FakeConnect())
+
+    def operation(sheet):
+        raise RefreshError("still revoked")
+
+    with pytest.raises(RefreshError):
+        connection.run(operation)
+    assert connection.stats()["reconnects"] == 1
+
+
+@pytest.mark.parametrize("error", [
+    APIError(FakeResponse(429)),
+    RuntimeError("boom"),
+])
+def test_other_errors_do_not_reconnect(error):
+    connect = FakeConnect()
+    connection = SheetConnection(connect=connect)
+
+    def operation(sheet):
+        raise error
+
+    with pytest.raises(type(error)):
+        connection.run(operation)
+    assert connect.calls == 1
+    assert connection.stats()["reconnects"] == 0
+
+
+def test_concurrent_runs_share_one_handshake():
+    connect = FakeConnect(delay=0.05)
+    connection = SheetConnection(connect=connect)
+    active = 0
+    max_active = 0
+    counter_lock = threading.Lock()
+
+    def operation(sheet):
+        nonlocal active, max_active
+        with counter_lock:
+            active += 1
+            max_active = max(max_active, active)
+        time.sleep(0.001)
+        with counter_lock:
+            active -= 1
+        return sheet
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(connection.run(operation)))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert connect.calls == 1
+    assert len(results) == 20
+    assert all(sheet is results[0] for sheet in results)
+    # RLock 讓同一時間只有一個操作使用工作表
+    assert max_active == 1
+    stats = connection.stats()
+    assert stats["handshakes"] == 1
+    assert stats["reuses"] == 19
+
+
+def test_stats_counters():
+    connection = SheetConnection(connect=FakeConnect(delay=0.01))
+    assert connection.stats() == {
+        "handshakes": 0,
+        "reuses": 0,
+        "reconnects": 0,
+        "last_handshake_seconds": 0.0,
+        "saved_seconds": 0.0,
+    }
+
+    connection.worksheet()
+    connection.worksheet()
+    connection.worksheet()
+    stats = connection.stats()
+    assert stats["handshakes"] == 1
+    assert stats["reuses"] == 2
+    assert stats["last_handshake_seconds"] >= 0.01
+    assert stats["saved_seconds"] == pytest.approx(2 * stats["last_handshake_seconds"])
+
+    connection.reset()
+    connection.worksheet()
+    stats = connection.stats()
+    assert stats["handshakes"] == 2
+    assert stats["reuses"] == 2
+    assert stats["reconnects"] == 0
+
+
+def test_visit_stats_fetches_only_new_rows(sheet):
+    sheet.append_rows([["2025-01-01", "a"], ["2025-01-02", "b"], ["2025-01-02", "c"]])
+    clock = FakeClock()
+    stats = VisitStats(checkpoint_path=None, ttl=60, timer=clock)
+
+    assert stats.counts("2025-01-02") == (2, 3)
+    assert sheet.requests == ["A2:A"]
+
+    # 重新整理間隔內不讀取工作表
+    sheet.append_rows([["2025-01-02", "d"], ["", "e"]])
+    clock.now = 59
+    assert stats.counts("2025-01-02") == (2, 3)
+    assert sheet.requests == ["A2:A"]
+
+    # 之後只讀取新增的列，沒有日期的列只計入總數
+    clock.now = 60
+    assert stats.counts("2025-01-02") == (3, 5)
+    assert sheet.requests == ["A2:A", "A5:A"]
+    assert stats.last_row == 6
+
+
+def test_visit_stats_resumes_from_checkpoint(sheet, tmp_path):
+    path = tmp_path / "checkpoint.json"
+    sheet.append_rows([["2025-01-01", "a"], ["2025-01-01", "b"]])
+    VisitStats(checkpoint_path=str(path)).refresh()
+    assert json.loads(path.read_text(encoding="utf-8"))["last_row"] == 3
+
+    # 重新啟動後由檢查點接續，只讀取之後新增的列
+    sheet.append_rows([["2025-01-02", "c"]])
+    sheet.requests.clear()
+    stats = VisitStats(checkpoint_path=str(path))
+    assert (stats.total, stats.last_row) == (2, 3)
+    assert stats.counts("2025-01-01") == (2, 3)
+    assert stats.counts("2025-01-02") == (1, 3)
+    assert sheet.requests == ["A4:A"]
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"sheet": "OtherSheet", "total": 9, "daily": {}, "last_row": 10}),
+    json.dumps({"sheet": sheet_tracker.SHEET_NAME, "total": 9, "daily": [], "last_row": 10}),
+])
+def test_visit_stats_recounts_on_bad_checkpoint(sheet, tmp_path, content):
+    path = tmp_path / "checkpoint.json"
+    path.write_text(content, encoding="utf-8")
+    sheet.append_rows([["2025-01-01", "a"]])
+
+    stats = VisitStats(checkpoint_path=str(path))
+    assert stats.counts("2025-01-01") == (1, 1)
+    assert sheet.requests == ["A2:A"]
+    assert json.loads(path.read_text(encoding="utf-8"))["last_row"] == 2
+
+
+def _wait_for(condition, timeout=5.0):
+    """等待背景執行緒達成條件"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待背景寫入逾時"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def writer_factory(sheet, tmp_path):
+    """建立寫入假工作表的 VisitWriter，測試結束時停止背景執行緒"""
+    writers = []
+
+    def create(**kwargs):
+        kwargs.setdefault("flush_interval", 0.1)
+        writer = VisitWriter(
+            write_rows=GoogleSheetsBackend(stats=object()).append_visits,
+            spool_path=str(tmp_path / "spool.jsonl"),
+            **kwargs,
+        )
+        writers.append(writer)
+        return writer
+
+    yield create
+    for writer in writers:
+        writer.close()
+
+
+def test_writer_sends_full_batches(sheet, writer_factory):
+    writer = writer_factory(batch_size=3, flush_interval=30)
+    for idx in range(7):
+        writer.submit(["2025-01-01", f"v{idx}"])
+
+    _wait_for(lambda: writer.stats()["written"] == 6)
+    assert sheet.appends == [3, 3]
+
+    # 關閉時不必等到送出間隔，立即送出不足一批的剩餘資料
+    started = time.monotonic()
+    writer.close()
+    assert time.monotonic() - started < 5
+    assert sheet.appends == [3, 3, 1]
+    assert [row[1] for row in sheet.rows[1:]] == [f"v{idx}" for idx in range(7)]
+
+
+def test_writer_sends_partial_batch_after_interval(sheet, writer_factory):
+    writer = writer_factory(batch_size=50)
+    writer.submit(["2025-01-01", "a"])
+    _wait_for(lambda: writer.stats()["written"] == 1)
+    assert sheet.appends == [1]
+
+
+def test_writer_retries_with_exponential_backoff(sheet, writer_factory):
+    sleeps = []
+    writer = writer_factory(batch_size=1, max_retries=3, backoff=0.5, sleep=sleeps.append)
+    sheet.failures = 2
+    writer.submit(["2025-01-01", "a"])
+
+    _wait_for(lambda: writer.stats()["written"] == 1)
+    assert sleeps == [0.5, 1.0]
+    assert sheet.appends == [1]
+    assert writer.stats()["failed_batches"] == 0
+
+
+def test_writer_spools_failed_batch_and_replays_it(sheet, writer_factory, tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    sleeps = []
+    writer = writer_factory(batch_size=2, max_retries=1, sleep=sleeps.append)
+    sheet.failures = 2
+    writer.submit(["2025-01-01", "a"])
+    writer.submit(["2025-01-01", "b"])
+
+    _wait_for(lambda: writer.stats()["failed_batches"] == 1)
+    assert sleeps == [1.0]
+    assert sheet.appends == []
+    assert [json.loads(line) for line in spool_path.read_text(encoding="utf-8").splitlines()] == [
+        ["2025-01-01", "a"], ["2025-01-01", "b"],
+    ]
+
+    # 下一批送出時一併補寫暫存檔中的資料
+    writer.submit(["2025-01-02", "c"])
+    _wait_for(lambda: writer.stats()["written"] == 3)
+    assert sheet.appends == [3]
+    assert [row[1] for row in sheet.rows[1:]] == ["a", "b", "c"]
+    assert not spool_path.exists()
+    assert writer.stats()["spooled"] == 2
+
+
+@pytest.fixture
+def sheets_backend(sheet, monkeypatch, tmp_path):
+    """統計後端與訪客紀錄都改用假工作表，側邊欄使用新的統計快取"""
+    clock = FakeClock()
+    backend = GoogleSheetsBackend(stats=VisitStats(checkpoint_path=None, timer=clock))
+    writer = VisitWriter(write_rows=backend.append_visits, spool_path=str(tmp_path / "spool.jsonl"))
+    monkeypatch.setattr(sheet_tracker, "_backend", backend)
+    monkeypatch.setattr(sheet_tracker, "_visit_writer", writer)
+    monkeypatch.setattr(sidebar, "_STATS_CACHE", LRUCache(
+        maxsize=1, ttl=sheet_tracker.STATS_REFRESH_SECONDS, timer=clock
+    ))
+    yield clock
+    writer.close()
+
+
+def test_sidebar_reads_stats_once_per_refresh_interval(sheet, sheets_backend):
+    clock = sheets_backend
+    today = date.today().isoformat()
+    sheet.append_rows([[today, "a"], ["2025-01-01", "b"]])
+
+    assert sidebar._visitor_counts() == (1, 2)
+    sheet.append_rows([[today, "c"]])
+    assert sidebar._visitor_counts() == (1, 2)
+    assert sheet.requests == ["A2:A"]
+
+    clock.now = sheet_tracker.STATS_REFRESH_SECONDS
+    assert sidebar._visitor_counts() == (2, 3)
+    assert sheet.requests == ["A2:A", "A4:A"]
+
+
+def test_app_reruns_reuse_sidebar_and_stats(sheet, sheets_backend):
+    sheet.append_rows([[date.today().isoformat(), "a"]])
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    intro = sidebar.sidebar_intro_markdown.cache_info()
+
+    at.run()
+    at.run()
+    assert not at.exception, at.exception
+    assert "🔢 今日瀏覽次數：1" in [element.value for element in at.sidebar.markdown]
+    # 重新執行不再讀取工作表，也不重新組合說明文字
+    assert sheet.requests == ["A2:A"]
+    assert sidebar.sidebar_intro_markdown.cache_info().hits == intro.hits + 2
+    assert sidebar.sidebar_intro_markdown.cache_info().misses == intro.misses
+
+    # 同一個工作階段只記錄一次訪客
+    sheet_tracker._visit_writer.close()
+    assert len(sheet.rows) == 3
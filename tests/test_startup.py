@@ -0,0 +1,47 @@
+"""程序啟動模組的測試"""
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import startup
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def project_logger(monkeypatch):
+    """還原 optipower logger 的設定與 configure_logging 的狀態"""
+    logger = logging.getLogger("optipower")
+    monkeypatch.setattr(logger, "handlers", [])
+    monkeypatch.setattr(logger, "level", logger.level)
+    monkeypatch.setattr(startup, "_log_handler", None)
+    return logger
+
+
+def test_import_has_no_logging_side_effects():
+    code = ("import logging, utils.startup; logger = logging.getLogger('optipower'); "
+            "print(len(logger.handlers), logger.propagate)")
+    output = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.split() == ["0", "True"]
+
+
+def test_configure_logging_adds_one_handler_without_root_handlers(project_logger, monkeypatch):
+    monkeypatch.setattr(logging.getLogger(), "handlers", [])
+    startup.configure_logging()
+    startup.configure_logging()
+
+    assert len(project_logger.handlers) == 1
+    assert project_logger.level == logging.INFO
+    assert project_logger.propagate
+
+
+def test_configure_logging_defers_to_host_root_handler(project_logger, monkeypatch):
+    monkeypatch.setattr(logging.getLogger(), "handlers", [logging.NullHandler()])
+    startup.configure_logging(logging.DEBUG)
+
+    assert project_logger.handlers == []
+    assert project_logger.level == logging.DEBUG
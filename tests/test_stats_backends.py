@@ -0,0 +1,52 @@
+"""訪客統計後端的測試"""
+import pytest
+
+from utils.stats_backends import JsonFileBackend, SQLiteBackend, StatsBackend
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        StatsBackend()
+
+    class CountsOnly(StatsBackend):
+        def counts(self, day=None):
+            return 0, 0
+
+    with pytest.raises(TypeError):
+        CountsOnly()
+
+
+class MemoryBackend(StatsBackend):
+    def __init__(self):
+        self.rows = []
+
+    def append_visits(self, rows):
+        self.rows.extend(rows)
+
+    def counts(self, day=None):
+        return sum(row[0] == day for row in self.rows), len(self.rows)
+
+
+def test_subclass_gets_sync_defaults():
+    backend = MemoryBackend()
+    backend.append_visits([["2025-01-01", "a"]])
+    assert backend.counts("2025-01-01") == (1, 1)
+    assert backend.unsynced_visits() == []
+    backend.mark_synced([])
+
+
+@pytest.mark.parametrize("factory", [
+    lambda path: JsonFileBackend(str(path / "stats.json"), keep_unsynced=True),
+    lambda path: SQLiteBackend(str(path / "stats.sqlite3")),
+])
+def test_local_backends(tmp_path, factory):
+    backend = factory(tmp_path)
+    backend.append_visits([["2025-01-01", "a"], ["2025-01-01", "b"], ["2025-01-02", "c"]])
+
+    assert backend.counts("2025-01-01") == (2, 3)
+    assert backend.counts("2025-01-03") == (0, 3)
+
+    unsynced = backend.unsynced_visits()
+    assert [list(row) for _, row in unsynced] == [["2025-01-01", "a"], ["2025-01-01", "b"], ["2025-01-02", "c"]]
+    backend.mark_synced([key for key, _ in unsynced[:2]])
+    assert [list(row) for _, row in backend.unsynced_visits()] == [["2025-01-02", "c"]]
@@ -0,0 +1,84 @@
+"""費率登錄模組的測試：登錄第二個版本後的生效日查詢與跨版本計費"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from utils import tariffs
+from utils.cache import make_key
+from utils.calculator import calculate_annual_fee, calculate_period_fee
+from utils.tariffs import LV_DEMAND_NON_TOU, Tariff, TariffRegistry
+
+CHANGE_DATE = date(2025, 10, 1)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """含兩個版本的費率登錄表，並取代模組層級的登錄表"""
+    registry = TariffRegistry()
+    old = registry.register(tariffs.get_tariff())
+    new = registry.register(Tariff(
+        tariff_type=LV_DEMAND_NON_TOU,
+        effective_date=CHANGE_DATE,
+        version="lv-demand-non-tou-test-v2",
+        summer_rate=250.0,
+        non_summer_rate=190.0,
+    ))
+    monkeypatch.setattr(tariffs, "TARIFF_REGISTRY", registry)
+    return registry, old, new
+
+
+def test_lookup_switches_on_effective_date(registry):
+    registry, old, new = registry
+    assert registry.get(on=date(2025, 9, 30)) is old
+    assert registry.get(on=CHANGE_DATE) is new
+    assert registry.get(on=date(2030, 1, 1)) is new
+    assert [t.version for t in registry.versions()] == [old.version, new.version]
+
+
+def test_register_rejects_duplicates(registry):
+    registry, old, _ = registry
+    with pytest.raises(ValueError):
+        registry.register(Tariff(LV_DEMAND_NON_TOU, CHANGE_DATE, "other", 1.0, 1.0))
+    with pytest.raises(ValueError):
+        registry.register(Tariff(LV_DEMAND_NON_TOU, date(2020, 1, 1), old.version, 1.0, 1.0))
+    with pytest.raises(ValueError):
+        registry.get("unknown-type")
+
+
+def test_period_spanning_change_uses_both_rates(registry):
+    _, old, new = registry
+    months = [date(2025, month, 1) for month in range(4, 13)] + [date(2026, month, 1) for month in range(1, 4)]
+    terms = tariffs.compile_terms(months)
+
+    expected = [old.monthly_rates[d.month - 1] if d < CHANGE_DATE else new.monthly_rates[d.month - 1]
+                for d in months]
+    np.testing.assert_array_equal(terms.rates, expected)
+
+    # 需量不超約時每月費用即為費率 × 容量
+    total, fees = calculate_period_fee(10, [5] * 12, months)
+    np.testing.assert_allclose(fees, np.array(expected) * 10)
+    assert total == pytest.approx(sum(expected) * 10)
+    assert calculate_annual_fee(10, [5] * 12, old) < total < calculate_annual_fee(10, [5] * 12, new)
+
+
+def test_period_before_first_version_is_rejected(registry):
+    _, _, new = registry
+    only_new = TariffRegistry()
+    only_new.register(new)
+    with pytest.raises(ValueError):
+        only_new.compile_terms([date(2025, 9, 1), date(2025, 10, 1)])
+
+
+def test_cache_key_follows_tariff_version(registry, monkeypatch):
+    _, old, new = registry
+    demands = [30] * 12
+
+    monkeypatch.setattr(tariffs, "_today", lambda: date(2025, 9, 30))
+    before = make_key("optimal", demands)
+    monkeypatch.setattr(tariffs, "_today", lambda: CHANGE_DATE)
+    after = make_key("optimal", demands)
+
+    assert before[1] == old.version
+    assert after[1] == new.version
+    assert before != after
@@ -0,0 +1,114 @@
+"""時間電價最佳化模組的測試"""
+import itertools
+
+import numpy as np
+import pytest
+
+from utils.tou_calculator import (
+    LV_TOU_TARIFF,
+    TOU_PERIODS,
+    TOUTariff,
+    _dual_simplex,
+    calculate_tou_annual_fee,
+    calculate_tou_fee_matrix,
+    find_optimal_tou_capacities,
+)
+
+
+def _brute_force(demands, step=1, max_units=11):
+    """列舉 step 倍數的所有契約容量組合 (經常契約至少 1 格)，回傳最低年度費用"""
+    grid = np.array([units for units in itertools.product(range(max_units + 1), repeat=len(TOU_PERIODS))
+                     if units[0] >= 1], dtype=float) * step
+    return calculate_tou_fee_matrix(grid, demands).sum(axis=1).min()
+
+
+def _random_site(seed):
+    """各時段需量相近的小型用戶 (最高 10 千瓦)，約三分之一帶小數"""
+    rng = np.random.default_rng(seed)
+    demands = rng.integers(0, 8, (12, 1)) + rng.integers(0, 4, (12, len(TOU_PERIODS)))
+    demands = np.minimum(demands, 9).astype(float)
+    if seed % 3 == 0:
+        demands += rng.random(demands.shape)
+    return demands
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_matches_brute_force_on_integer_grid(seed):
+    demands = _random_site(seed)
+    contracts, fee, details = find_optimal_tou_capacities(demands)
+
+    assert all(isinstance(value, int) for value in contracts)
+    assert fee == pytest.approx(_brute_force(demands), rel=1e-12)
+    assert fee == pytest.approx(calculate_tou_annual_fee(contracts, demands)[0], rel=1e-12)
+    assert fee == pytest.approx(details["basic"] + details["penalty"], rel=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_brute_force_with_step(seed):
+    demands = _random_site(seed) * 2
+    contracts, fee, _ = find_optimal_tou_capacities(demands, step=2)
+
+    assert all(value % 2 == 0 for value in contracts)
+    assert fee == pytest.approx(_brute_force(demands, step=2), rel=1e-12)
+
+
+def test_continuous_solution_is_not_worse_than_grid():
+    demands = _random_site(1)
+    _, continuous_fee, _ = find_optimal_tou_capacities(demands, step=None)
+    _, grid_fee, _ = find_optimal_tou_capacities(demands)
+    assert continuous_fee <= grid_fee + 1e-9
+
+
+def test_zero_demand_uses_minimum_regular_capacity():
+    demands = np.zeros((12, len(TOU_PERIODS)))
+    contracts, fee, details = find_optimal_tou_capacities(demands)
+
+    assert contracts == [1, 0, 0, 0]
+    assert details["penalty"] == 0
+    assert fee == pytest.approx(sum(LV_TOU_TARIFF.monthly_rates[:, 0]))
+
+    with pytest.raises(ValueError):
+        find_optimal_tou_capacities(demands, step=None)
+
+
+def test_identical_periods_are_degenerate_but_solved():
+    # 每個月各時段需量相同，LP 有大量同值的比值，需靠固定的選擇規則避免循環
+    demands = np.repeat(np.array([[6.0], [6.0], [3.0], [9.0]] * 3), len(TOU_PERIODS), axis=1)
+    contracts, fee, _ = find_optimal_tou_capacities(demands)
+
+    assert fee == pytest.approx(_brute_force(demands), rel=1e-12)
+    assert contracts[1:] == [0, 0, 0]
+
+
+def test_dual_simplex_solves_small_lp():
+    # min x + 2y, s.t. x + y >= 3, x - y >= -1  =>  x = 3, y = 0
+    solution = _dual_simplex(
+        np.array([1.0, 2.0]), np.array([[1.0, 1.0], [1.0, -1.0]]), np.array([3.0, -1.0])
+    )
+    assert solution == pytest.approx([3.0, 0.0])
+
+
+def test_dual_simplex_rejects_infeasible_lp():
+    # -x >= 1 與 x >= 0 沒有交集
+    with pytest.raises(ValueError):
+        _dual_simplex(np.array([1.0]), np.array([[-1.0]]), np.array([1.0]))
+
+
+@pytest.mark.parametrize("summer, non_summer", [
+    ((100.0, 120.0, 40.0, 40.0), (100.0, 100.0, 40.0, 40.0)),
+    ((100.0, 80.0, 40.0, 40.0), (100.0, 80.0, 40.0, 50.0)),
+    ((100.0, 80.0, -1.0, -1.0), (100.0, 80.0, 40.0, 40.0)),
+    ((100.0, 80.0, 40.0), (100.0, 80.0, 40.0, 40.0)),
+])
+def test_tariff_rejects_invalid_rates(summer, non_summer):
+    with pytest.raises(ValueError):
+        TOUTariff(name="test", periods=TOU_PERIODS, summer_rates=summer, non_summer_rates=non_summer)
+
+
+def test_rejects_bad_demand_shape_and_values():
+    with pytest.raises(ValueError):
+        find_optimal_tou_capacities(np.ones((11, len(TOU_PERIODS))))
+    with pytest.raises(ValueError):
+        find_optimal_tou_capacities(np.full((12, len(TOU_PERIODS)), -1.0))
+    with pytest.raises(ValueError):
+        find_optimal_tou_capacities(np.ones((12, len(TOU_PERIODS))), step=0)
@@ -0,0 +1,53 @@
+"""輸入驗證模組的測試"""
+import numpy as np
+import pytest
+
+from utils.validators import (
+    ValidationCode,
+    validate_capacity,
+    validate_demand,
+    validate_monthly_demands,
+    validate_portfolio,
+)
+
+DEMANDS = [20, 22, 25, 28, 30, 35, 38, 37, 33, 27, 24, 21]
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_portfolio_flags_non_finite_demand(value):
+    demands = np.array([DEMANDS, DEMANDS], dtype=float)
+    demands[1, 4] = value
+    report = validate_portfolio(demands, [30, 30])
+
+    assert report.valid.tolist() == [True, False]
+    assert report.month_codes[1, 4] & ValidationCode.NON_FINITE
+    assert report.codes(1) & ValidationCode.NON_FINITE
+    assert report.error_message(1) == "5月需量必須為有效數字"
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_portfolio_flags_non_finite_capacity(value):
+    report = validate_portfolio([DEMANDS, DEMANDS], [30, value])
+
+    assert report.valid.tolist() == [True, False]
+    assert report.row_codes[1] & ValidationCode.NON_FINITE
+    assert report.error_message(1) == "契約容量必須為有效數字"
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_scalar_validators_reject_non_finite(value):
+    assert validate_capacity(value) == (False, "契約容量必須為有效數字")
+    assert validate_demand(value, 3) == (False, "3月需量必須為有效數字")
+
+    demands = list(DEMANDS)
+    demands[0] = value
+    assert validate_monthly_demands(demands) == (False, "1月需量必須為有效數字")
+
+
+def test_scalar_validators_keep_finite_messages():
+    assert validate_capacity(25) == (True, None)
+    assert validate_capacity(0) == (False, "契約容量必須大於 0")
+    assert validate_capacity(20000)[1].startswith("契約容量過大")
+    assert validate_demand(-1, 2) == (False, "2月需量不能為負數")
+    assert validate_demand(20000, 2)[1].startswith("2月需量過大")
+    assert validate_monthly_demands(DEMANDS) == (True, None)
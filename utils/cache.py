@@ -0,0 +1,181 @@
+"""
+跨 session 共用的計算結果快取模組
+
+Streamlit 每次重新執行都會重跑 app.py，但已匯入的模組只會載入一次，
+因此快取放在這裡即可讓所有訪客共用同一份結果。
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.calculator import (
+    OptimizationResult,
+    analyze_capacity,
+    find_optimal_capacity
+)
+from utils.instrumentation import register_collector
+from utils.tariffs import get_tariff
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    執行緒安全、有容量上限的 LRU 快取 (可選擇設定存活時間)
+
+    Args:
+        maxsize: 最多保留的項目數
+        ttl: 項目存活秒數，None 表示不過期
+        timer: 取得目前時間的函數 (測試時可替換)
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None,
+                 timer: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("快取容量必須大於 0")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得快取值，找不到或已過期時回傳 default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                stored_at, value = entry
+                if self.ttl is None or self._timer() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """寫入快取值，超過容量時淘汰最久未使用的項目"""
+        with self._lock:
+            self._data[key] = (self._timer(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        取得快取值，找不到時呼叫 compute 計算並寫入
+
+        計算過程不持有鎖，同一個 key 同時未命中時可能重複計算，
+        但不會阻塞其他訪客的查詢。
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """清空快取 (不重設統計數字)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """回傳命中、未命中、淘汰與過期次數等統計資訊"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+# 計算結果與圖表圖片的共用快取
+CALCULATION_CACHE = LRUCache(maxsize=1024, ttl=6 * 60 * 60)
+CHART_CACHE = LRUCache(maxsize=128, ttl=6 * 60 * 60)
+
+
+def normalize_demands(monthly_demands: List[float]) -> Tuple[float, ...]:
+    """將需量轉為浮點數元組，讓 25 與 25.0 等相同輸入共用同一個 key"""
+    return tuple(float(d) for d in monthly_demands)
+
+
+def make_key(kind: str, monthly_demands: List[float],
+             capacity: Optional[float] = None) -> Tuple[Any, ...]:
+    """
+    產生快取 key: (類型, 費率版本, 契約容量, 12 個月需量)
+
+    只與需量有關的結果 (最佳容量、費用曲線、圖表) 不帶入契約容量，
+    不同契約容量但需量相同的試算也能共用；費率版本取今日適用的版本，
+    新費率生效後舊的結果自然不再命中。
+    """
+    normalized_capacity = None if capacity is None else float(capacity)
+    return (kind, get_tariff().version, normalized_capacity, normalize_demands(monthly_demands))
+
+
+def memoize(cache: LRUCache, kind: str,
+            copy_result: Optional[Callable[[Any], Any]] = None) -> Callable:
+    """
+    以 LRUCache 快取只依賴需量的計算函數
+
+    Args:
+        cache: 使用的快取
+        kind: key 中的類型名稱，區分不同函數
+        copy_result: 回傳前複製結果的函數，避免呼叫端修改到快取內容
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(monthly_demands: List[float]) -> Any:
+            result = cache.get_or_compute(
+                make_key(kind, monthly_demands),
+                lambda: func(monthly_demands)
+            )
+            return copy_result(result) if copy_result else result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+@memoize(CALCULATION_CACHE, 'optimal',
+         copy_result=lambda r: (r[0], r[1], dict(r[2])))
+def cached_find_optimal_capacity(monthly_demands: List[float]):
+    """有快取的 find_optimal_capacity"""
+    return find_optimal_capacity(monthly_demands)
+
+
+def cached_analyze_capacity(current_capacity: float,
+                            monthly_demands: List[float]) -> OptimizationResult:
+    """有快取的 analyze_capacity (結果不可變，可直接共用)"""
+    return CALCULATION_CACHE.get_or_compute(
+        make_key('analysis', monthly_demands, current_capacity),
+        lambda: analyze_capacity(current_capacity, monthly_demands)
+    )
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """回傳各快取的統計資訊"""
+    return {
+        'calculation': CALCULATION_CACHE.stats(),
+        'chart': CHART_CACHE.stats(),
+    }
+
+
+# 命中、未命中與淘汰次數隨 /metrics 一起輸出
+register_collector("cache", cache_stats)
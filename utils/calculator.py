@@ -1,17 +1,221 @@
 """
 電費計算相關函數模組
+
+除了單筆與批次的電費計算，也提供給其他分析模組 (滾動分析、多年度排程、
+蒙地卡羅、整數精確計費) 共用的向量化元件：fee_terms、
+waste_and_penalty_terms、sum_months、monthly_terms、readonly_array，
+以及列舉候選容量的 candidate_capacities 與 capacity_grid。
 """
+import itertools
+from dataclasses import dataclass
+from datetime import date
+
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import Any, List, Tuple, Dict, Iterable, Iterator, Optional, Sequence, Union
+
+from utils.instrumentation import timed
+from utils.tariffs import DEFAULT_TARIFF_TYPE, MonthlyTerms, Tariff, compile_terms, get_tariff
+
+
+# 目前費率的常數 (費率以 utils.tariffs 的登錄為準，這裡只保留給顯示與舊程式使用)
+BASIC_FEE_NON_SUMMER = get_tariff().non_summer_rate  # 非夏月基本電費 (元/千瓦)
+BASIC_FEE_SUMMER = get_tariff().summer_rate          # 夏月基本電費 (元/千瓦)
+SUMMER_MONTHS = list(get_tariff().summer_months)     # 夏月月份
+
+
+def monthly_terms(tariff: Optional[Tariff]) -> MonthlyTerms:
+    """取得費率的 1~12 月計費向量，未指定時使用今日適用的費率"""
+    return (tariff or get_tariff()).terms
+
+
+def readonly_array(values: np.ndarray) -> np.ndarray:
+    """將陣列設為唯讀，避免共用的結果被就地修改"""
+    values.flags.writeable = False
+    return values
+
+
+def fee_terms(capacity: np.ndarray, demand: np.ndarray, terms: MonthlyTerms) -> np.ndarray:
+    """
+    逐元素計算基本電費 (輸入需可與計費向量互相廣播，月份在最後一軸)
+
+    逐元素的運算順序與 calculate_monthly_fee 相同，因此結果完全一致。
+    """
+    rate = terms.rates
+
+    # 計算超出容量與 10% 容許範圍
+    excess = demand - capacity
+    allowed_10_percent = capacity * terms.allowances
+    base = capacity * rate
+
+    # 超出 10% 以內：2 倍費率；超出 10% 以上：2 倍 + 3 倍費率
+    within_10_percent = base + excess * rate * terms.within_multipliers
+    over_10_percent = (base +
+                       allowed_10_percent * rate * terms.within_multipliers +
+                       (excess - allowed_10_percent) * rate * terms.over_multipliers)
+
+    return np.where(
+        excess <= 0,
+        base,
+        np.where(excess <= allowed_10_percent, within_10_percent, over_10_percent)
+    )
+
+
+def _scalar_fee(capacity: float, demand: float, rate: float, tariff: Tariff) -> float:
+    """
+    以純 Python 計算單一容量、單月的基本電費
+
+    單筆計算時建立 numpy 陣列的成本遠高於計算本身，因此單筆的公開函數
+    走這個路徑；運算順序與 fee_terms 相同，結果逐位元一致。
+    """
+    excess = demand - capacity
+    base = capacity * rate
+    if excess <= 0:
+        return base
+
+    allowed_10_percent = capacity * tariff.allowance
+    if excess <= allowed_10_percent:
+        return base + excess * rate * tariff.within_multiplier
+    return (base +
+            allowed_10_percent * rate * tariff.within_multiplier +
+            (excess - allowed_10_percent) * rate * tariff.over_multiplier)
+
+
+def _scalar_waste_and_penalty(
+    capacity: float,
+    demand: float,
+    rate: float,
+    tariff: Tariff
+) -> Tuple[float, float]:
+    """以純 Python 計算單月的浪費金額與罰款金額 (與 waste_and_penalty_terms 一致)"""
+    excess = demand - capacity
+    if excess <= 0:
+        return (capacity - demand) * rate, 0.0
+
+    allowed = capacity * tariff.allowance
+    if excess <= allowed:
+        return 0.0, excess * rate * tariff.within_multiplier
+    return 0.0, (allowed * rate * tariff.within_multiplier +
+                 (excess - allowed) * rate * tariff.over_multiplier)
+
+
+def calculate_fee_matrix(
+    capacities: Sequence[float],
+    monthly_demands: Sequence[float],
+    terms: Optional[MonthlyTerms] = None
+) -> np.ndarray:
+    """
+    一次計算多組契約容量在各月份的基本電費矩陣
+
+    Args:
+        capacities: 契約容量陣列 (千瓦)，長度 N
+        monthly_demands: 各月最高需量 (千瓦)，長度 M
+        terms: 長度 M 的逐月計費向量，預設為目前費率的 1~12 月
+
+    Returns:
+        形狀為 (N, M) 的基本電費矩陣 (元)
+    """
+    capacity = np.asarray(capacities)[:, np.newaxis]
+    demand = np.asarray(monthly_demands)[np.newaxis, :]
+
+    if terms is None:
+        terms = monthly_terms(None)
+
+    return fee_terms(capacity, demand, terms)
+
+
+def waste_and_penalty_terms(
+    capacity: np.ndarray,
+    demand: np.ndarray,
+    terms: MonthlyTerms
+) -> Tuple[np.ndarray, np.ndarray]:
+    """逐元素計算浪費金額與罰款金額 (輸入需可與計費向量互相廣播)"""
+    rate = terms.rates
+    excess = demand - capacity
+    allowed = capacity * terms.allowances
+
+    waste = np.where(excess <= 0, (capacity - demand) * rate, 0.0)
+    penalty = np.where(
+        excess <= 0,
+        0.0,
+        np.where(
+            excess <= allowed,
+            excess * rate * terms.within_multipliers,
+            allowed * rate * terms.within_multipliers + (excess - allowed) * rate * terms.over_multipliers
+        )
+    )
+
+    return waste, penalty
+
+
+def calculate_waste_and_penalty_matrix(
+    capacities: Sequence[float],
+    monthly_demands: Sequence[float],
+    terms: Optional[MonthlyTerms] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一次計算多組契約容量在各月份的浪費金額與罰款金額
+
+    Args:
+        capacities: 契約容量陣列 (千瓦)，長度 N
+        monthly_demands: 各月最高需量 (千瓦)，長度 M
+        terms: 長度 M 的逐月計費向量，預設為目前費率的 1~12 月
+
+    Returns:
+        (浪費金額矩陣, 罰款金額矩陣) 的元組，形狀皆為 (N, M) (元)
+    """
+    capacity = np.asarray(capacities)[:, np.newaxis]
+    demand = np.asarray(monthly_demands)[np.newaxis, :]
+
+    if terms is None:
+        terms = monthly_terms(None)
+
+    return waste_and_penalty_terms(capacity, demand, terms)
+
+
+def sum_months(matrix: np.ndarray) -> np.ndarray:
+    """
+    依月份順序沿最後一軸逐月加總
+
+    np.sum 採用成對加總，與逐月累加的浮點結果可能有些微差異；
+    這裡維持逐月累加的順序，確保與原本的迴圈結果完全相同。
+    """
+    total = np.zeros(matrix.shape[:-1])
+    for month_idx in range(matrix.shape[-1]):
+        total += matrix[..., month_idx]
+    return total
+
 
+def calculate_annual_fees(
+    capacities: Sequence[float],
+    monthly_demands: List[float],
+    tariff: Optional[Tariff] = None
+) -> np.ndarray:
+    """
+    計算多組契約容量的年度基本電費總額
+
+    Args:
+        capacities: 契約容量陣列 (千瓦)
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
+
+    Returns:
+        各契約容量對應的年度基本電費陣列 (元)
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if len(monthly_demands) != 12:
+        raise ValueError("必須提供 12 個月的需量資料")
 
-# 費率常數
-BASIC_FEE_NON_SUMMER = 173.2  # 非夏月基本電費 (元/千瓦)
-BASIC_FEE_SUMMER = 236.2       # 夏月基本電費 (元/千瓦)
-SUMMER_MONTHS = [6, 7, 8, 9]   # 夏月月份
+    return sum_months(calculate_fee_matrix(capacities, monthly_demands, monthly_terms(tariff)))
 
 
-def calculate_monthly_fee(capacity: float, demand: float, month: int) -> float:
+def calculate_monthly_fee(
+    capacity: float,
+    demand: float,
+    month: int,
+    tariff: Optional[Tariff] = None
+) -> float:
     """
     計算單月基本電費
 
@@ -19,6 +223,7 @@ def calculate_monthly_fee(capacity: float, demand: float, month: int) -> float:
         capacity: 契約容量 (千瓦)
         demand: 當月最高需量 (千瓦)
         month: 月份 (1-12)
+        tariff: 費率版本，預設為今日適用的費率
 
     Returns:
         當月基本電費 (元)
@@ -33,36 +238,22 @@ def calculate_monthly_fee(capacity: float, demand: float, month: int) -> float:
     if month < 1 or month > 12:
         raise ValueError("月份必須介於 1-12 之間")
 
-    # 判斷費率
-    basic_fee_rate = BASIC_FEE_SUMMER if month in SUMMER_MONTHS else BASIC_FEE_NON_SUMMER
+    tariff = tariff or get_tariff()
+    return float(_scalar_fee(capacity, demand, tariff.month_rates[month - 1], tariff))
 
-    # 計算超出容量
-    excess = demand - capacity
-
-    if excess <= 0:
-        # 未超過契約容量
-        return capacity * basic_fee_rate
-    else:
-        # 超過契約容量：計算罰款
-        allowed_10_percent = capacity * 0.10
 
-        if excess <= allowed_10_percent:
-            # 超出 10% 以內：2 倍費率
-            return capacity * basic_fee_rate + excess * basic_fee_rate * 2
-        else:
-            # 超出 10% 以上：2 倍 + 3 倍費率
-            return (capacity * basic_fee_rate +
-                    allowed_10_percent * basic_fee_rate * 2 +
-                    (excess - allowed_10_percent) * basic_fee_rate * 3)
-
-
-def calculate_annual_fee(capacity: float, monthly_demands: List[float]) -> float:
+def calculate_annual_fee(
+    capacity: float,
+    monthly_demands: List[float],
+    tariff: Optional[Tariff] = None
+) -> float:
     """
     計算年度基本電費總額
 
     Args:
         capacity: 契約容量 (千瓦)
         monthly_demands: 12個月的最高需量列表 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
 
     Returns:
         年度基本電費總額 (元)
@@ -72,59 +263,197 @@ def calculate_annual_fee(capacity: float, monthly_demands: List[float]) -> float
     """
     if len(monthly_demands) != 12:
         raise ValueError("必須提供 12 個月的需量資料")
+    if capacity <= 0:
+        raise ValueError("契約容量必須大於 0")
+    if any(d < 0 for d in monthly_demands):
+        raise ValueError("需量不能為負數")
 
-    total_fee = 0
-    for month_idx, demand in enumerate(monthly_demands):
-        month = month_idx + 1
-        total_fee += calculate_monthly_fee(capacity, demand, month)
-
-    return total_fee
+    # 單一容量以純 Python 逐月累加 (批次計算請使用 calculate_annual_fees)
+    tariff = tariff or get_tariff()
+    total_fee = 0.0
+    for demand, rate in zip(monthly_demands, tariff.month_rates):
+        total_fee += _scalar_fee(capacity, demand, rate, tariff)
+    return float(total_fee)
 
 
-def calculate_waste_and_penalty(capacity: float, monthly_demands: List[float]) -> Tuple[float, float]:
+def calculate_waste_and_penalty(
+    capacity: float,
+    monthly_demands: List[float],
+    tariff: Optional[Tariff] = None
+) -> Tuple[float, float]:
     """
     計算年度浪費金額與罰款金額
 
     Args:
         capacity: 契約容量 (千瓦)
         monthly_demands: 12個月的最高需量列表 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
 
     Returns:
         (浪費金額, 罰款金額) 的元組 (元)
+
+    Raises:
+        ValueError: 當輸入不合理時
     """
-    waste_total = 0
-    penalty_total = 0
+    if len(monthly_demands) != 12:
+        raise ValueError("必須提供 12 個月的需量資料")
 
-    for month_idx, demand in enumerate(monthly_demands):
-        month = month_idx + 1
-        rate = BASIC_FEE_SUMMER if month in SUMMER_MONTHS else BASIC_FEE_NON_SUMMER
-        excess = demand - capacity
+    # 單一容量以純 Python 逐月累加 (批次計算請使用 calculate_waste_and_penalty_matrix)
+    tariff = tariff or get_tariff()
+    waste_total = 0.0
+    penalty_total = 0.0
+    for demand, rate in zip(monthly_demands, tariff.month_rates):
+        waste, penalty = _scalar_waste_and_penalty(capacity, demand, rate, tariff)
+        waste_total += waste
+        penalty_total += penalty
+
+    return float(waste_total), float(penalty_total)
 
-        if excess <= 0:
-            # 未用滿：計算浪費容量
-            wasted_kw = capacity - demand
-            waste_total += wasted_kw * rate
-        else:
-            # 超出契約容量：計算罰款
-            allowed = capacity * 0.10
-            if excess <= allowed:
-                penalty_total += excess * rate * 2
-            else:
-                penalty_total += allowed * rate * 2 + (excess - allowed) * rate * 3
 
-    return waste_total, penalty_total
+def calculate_period_fee(
+    capacity: float,
+    monthly_demands: Sequence[float],
+    billing_months: Sequence[date],
+    tariff_type: str = DEFAULT_TARIFF_TYPE
+) -> Tuple[float, np.ndarray]:
+    """
+    以各月當時適用的費率計算一段期間的基本電費 (期間可跨越費率調整)
 
+    Args:
+        capacity: 契約容量 (千瓦)
+        monthly_demands: 各計費月份的最高需量 (千瓦)
+        billing_months: 各計費月份的日期 (任一天皆可)，長度與 monthly_demands 相同
+        tariff_type: 電價種類
 
-def find_optimal_capacity(monthly_demands: List[float]) -> Tuple[int, float, Dict[str, float]]:
+    Returns:
+        (基本電費總額, 逐月基本電費陣列) 的元組 (元)
+
+    Raises:
+        ValueError: 當輸入不合理或某月份沒有適用的費率時
     """
-    尋找最佳契約容量
+    if len(monthly_demands) != len(billing_months):
+        raise ValueError("需量資料與計費月份的數量必須相同")
+    if capacity <= 0:
+        raise ValueError("契約容量必須大於 0")
+    if any(d < 0 for d in monthly_demands):
+        raise ValueError("需量不能為負數")
+
+    fees = calculate_fee_matrix([capacity], monthly_demands, compile_terms(billing_months, tariff_type))[0]
+    return float(sum_months(fees)), fees
+
+
+def _breakpoints(demands: np.ndarray, terms: MonthlyTerms) -> np.ndarray:
+    """各月費用曲線的轉折點 d 與 d/(1+容許比例)，沿最後一軸串接"""
+    return np.concatenate([demands, demands / (1 + terms.allowances)], axis=-1)
+
+
+def candidate_capacities(
+    demands: np.ndarray,
+    step: Optional[float],
+    terms: MonthlyTerms
+) -> np.ndarray:
+    """
+    依費用曲線的轉折點產生候選容量
+
+    年度基本電費對契約容量為分段線性的凸函數，斜率只會在各月需量 d
+    (開始超約) 與 d/1.1 (超約超過 10%) 處改變，因此最佳解必定落在這些
+    轉折點上；若容量須為 step 的倍數，則落在轉折點相鄰的兩個格點上。
 
     Args:
-        monthly_demands: 12個月的最高需量列表 (千瓦)
+        demands: 月份在最後一軸的需量陣列 (千瓦)，例如 (N, 12) 或多年度的 (T,)
+        step: 容量級距 (千瓦)，None 表示不限制
+        terms: 可與 demands 最後一軸廣播的逐月計費向量 (決定 d/1.1 中的容許比例)
 
     Returns:
-        (最佳容量, 最低費用, 詳細資訊字典) 的元組
-        詳細資訊包含: waste (浪費金額), penalty (罰款金額)
+        形狀為 (..., K) 且沿最後一軸遞增排序的候選容量，無效的候選值為 np.inf
+    """
+    breakpoints = _breakpoints(demands, terms)
+
+    if step is None:
+        candidates = np.where(breakpoints > 0, breakpoints, np.inf)
+    else:
+        # 取轉折點兩側的格點，並以 step 作為最小容量
+        lower = np.floor(breakpoints / step)
+        upper = np.ceil(breakpoints / step)
+        units = np.maximum(np.concatenate([lower, upper], axis=-1), 1)
+        candidates = np.round(units * step, 10)
+
+    return np.sort(candidates, axis=-1)
+
+
+def capacity_grid(demands: np.ndarray, step: float, terms: MonthlyTerms) -> np.ndarray:
+    """
+    涵蓋所有候選容量的連續格點
+
+    需要在同一組容量上比較許多需量組合 (例如滾動區間或蒙地卡羅情境) 時，
+    每一組的最佳解都落在自己的轉折點之間，因此取全部轉折點中最低與最高
+    的格點 (與 candidate_capacities 相同的取法) 即可。
+
+    Args:
+        demands: 月份在最後一軸的需量陣列 (千瓦)
+        step: 容量級距 (千瓦)
+        terms: 可與 demands 最後一軸廣播的逐月計費向量
+
+    Returns:
+        遞增排序的容量格點 (千瓦)，皆為 step 的倍數且至少為 step
+    """
+    breakpoints = _breakpoints(demands, terms)
+    lower = max(1, int(np.floor(np.min(breakpoints) / step)))
+    upper = max(lower, int(np.ceil(np.max(breakpoints) / step)))
+    return np.round(np.arange(lower, upper + 1) * step, 10)
+
+
+def _solve_optimal_capacities(
+    demands: np.ndarray,
+    step: Optional[float],
+    terms: MonthlyTerms
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    以轉折點列舉求出每列需量的最佳契約容量
+
+    Args:
+        demands: 形狀為 (N, 12) 的需量矩陣 (千瓦)
+        step: 容量級距 (千瓦)，None 表示不限制
+        terms: 逐月計費向量
+
+    Returns:
+        (最佳容量陣列, 最低費用陣列) 的元組，長度皆為 N；
+        找不到有效容量的列 (需量全為 0 且未指定級距) 會回傳 nan
+    """
+    candidates = candidate_capacities(demands, step, terms)
+    valid = np.isfinite(candidates)
+    safe_candidates = np.where(valid, candidates, 1.0)
+
+    fees = sum_months(fee_terms(
+        safe_candidates[..., np.newaxis],
+        demands[..., np.newaxis, :],
+        terms
+    ))
+    fees = np.where(valid, fees, np.inf)
+
+    # 候選值已遞增排序，費用相同時 argmin 會選擇較小的容量
+    best_idx = np.argmin(fees, axis=-1)
+    rows = np.arange(demands.shape[0])
+    optimal_capacities = candidates[rows, best_idx]
+    optimal_fees = fees[rows, best_idx]
+
+    unsolved = ~np.isfinite(optimal_fees)
+    optimal_capacities[unsolved] = np.nan
+    optimal_fees[unsolved] = np.nan
+
+    return optimal_capacities, optimal_fees
+
+
+def _find_optimum(
+    monthly_demands: List[float],
+    step: Optional[float],
+    tariff: Optional[Tariff] = None
+) -> Tuple[Union[int, float], float]:
+    """
+    檢查輸入並求出最佳契約容量與最低費用
+
+    Returns:
+        (最佳容量, 最低費用) 的元組
 
     Raises:
         ValueError: 當輸入不合理時
@@ -135,21 +464,51 @@ def find_optimal_capacity(monthly_demands: List[float]) -> Tuple[int, float, Dic
     if any(d < 0 for d in monthly_demands):
         raise ValueError("需量不能為負數")
 
-    # 計算搜尋範圍
-    min_demand = max(1, int(min(monthly_demands) * 0.8))
-    max_demand = int(max(monthly_demands) * 1.5)
-    capacities = np.arange(min_demand, max_demand + 1)
+    if step is not None and step <= 0:
+        raise ValueError("容量級距必須大於 0")
+
+    demands = np.asarray(monthly_demands, dtype=float)[np.newaxis, :]
+    capacities, fees = _solve_optimal_capacities(demands, step, monthly_terms(tariff))
+
+    if np.isnan(capacities[0]):
+        raise ValueError("需量全為 0 時無法決定最佳契約容量，請指定容量級距")
 
-    # 計算所有可能容量的費用
-    fees = [calculate_annual_fee(cap, monthly_demands) for cap in capacities]
+    optimal_capacity = float(capacities[0])
+    if step is not None and float(step).is_integer():
+        optimal_capacity = int(round(optimal_capacity))
 
-    # 找出最佳容量
-    optimal_idx = np.argmin(fees)
-    optimal_capacity = int(capacities[optimal_idx])
-    optimal_fee = fees[optimal_idx]
+    return optimal_capacity, float(fees[0])
+
+
+@timed("calculator.find_optimal_capacity")
+def find_optimal_capacity(
+    monthly_demands: List[float],
+    step: Optional[float] = 1,
+    tariff: Optional[Tariff] = None
+) -> Tuple[Union[int, float], float, Dict[str, float]]:
+    """
+    尋找最佳契約容量
+
+    只評估費用曲線的轉折點 (最多 24 個)，計算量與用戶規模無關，
+    也不受固定搜尋區間限制。
+
+    Args:
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        step: 容量級距 (千瓦)，預設 1 千瓦 (整數容量)；
+              可設為 0.5、5 等級距，或 None 表示不限制
+        tariff: 費率版本，預設為今日適用的費率
+
+    Returns:
+        (最佳容量, 最低費用, 詳細資訊字典) 的元組
+        詳細資訊包含: waste (浪費金額), penalty (罰款金額)
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    optimal_capacity, optimal_fee = _find_optimum(monthly_demands, step, tariff)
 
     # 計算最佳容量下的浪費與罰款
-    waste, penalty = calculate_waste_and_penalty(optimal_capacity, monthly_demands)
+    waste, penalty = calculate_waste_and_penalty(optimal_capacity, monthly_demands, tariff)
 
     return optimal_capacity, optimal_fee, {
         'waste': waste,
@@ -157,19 +516,368 @@ def find_optimal_capacity(monthly_demands: List[float]) -> Tuple[int, float, Dic
     }
 
 
-def get_fee_distribution(monthly_demands: List[float]) -> Tuple[np.ndarray, List[float]]:
+def _optimize_chunk(
+    demands: np.ndarray,
+    current_capacities: np.ndarray,
+    step: Optional[float],
+    row_errors: Dict[int, str],
+    terms: MonthlyTerms
+) -> Dict[str, np.ndarray]:
+    """
+    計算一批用戶的最佳化結果
+
+    Args:
+        demands: 形狀為 (n, 12) 的需量矩陣 (千瓦)
+        current_capacities: 長度 n 的目前契約容量 (千瓦)
+        step: 容量級距 (千瓦)，None 表示不限制
+        row_errors: 此批次中已知的錯誤 (列索引 -> 錯誤訊息)，會就地補上新的錯誤
+        terms: 逐月計費向量
+
+    Returns:
+        各欄位結果陣列的字典，無效的列以 nan 表示
+    """
+    # 逐列檢查輸入，無效的列以安全值代入計算後再清除
+    checks = [
+        (~np.all(np.isfinite(demands), axis=1), "需量必須為有效數字"),
+        (np.any(demands < 0, axis=1), "需量不能為負數"),
+        (np.isinf(current_capacities), "契約容量必須為有效數字"),
+        (~(current_capacities > 0), "契約容量必須大於 0"),
+    ]
+    for mask, message in checks:
+        for row in np.flatnonzero(mask):
+            row_errors.setdefault(int(row), message)
+
+    invalid = np.zeros(demands.shape[0], dtype=bool)
+    invalid[list(row_errors)] = True
+    demands = np.where(invalid[:, np.newaxis], 1.0, demands)
+    current_capacities = np.where(invalid, 1.0, current_capacities)
+
+    optimal_capacities, optimal_fees = _solve_optimal_capacities(demands, step, terms)
+    for row in np.flatnonzero(np.isnan(optimal_capacities) & ~invalid):
+        row_errors[int(row)] = "需量全為 0 時無法決定最佳契約容量，請指定容量級距"
+        invalid[row] = True
+
+    safe_optimal = np.where(invalid, 1.0, optimal_capacities)
+    current_fees = sum_months(fee_terms(
+        current_capacities[:, np.newaxis], demands, terms
+    ))
+    waste, penalty = waste_and_penalty_terms(
+        safe_optimal[:, np.newaxis], demands, terms
+    )
+
+    results = {
+        'optimal_capacity': optimal_capacities,
+        'optimal_fee': optimal_fees,
+        'current_fee': current_fees,
+        'waste': sum_months(waste),
+        'penalty': sum_months(penalty),
+        'savings': current_fees - optimal_fees,
+    }
+    for values in results.values():
+        values[invalid] = np.nan
+
+    return results
+
+
+def _iter_chunks(
+    monthly_demands: Union[np.ndarray, Iterable[Sequence[float]]],
+    current_capacities: Union[np.ndarray, Iterable[float]],
+    chunk_size: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray, Dict[int, str]]]:
+    """
+    將輸入切成固定大小的批次
+
+    Returns:
+        逐批產生 (需量矩陣, 契約容量陣列, 解析錯誤) 的迭代器
+
+    Raises:
+        ValueError: 需量列數與契約容量數量不同時 (可迭代輸入在讀到不一致的批次時才會發現)
+    """
+    if isinstance(monthly_demands, np.ndarray):
+        if monthly_demands.ndim != 2 or monthly_demands.shape[1] != 12:
+            raise ValueError("需量矩陣的形狀必須為 (N, 12)")
+        capacities = np.asarray(current_capacities, dtype=float)
+        if capacities.shape != (monthly_demands.shape[0],):
+            raise ValueError("契約容量數量必須與需量資料列數相同")
+        for start in range(0, monthly_demands.shape[0], chunk_size):
+            stop = start + chunk_size
+            yield (monthly_demands[start:stop].astype(float),
+                   capacities[start:stop], {})
+        return
+
+    # 兩者長度不同時與陣列輸入相同視為整體錯誤，不默默捨棄多出的列
+    missing = object()
+    pairs = itertools.zip_longest(monthly_demands, current_capacities, fillvalue=missing)
+    while True:
+        chunk = list(itertools.islice(pairs, chunk_size))
+        if not chunk:
+            return
+        if any(row is missing or capacity is missing for row, capacity in chunk):
+            raise ValueError("契約容量數量必須與需量資料列數相同")
+
+        demands = np.ones((len(chunk), 12))
+        chunk_capacities = np.ones(len(chunk))
+        errors = {}
+        for idx, (row, capacity) in enumerate(chunk):
+            try:
+                values = np.asarray(row, dtype=float)
+                chunk_capacities[idx] = float(capacity)
+            except (TypeError, ValueError):
+                errors[idx] = "需量與契約容量必須為數值"
+                continue
+            if values.shape != (12,):
+                errors[idx] = "必須提供 12 個月的需量資料"
+                continue
+            demands[idx] = values
+
+        yield demands, chunk_capacities, errors
+
+
+@timed("calculator.optimize_portfolio")
+def optimize_portfolio(
+    monthly_demands: Union[np.ndarray, Iterable[Sequence[float]]],
+    current_capacities: Union[np.ndarray, Iterable[float]],
+    step: Optional[float] = 1,
+    chunk_size: int = 256,
+    tariff: Optional[Tariff] = None
+) -> Dict[str, Any]:
+    """
+    批次計算多個用戶 (電表) 的最佳契約容量
+
+    以固定大小的批次向量化計算，記憶體用量只與 chunk_size 有關；
+    單列資料錯誤只會記錄在 errors 中，不會中斷整個批次。
+
+    Args:
+        monthly_demands: 形狀為 (N, 12) 的需量矩陣，或逐列產生 12 個月需量的可迭代物件 (千瓦)
+        current_capacities: 長度 N 的目前契約容量 (千瓦)
+        step: 容量級距 (千瓦)，與 find_optimal_capacity 相同
+        chunk_size: 每批次處理的列數
+        tariff: 費率版本，預設為今日適用的費率
+
+    Returns:
+        結果字典，包含下列長度 N 的陣列 (無效的列為 nan):
+        optimal_capacity (最佳容量), optimal_fee (最低費用),
+        current_fee (目前費用), waste (最佳容量下的浪費金額),
+        penalty (最佳容量下的罰款金額), savings (可節省金額)；
+        以及 valid (各列是否有效) 與 errors (列索引 -> 錯誤訊息)
+
+    Raises:
+        ValueError: 當整體輸入格式不合理時
+    """
+    if step is not None and step <= 0:
+        raise ValueError("容量級距必須大於 0")
+    if chunk_size <= 0:
+        raise ValueError("批次大小必須大於 0")
+
+    terms = monthly_terms(tariff)
+    parts: Dict[str, List[np.ndarray]] = {}
+    errors: Dict[int, str] = {}
+    offset = 0
+
+    for demands, capacities, chunk_errors in _iter_chunks(
+        monthly_demands, current_capacities, chunk_size
+    ):
+        chunk_results = _optimize_chunk(demands, capacities, step, chunk_errors, terms)
+        for key, values in chunk_results.items():
+            parts.setdefault(key, []).append(values)
+        for row, message in sorted(chunk_errors.items()):
+            errors[offset + row] = message
+        offset += demands.shape[0]
+
+    keys = ['optimal_capacity', 'optimal_fee', 'current_fee', 'waste', 'penalty', 'savings']
+    results: Dict[str, Any] = {
+        key: np.concatenate(parts[key]) if key in parts else np.empty(0)
+        for key in keys
+    }
+    valid = np.ones(offset, dtype=bool)
+    valid[list(errors)] = False
+    results['valid'] = valid
+    results['errors'] = errors
+
+    return results
+
+
+def _capacity_range(monthly_demands: List[float]) -> np.ndarray:
+    """圖表顯示的容量範圍：最低需量的 80% ~ 最高需量的 150%"""
+    min_demand = max(1, int(min(monthly_demands) * 0.8))
+    max_demand = int(max(monthly_demands) * 1.5)
+    return np.arange(min_demand, max_demand + 1)
+
+
+def get_fee_distribution(
+    monthly_demands: List[float],
+    tariff: Optional[Tariff] = None
+) -> Tuple[np.ndarray, List[float]]:
     """
     取得不同契約容量下的費用分布（用於繪圖）
 
     Args:
         monthly_demands: 12個月的最高需量列表
+        tariff: 費率版本，預設為今日適用的費率
 
     Returns:
         (容量陣列, 費用列表) 的元組
     """
-    min_demand = max(1, int(min(monthly_demands) * 0.8))
-    max_demand = int(max(monthly_demands) * 1.5)
-    capacities = np.arange(min_demand, max_demand + 1)
-    fees = [calculate_annual_fee(cap, monthly_demands) for cap in capacities]
+    capacities = _capacity_range(monthly_demands)
+    fees = calculate_annual_fees(capacities, monthly_demands, tariff).tolist()
 
     return capacities, fees
+
+
+@dataclass(frozen=True)
+class OptimizationResult:
+    """
+    單次試算的完整結果 (不可變)
+
+    由 analyze_capacity 一次算出，畫面上的目前狀態、最佳化結果與圖表
+    都直接讀取此物件，不再各自重算。
+    """
+    current_capacity: float
+    monthly_demands: Tuple[float, ...]
+
+    # 費用曲線 (用於繪圖與即時試算)，capacities 為連續整數
+    capacities: np.ndarray
+    fees: np.ndarray
+    wastes: np.ndarray
+    penalties: np.ndarray
+
+    # 最佳契約容量
+    optimal_capacity: Union[int, float]
+    optimal_fee: float
+
+    # 目前契約容量下的費用
+    current_fee: float
+
+    # 逐月浪費金額與罰款金額 (長度 12)
+    current_monthly_waste: np.ndarray
+    current_monthly_penalty: np.ndarray
+    optimal_monthly_waste: np.ndarray
+    optimal_monthly_penalty: np.ndarray
+
+    # 年度浪費金額與罰款金額
+    current_waste: float
+    current_penalty: float
+    optimal_waste: float
+    optimal_penalty: float
+
+    @property
+    def details(self) -> Dict[str, float]:
+        """與 find_optimal_capacity 相同格式的詳細資訊字典"""
+        return {'waste': self.optimal_waste, 'penalty': self.optimal_penalty}
+
+    @property
+    def saved_fee(self) -> float:
+        """優化後一年可節省金額"""
+        return self.current_fee - self.optimal_fee
+
+    @property
+    def monthly_saved_fee(self) -> float:
+        """平均每個月可節省金額"""
+        return self.saved_fee / 12
+
+    @property
+    def saved_percentage(self) -> float:
+        """可節省的基本電費百分比"""
+        return (self.saved_fee / self.current_fee * 100) if self.current_fee else 0
+
+    def curve_index(self, capacity: float) -> int:
+        """
+        取得容量在費用曲線中的索引 (曲線為連續整數，直接以差值計算)
+
+        Raises:
+            ValueError: 容量不在費用曲線範圍內時
+        """
+        idx = int(round(capacity)) - int(self.capacities[0])
+        if idx < 0 or idx >= len(self.capacities):
+            raise ValueError(
+                f"契約容量需介於 {self.capacities[0]} ~ {self.capacities[-1]} 千瓦之間"
+            )
+        return idx
+
+    def what_if(self, capacity: float) -> Dict[str, float]:
+        """
+        從費用曲線直接讀取某個容量的試算結果
+
+        Args:
+            capacity: 契約容量 (千瓦，取整數)
+
+        Returns:
+            包含 fee (年度基本電費)、waste (浪費金額)、penalty (罰款金額)、
+            marginal_fee (容量再增加 1 千瓦時的費用變化)、
+            vs_optimal (與最佳容量的費用差)、vs_current (與目前容量的費用差) 的字典
+        """
+        idx = self.curve_index(capacity)
+        fee = float(self.fees[idx])
+        if idx + 1 < len(self.fees):
+            marginal_fee = float(self.fees[idx + 1] - self.fees[idx])
+        else:
+            marginal_fee = float(self.fees[idx] - self.fees[idx - 1]) if idx > 0 else 0.0
+
+        return {
+            'fee': fee,
+            'waste': float(self.wastes[idx]),
+            'penalty': float(self.penalties[idx]),
+            'marginal_fee': marginal_fee,
+            'vs_optimal': fee - self.optimal_fee,
+            'vs_current': fee - self.current_fee,
+        }
+
+
+@timed("calculator.analyze_capacity")
+def analyze_capacity(
+    current_capacity: float,
+    monthly_demands: List[float],
+    tariff: Optional[Tariff] = None
+) -> OptimizationResult:
+    """
+    一次完成目前容量試算、最佳容量搜尋與費用曲線計算
+
+    Args:
+        current_capacity: 目前契約容量 (千瓦)
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
+
+    Returns:
+        OptimizationResult 結果物件
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if current_capacity <= 0:
+        raise ValueError("契約容量必須大於 0")
+
+    tariff = tariff or get_tariff()
+    optimal_capacity, optimal_fee = _find_optimum(monthly_demands, 1, tariff)
+
+    # 費用曲線只掃描一次，浪費與罰款曲線一併算好供即時試算查表
+    capacities = _capacity_range(monthly_demands)
+    fees = calculate_annual_fees(capacities, monthly_demands, tariff)
+    curve_waste, curve_penalty = calculate_waste_and_penalty_matrix(capacities, monthly_demands, tariff.terms)
+
+    # 目前容量與最佳容量一起計算逐月費用、浪費與罰款
+    compared = [current_capacity, optimal_capacity]
+    current_fee = sum_months(calculate_fee_matrix(compared, monthly_demands, tariff.terms))[0]
+    waste, penalty = calculate_waste_and_penalty_matrix(compared, monthly_demands, tariff.terms)
+    waste_totals = sum_months(waste)
+    penalty_totals = sum_months(penalty)
+    waste, penalty = readonly_array(waste), readonly_array(penalty)
+
+    return OptimizationResult(
+        current_capacity=current_capacity,
+        monthly_demands=tuple(monthly_demands),
+        capacities=readonly_array(capacities),
+        fees=readonly_array(fees),
+        wastes=readonly_array(sum_months(curve_waste)),
+        penalties=readonly_array(sum_months(curve_penalty)),
+        optimal_capacity=optimal_capacity,
+        optimal_fee=optimal_fee,
+        current_fee=float(current_fee),
+        current_monthly_waste=waste[0],
+        current_monthly_penalty=penalty[0],
+        optimal_monthly_waste=waste[1],
+        optimal_monthly_penalty=penalty[1],
+        current_waste=float(waste_totals[0]),
+        current_penalty=float(penalty_totals[0]),
+        optimal_waste=float(waste_totals[1]),
+        optimal_penalty=float(penalty_totals[1]),
+    )
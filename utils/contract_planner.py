@@ -0,0 +1,269 @@
+"""
+多年度契約容量調整排程模組
+
+契約容量調降不需費用，調升則有變更費用且需等待施工。對負載會成長的
+用戶 (例如增設充電樁、電梯)，依多年的逐月需量預測與變更規則，以動態
+規劃求出總成本 (基本電費 + 變更費用) 最低的調整排程。
+
+每個月的費用只在 d 與 d/(1+容許比例) 處轉折，變更費用只在前一個容量處
+轉折，因此最佳排程使用的容量必定落在所有月份的轉折點或目前容量上；
+狀態只需這些容量，不必逐一列舉每個整數千瓦。
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from utils.calculator import candidate_capacities, fee_terms, readonly_array, waste_and_penalty_terms
+from utils.tariffs import DEFAULT_TARIFF_TYPE, MonthlyTerms, compile_terms
+
+
+@dataclass(frozen=True)
+class ChangeRules:
+    """
+    契約容量變更規則
+
+    Args:
+        increase_fixed_fee: 每次調升的固定費用 (元)
+        increase_fee_per_kw: 調升每千瓦的費用 (元/千瓦)
+        lead_time_months: 調升從申請到生效的月數，排程第一個月起算
+        decrease_fee: 每次調降的費用 (元)，台電目前不收費
+    """
+    increase_fixed_fee: float
+    increase_fee_per_kw: float
+    lead_time_months: int = 0
+    decrease_fee: float = 0.0
+
+    def __post_init__(self):
+        if min(self.increase_fixed_fee, self.increase_fee_per_kw, self.decrease_fee) < 0:
+            raise ValueError("變更費用不能為負數")
+        if self.lead_time_months < 0:
+            raise ValueError("施工月數不能為負數")
+
+    def change_cost(self, from_capacity: float, to_capacity: float) -> float:
+        """單次變更的費用 (元)"""
+        if to_capacity > from_capacity:
+            return self.increase_fixed_fee + self.increase_fee_per_kw * (to_capacity - from_capacity)
+        if to_capacity < from_capacity:
+            return self.decrease_fee
+        return 0.0
+
+
+@dataclass(frozen=True)
+class CapacityChange:
+    """
+    單次契約容量變更
+
+    Attributes:
+        request_month: 需要提出申請的月份
+        effective_month: 新容量開始計費的月份
+        from_capacity: 變更前容量 (千瓦)
+        to_capacity: 變更後容量 (千瓦)
+        cost: 變更費用 (元)
+    """
+    request_month: np.datetime64
+    effective_month: np.datetime64
+    from_capacity: float
+    to_capacity: float
+    cost: float
+
+
+@dataclass(frozen=True)
+class ContractPlan:
+    """
+    契約容量調整排程 (陣列皆為唯讀，長度為月份數)
+
+    Attributes:
+        months: 各月份 (numpy datetime64[M])
+        capacities: 各月份生效的契約容量 (千瓦)
+        monthly_fees: 各月份的基本電費 (元)
+        wastes: 各月份的浪費金額 (元)
+        penalties: 各月份的罰款金額 (元)
+        changes: 依時間排序的變更列表
+        basic_fee: 整段期間的基本電費 (元)
+        change_cost: 整段期間的變更費用 (元)
+        total_cost: 基本電費 + 變更費用 (元)
+        current_capacity: 目前契約容量 (千瓦)
+        baseline_cost: 完全不變更時的基本電費 (元)
+        n_states: 動態規劃使用的容量狀態數
+    """
+    months: np.ndarray
+    capacities: np.ndarray
+    monthly_fees: np.ndarray
+    wastes: np.ndarray
+    penalties: np.ndarray
+    changes: List[CapacityChange]
+    basic_fee: float
+    change_cost: float
+    total_cost: float
+    current_capacity: float
+    baseline_cost: float
+    n_states: int
+
+    @property
+    def savings(self) -> float:
+        """相較完全不變更可節省的金額 (元)"""
+        return self.baseline_cost - self.total_cost
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """轉為逐月的字典列表，方便畫圖或匯出 CSV / JSON"""
+        return [
+            {
+                'month': str(month),
+                'capacity': float(self.capacities[idx]),
+                'fee': float(self.monthly_fees[idx]),
+                'waste': float(self.wastes[idx]),
+                'penalty': float(self.penalties[idx]),
+            }
+            for idx, month in enumerate(self.months)
+        ]
+
+
+def _candidate_states(demands: np.ndarray, terms: MonthlyTerms, step: Optional[float],
+                      current_capacity: float) -> np.ndarray:
+    """所有月份費用曲線的轉折點 (對齊容量級距，見 candidate_capacities) 加上目前容量"""
+    candidates = candidate_capacities(demands, step, terms)
+    return np.unique(np.append(candidates[np.isfinite(candidates)], current_capacity))
+
+
+def _strict_prefix_min(values: np.ndarray) -> np.ndarray:
+    """result[k] = min(values[:k])，第一個位置為 inf"""
+    result = np.full(len(values), np.inf)
+    result[1:] = np.minimum.accumulate(values)[:-1]
+    return result
+
+
+def _strict_suffix_min(values: np.ndarray) -> np.ndarray:
+    """result[k] = min(values[k+1:])，最後一個位置為 inf"""
+    result = np.full(len(values), np.inf)
+    result[:-1] = np.minimum.accumulate(values[::-1])[::-1][1:]
+    return result
+
+
+def plan_capacity_changes(
+    monthly_demands: Sequence[float],
+    start_month: Union[str, date, np.datetime64],
+    current_capacity: float,
+    rules: ChangeRules,
+    step: Optional[float] = 1,
+    tariff_type: str = DEFAULT_TARIFF_TYPE
+) -> ContractPlan:
+    """
+    依需量預測求出總成本最低的契約容量調整排程
+
+    狀態為各月份費用曲線的轉折點與目前容量；每個月的轉移以前綴與後綴最小值
+    計算 (調降取較高容量的最小值，調升的費用對容量為線性)，計算量為
+    月份數 × 狀態數。各月份以當時適用的費率計算，可跨越費率調整。
+
+    Args:
+        monthly_demands: 從 start_month 起連續的逐月最高需量預測 (千瓦)
+        start_month: 排程第一個月 (例如 "2026-01")
+        current_capacity: 目前契約容量 (千瓦)
+        rules: 變更規則
+        step: 容量級距 (千瓦)，None 表示不限制
+        tariff_type: 電價種類
+
+    Returns:
+        ContractPlan 結果物件
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    demands = np.asarray(monthly_demands, dtype=float)
+    if demands.ndim != 1 or len(demands) == 0:
+        raise ValueError("至少需要 1 個月的需量預測")
+    if not np.all(np.isfinite(demands)):
+        raise ValueError("需量必須為有效數字")
+    if np.any(demands < 0):
+        raise ValueError("需量不能為負數")
+    if current_capacity <= 0:
+        raise ValueError("契約容量必須大於 0")
+    if step is not None and step <= 0:
+        raise ValueError("容量級距必須大於 0")
+
+    months = np.datetime64(start_month, 'M') + np.arange(len(demands))
+    terms = compile_terms(months.astype('datetime64[D]').tolist(), tariff_type)
+    states = _candidate_states(demands, terms, step, float(current_capacity))
+    start_state = int(np.searchsorted(states, current_capacity))
+
+    # fees[k, t]: 第 t 個月以第 k 個容量計費的基本電費
+    fees = fee_terms(states[:, np.newaxis], demands, terms)
+    increase_slope = rules.increase_fee_per_kw * states
+
+    # costs[t, k]: 第 t 個月結束時容量為第 k 個狀態的最低累計成本
+    costs = np.empty((len(demands), len(states)))
+    previous = np.full(len(states), np.inf)
+    previous[start_state] = 0.0
+
+    for month_idx in range(len(demands)):
+        best = np.minimum(previous, _strict_suffix_min(previous) + rules.decrease_fee)
+        if month_idx >= rules.lead_time_months:
+            increase = (_strict_prefix_min(previous - increase_slope)
+                        + rules.increase_fixed_fee + increase_slope)
+            best = np.minimum(best, increase)
+        costs[month_idx] = best + fees[:, month_idx]
+        previous = costs[month_idx]
+
+    # 由最後一個月回推；成本相同時優先不變更，其次選擇較小的容量
+    path = np.empty(len(demands), dtype=np.intp)
+    path[-1] = int(np.argmin(costs[-1]))
+    for month_idx in range(len(demands) - 1, 0, -1):
+        state = path[month_idx]
+        target = costs[month_idx, state] - fees[state, month_idx]
+        path[month_idx - 1] = _predecessor(costs[month_idx - 1], states, state, target,
+                                           rules, month_idx >= rules.lead_time_months)
+
+    capacities = states[path]
+
+    monthly_fees = fee_terms(capacities, demands, terms)
+    waste, penalty = waste_and_penalty_terms(capacities, demands, terms)
+
+    changes = []
+    previous_capacity = float(current_capacity)
+    for month_idx, capacity in enumerate(capacities.tolist()):
+        if capacity != previous_capacity:
+            lead = rules.lead_time_months if capacity > previous_capacity else 0
+            changes.append(CapacityChange(
+                request_month=months[month_idx] - lead,
+                effective_month=months[month_idx],
+                from_capacity=previous_capacity,
+                to_capacity=capacity,
+                cost=rules.change_cost(previous_capacity, capacity),
+            ))
+            previous_capacity = capacity
+
+    basic_fee = float(np.sum(monthly_fees))
+    change_cost = float(sum(change.cost for change in changes))
+    baseline = fee_terms(np.full(len(demands), float(current_capacity)), demands, terms)
+
+    return ContractPlan(
+        months=readonly_array(months),
+        capacities=readonly_array(capacities),
+        monthly_fees=readonly_array(monthly_fees),
+        wastes=readonly_array(waste),
+        penalties=readonly_array(penalty),
+        changes=changes,
+        basic_fee=basic_fee,
+        change_cost=change_cost,
+        total_cost=basic_fee + change_cost,
+        current_capacity=current_capacity,
+        baseline_cost=float(np.sum(baseline)),
+        n_states=len(states),
+    )
+
+
+def _predecessor(previous_costs: np.ndarray, states: np.ndarray, state: int, target: float,
+                 rules: ChangeRules, can_increase: bool) -> int:
+    """找出轉移到 state 且累計成本等於 target 的前一個月狀態"""
+    transition = np.full(len(states), np.inf)
+    transition[state] = 0.0
+    transition[state + 1:] = rules.decrease_fee
+    if can_increase:
+        transition[:state] = (rules.increase_fixed_fee
+                              + rules.increase_fee_per_kw * (states[state] - states[:state]))
+
+    totals = previous_costs + transition
+    if totals[state] <= target + 1e-9 * max(1.0, abs(target)):
+        return state
+    return int(np.argmin(totals))
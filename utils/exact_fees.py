@@ -0,0 +1,286 @@
+"""
+整數精確計費模組
+
+浮點數計算 (例如 173.2 × 容量 × 0.10 × 2) 會有微小的捨入誤差，費用幾乎
+相同的兩個容量可能因此選到不同的最佳解，與帳單也可能差幾分錢。
+這裡把所有數值換成 int64 整數後再做向量化計算，結果與計算順序無關，
+費用相同時一律選擇較小的容量。
+
+單位與換算規則:
+    容量、需量: 0.1 千瓦 (輸入以 0.1 千瓦為單位四捨五入，例如 37.25 → 37.3)
+    費率: 0.01 元/千瓦 (必須剛好是 0.01 元的倍數，否則視為錯誤)
+    超約容許比例: 千分比 (0.10 → 100，必須剛好是千分之一的倍數)
+    超約倍數: 必須為整數 (目前為 2 倍與 3 倍)
+    計算結果: 百萬分之一元 (MICRO_PER_NTD)，在這個單位下所有乘法皆無捨入
+
+與帳單的對應:
+    台電帳單的基本電費以每期 (每月) 為單位計算到元，四捨五入後再加總；
+    rounding="month" 會把每個月的費用以「四捨五入到元」處理 (0.5 元進位)，
+    與帳單相同。rounding="none" 保留完整精度，適合比較不同容量的差異。
+"""
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.calculator import candidate_capacities, monthly_terms
+from utils.tariffs import MonthlyTerms, Tariff
+
+CAPACITY_SCALE = 10          # 0.1 千瓦
+RATE_SCALE = 100             # 0.01 元/千瓦
+ALLOWANCE_SCALE = 1000       # 千分比
+MICRO_PER_NTD = 1_000_000    # 計算結果的單位：百萬分之一元
+
+ROUNDING_MODES = ("none", "month")
+
+# 超約容許範圍的內部單位為 0.0001 千瓦 (= 0.1 千瓦 × 千分比)
+_INNER_PER_UNIT = ALLOWANCE_SCALE
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def _exact_integers(values: np.ndarray, scale: int, name: str) -> np.ndarray:
+    """將數值乘上 scale 後轉為整數，無法剛好表示時拋出 ValueError"""
+    scaled = np.asarray(values, dtype=float) * scale
+    rounded = np.round(scaled)
+    if not np.allclose(scaled, rounded, rtol=0, atol=1e-6):
+        raise ValueError(f"{name}無法以 1/{scale} 為單位精確表示")
+    return rounded.astype(np.int64)
+
+
+def to_units(kilowatts: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+    """
+    將千瓦換算為 0.1 千瓦的整數 (四捨五入，0.05 進位)
+
+    Raises:
+        ValueError: 當數值不是有效數字或為負數時
+    """
+    values = np.asarray(kilowatts, dtype=float)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("需量與契約容量必須為有效數字")
+    if np.any(values < 0):
+        raise ValueError("需量與契約容量不能為負數")
+    # 先在 1e-9 千瓦內吸收浮點表示誤差 (例如 0.15 實際為 0.1499999...)，再半數進位
+    return np.floor(np.round(values * CAPACITY_SCALE, 6) + 0.5).astype(np.int64)
+
+
+def to_ntd(micro: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+    """將百萬分之一元換算為元 (僅供顯示，比較請使用整數)"""
+    return np.asarray(micro) / MICRO_PER_NTD
+
+
+def round_half_up(micro: np.ndarray, unit: int = MICRO_PER_NTD) -> np.ndarray:
+    """以 unit 為單位四捨五入 (0.5 進位，費用皆為非負數)"""
+    micro = np.asarray(micro, dtype=np.int64)
+    return (micro + unit // 2) // unit * unit
+
+
+class ExactTerms:
+    """
+    整數化的逐月計費參數
+
+    Attributes:
+        rates: 基本電費費率 (0.01 元/千瓦)
+        allowances: 超約容許比例 (千分比)
+        within_multipliers: 容許範圍內的超約倍數 (整數)
+        over_multipliers: 超過容許範圍的超約倍數 (整數)
+    """
+
+    def __init__(self, terms: MonthlyTerms):
+        self.rates = _exact_integers(terms.rates, RATE_SCALE, "基本電費費率")
+        self.allowances = _exact_integers(terms.allowances, ALLOWANCE_SCALE, "超約容許比例")
+        self.within_multipliers = _exact_integers(terms.within_multipliers, 1, "超約倍數")
+        self.over_multipliers = _exact_integers(terms.over_multipliers, 1, "超約倍數")
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def max_monthly_fee(self, max_units: int) -> int:
+        """容量與需量不超過 max_units 時單月費用的上限 (百萬分之一元)，用於檢查溢位"""
+        multiplier = int(np.max(np.maximum(self.within_multipliers, self.over_multipliers)))
+        inner = max_units * _INNER_PER_UNIT * (1 + multiplier)
+        return int(np.max(self.rates)) * inner
+
+
+def exact_terms(tariff: Optional[Tariff] = None) -> ExactTerms:
+    """取得費率的整數化 1~12 月計費參數，未指定時使用今日適用的費率"""
+    return ExactTerms(monthly_terms(tariff))
+
+
+def _check_range(capacity_units: np.ndarray, demand_units: np.ndarray,
+                 terms: ExactTerms, months: int) -> None:
+    """確認年度加總不會超出 int64"""
+    max_units = int(max(np.max(capacity_units, initial=0), np.max(demand_units, initial=0)))
+    if terms.max_monthly_fee(max_units) * months >= _INT64_MAX:
+        raise ValueError("需量或契約容量過大，超出精確計算的範圍")
+
+
+def _exact_fee_terms(capacity: np.ndarray, demand: np.ndarray,
+                     terms: ExactTerms) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    逐元素計算基本電費、浪費與罰款 (百萬分之一元，月份在最後一軸)
+
+    在 0.0001 千瓦的內部單位下，容量 c、超出量 e = d - c 與容許範圍
+    c × 容許比例 都是整數，乘上以 0.01 元為單位的費率後剛好是百萬分之一元。
+    """
+    rate = terms.rates
+    base = capacity * _INNER_PER_UNIT
+    excess = (demand - capacity) * _INNER_PER_UNIT
+    allowed = capacity * terms.allowances
+
+    waste = np.where(excess <= 0, -excess, 0) * rate
+    penalty = np.where(
+        excess <= 0,
+        0,
+        np.where(
+            excess <= allowed,
+            excess * terms.within_multipliers,
+            allowed * terms.within_multipliers + (excess - allowed) * terms.over_multipliers
+        )
+    ) * rate
+    return base * rate + penalty, waste, penalty
+
+
+def exact_fee_matrix(
+    capacities: Sequence[float],
+    monthly_demands: Sequence[float],
+    tariff: Optional[Tariff] = None,
+    rounding: str = "none"
+) -> np.ndarray:
+    """
+    一次計算多組契約容量在各月份的基本電費 (整數)
+
+    Args:
+        capacities: 契約容量陣列 (千瓦)，長度 N
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
+        rounding: "none" 保留完整精度，"month" 每月四捨五入到元
+
+    Returns:
+        形狀為 (N, 12) 的費用矩陣 (百萬分之一元，int64)
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"捨入方式必須為 {' 或 '.join(ROUNDING_MODES)}")
+    if len(monthly_demands) != 12:
+        raise ValueError("必須提供 12 個月的需量資料")
+
+    terms = exact_terms(tariff)
+    capacity_units = to_units(capacities)[:, np.newaxis]
+    demand_units = to_units(monthly_demands)[np.newaxis, :]
+    if np.any(capacity_units <= 0):
+        raise ValueError("契約容量必須大於 0")
+    _check_range(capacity_units, demand_units, terms, 12)
+
+    fees, _, _ = _exact_fee_terms(capacity_units, demand_units, terms)
+    return round_half_up(fees) if rounding == "month" else fees
+
+
+def exact_annual_fees(
+    capacities: Sequence[float],
+    monthly_demands: Sequence[float],
+    tariff: Optional[Tariff] = None,
+    rounding: str = "none"
+) -> np.ndarray:
+    """
+    計算多組契約容量的年度基本電費 (整數)
+
+    Returns:
+        長度 N 的年度費用 (百萬分之一元，int64)，整數加總與順序無關
+    """
+    return exact_fee_matrix(capacities, monthly_demands, tariff, rounding).sum(axis=1)
+
+
+def exact_waste_and_penalty(
+    capacity: float,
+    monthly_demands: Sequence[float],
+    tariff: Optional[Tariff] = None
+) -> Tuple[int, int]:
+    """
+    計算年度浪費金額與罰款金額 (整數)
+
+    Returns:
+        (浪費金額, 罰款金額) 的元組 (百萬分之一元)
+    """
+    if len(monthly_demands) != 12:
+        raise ValueError("必須提供 12 個月的需量資料")
+
+    terms = exact_terms(tariff)
+    capacity_units = to_units(capacity)
+    demand_units = to_units(monthly_demands)
+    if capacity_units <= 0:
+        raise ValueError("契約容量必須大於 0")
+    _check_range(capacity_units, demand_units, terms, 12)
+
+    _, waste, penalty = _exact_fee_terms(capacity_units, demand_units, terms)
+    return int(waste.sum()), int(penalty.sum())
+
+
+def _candidate_units(demand_units: np.ndarray, step_units: int, terms: MonthlyTerms) -> np.ndarray:
+    """
+    費用曲線轉折點 d 與 d/(1+容許比例) 兩側的格點 (0.1 千瓦，遞增排序)
+
+    以 calculator.candidate_capacities 在 0.1 千瓦的單位下列舉，結果都是整數格點。
+    d/(1+容許比例) 經過浮點數計算：剛好落在格點上時可能多出相鄰的格點，
+    但不會漏掉該格點；不在格點上時與格點的距離遠大於浮點誤差。多出的
+    候選值只是多比較一次，費用本身仍以整數計算。
+    """
+    candidates = candidate_capacities(demand_units.astype(float), step_units, terms)
+    return np.unique(np.rint(candidates).astype(np.int64))
+
+
+def find_optimal_capacity_exact(
+    monthly_demands: Sequence[float],
+    step: float = 1,
+    tariff: Optional[Tariff] = None,
+    rounding: str = "none"
+) -> Tuple[float, int, List[int]]:
+    """
+    以整數計算尋找最佳契約容量
+
+    rounding="none" 時年度費用為分段線性，只需比較轉折點兩側的格點；
+    rounding="month" 時每月四捨五入會讓曲線在轉折點之間出現階梯，
+    因此改為比較轉折點範圍內的所有格點。費用相同時選擇較小的容量。
+
+    Args:
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        step: 容量級距 (千瓦)，必須是 0.1 千瓦的倍數
+        tariff: 費率版本，預設為今日適用的費率
+        rounding: "none" 或 "month"
+
+    Returns:
+        (最佳容量 (千瓦), 最低年度費用 (百萬分之一元), 逐月費用列表) 的元組
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"捨入方式必須為 {' 或 '.join(ROUNDING_MODES)}")
+    if len(monthly_demands) != 12:
+        raise ValueError("必須提供 12 個月的需量資料")
+    if step <= 0:
+        raise ValueError("容量級距必須大於 0")
+
+    float_terms = monthly_terms(tariff)
+    terms = ExactTerms(float_terms)
+    step_units = int(_exact_integers(step, CAPACITY_SCALE, "容量級距"))
+    if step_units <= 0:
+        raise ValueError("容量級距必須大於 0")
+    demand_units = to_units(monthly_demands)
+
+    candidates = _candidate_units(demand_units, step_units, float_terms)
+    if rounding == "month":
+        candidates = np.arange(candidates[0], candidates[-1] + 1, step_units, dtype=np.int64)
+    _check_range(candidates, demand_units, terms, 12)
+
+    fees, _, _ = _exact_fee_terms(candidates[:, np.newaxis], demand_units[np.newaxis, :], terms)
+    if rounding == "month":
+        fees = round_half_up(fees)
+    annual = fees.sum(axis=1)
+
+    # 候選值遞增排序，費用相同時 argmin 取第一個 (較小的容量)
+    best = int(np.argmin(annual))
+    capacity = candidates[best] / CAPACITY_SCALE
+    if float(step).is_integer():
+        capacity = int(candidates[best] // CAPACITY_SCALE)
+    return capacity, int(annual[best]), fees[best].tolist()
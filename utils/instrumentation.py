@@ -0,0 +1,381 @@
+"""
+執行階段計時模組
+
+以 span / timed 記錄每個階段 (頁面各區塊、計算、Google Sheets 呼叫) 的耗時，
+在程序內彙總 p50 / p95 / p99，可輸出 Prometheus 文字格式或 JSON；
+每次 Streamlit 重新執行結束時輸出一行各階段耗時的紀錄。
+
+需要找出單次慢的重新執行時，可在伺服器端設定環境變數 OPTIPOWER_PROFILE=1
+(每次都分析) / OPTIPOWER_PROFILE_SLOW_MS=800 (只保留超過 800ms 的那次)，
+以 cProfile 分析整次重新執行並將前幾名的函數寫入紀錄；.prof 檔只保留最新
+的 OPTIPOWER_PROFILE_KEEP 個。
+只使用標準函式庫，API 服務與命令列工具也可以使用。
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import math
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("optipower.perf")
+
+# 每個階段保留最近幾筆耗時計算百分位數
+WINDOW_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+PROFILE_ENV = "OPTIPOWER_PROFILE"
+PROFILE_SLOW_MS_ENV = "OPTIPOWER_PROFILE_SLOW_MS"
+PROFILE_DIR_ENV = "OPTIPOWER_PROFILE_DIR"
+PROFILE_KEEP_ENV = "OPTIPOWER_PROFILE_KEEP"
+PROFILE_KEEP = 20
+PROFILE_TOP = 25
+
+
+class StageStats:
+    """單一階段的耗時統計 (最近 WINDOW_SIZE 筆與累計值)"""
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self) -> Dict[float, float]:
+        """以最近的紀錄計算百分位數 (nearest-rank)"""
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[max(0, math.ceil(q * len(ordered) - 1e-9) - 1)] for q in QUANTILES}
+
+
+class Recorder:
+    """程序內所有階段的耗時彙總 (執行緒安全)"""
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(self.window)
+            stats.add(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        回傳各階段的統計 (秒)
+
+        Returns:
+            {階段: {"count", "sum", "p50", "p95", "p99"}}
+        """
+        with self._lock:
+            stages = [(name, stats.count, stats.total, stats.quantiles())
+                      for name, stats in self._stages.items()]
+        return {
+            name: {
+                "count": count,
+                "sum": total,
+                **{f"p{int(q * 100)}": value for q, value in quantiles.items()},
+            }
+            for name, count, total, quantiles in sorted(stages)
+        }
+
+
+RECORDER = Recorder()
+
+# 其他模組註冊、一併輸出到 /metrics 的統計 (名稱 -> 回傳 {對象: {欄位: 數值}} 的函數)
+_collectors: Dict[str, Callable[[], Dict[str, Dict[str, float]]]] = {}
+
+
+def register_collector(name: str, collect: Callable[[], Dict[str, Dict[str, float]]]) -> None:
+    """
+    註冊一併輸出到 /metrics 的統計 (例如快取的命中次數)
+
+    Prometheus 格式輸出為 optipower_{name}_{欄位}{name="對象"}，
+    JSON 格式放在 "collectors" 之下。
+
+    Args:
+        name: 統計名稱，例如 "cache"
+        collect: 回傳 {對象: {欄位: 數值}} 的函數，每次輸出時呼叫
+    """
+    _collectors[name] = collect
+
+# 目前這次重新執行所記錄的階段 [(名稱, 秒數)]；不在重新執行中時為 None
+_current_rerun: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("optipower_rerun", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    記錄一個區塊的耗時
+
+    用法:
+        with span("render_sidebar"):
+            render_sidebar()
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        RECORDER.record(name, seconds)
+        stages = _current_rerun.get()
+        if stages is not None:
+            stages.append((name, seconds))
+
+
+def timed(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    記錄函數每次呼叫耗時的裝飾器
+
+    Args:
+        name: 階段名稱，預設為函數名稱
+    """
+    def decorator(func: Callable) -> Callable:
+        stage = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _profile_threshold_ms() -> Optional[float]:
+    """依環境變數決定是否分析這次重新執行，回傳保留報告的最低耗時 (毫秒)"""
+    slow_ms = os.environ.get(PROFILE_SLOW_MS_ENV)
+    if slow_ms:
+        try:
+            return float(slow_ms)
+        except ValueError:
+            logger.warning("%s 必須為數字: %r", PROFILE_SLOW_MS_ENV, slow_ms)
+    if os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return 0.0
+    return None
+
+
+_profile_lock = threading.Lock()
+
+
+def _profile_keep() -> int:
+    """.prof 檔最多保留的個數"""
+    keep = os.environ.get(PROFILE_KEEP_ENV)
+    if keep:
+        try:
+            return max(1, int(keep))
+        except ValueError:
+            logger.warning("%s 必須為整數: %r", PROFILE_KEEP_ENV, keep)
+    return PROFILE_KEEP
+
+
+def _rotate_profiles(directory: str, label: str, keep: int) -> None:
+    """刪除最舊的分析檔，只保留最新的 keep 個"""
+    prefix = f"optipower-{label}-"
+    try:
+        names = [name for name in os.listdir(directory)
+                 if name.startswith(prefix) and name.endswith(".prof")]
+    except OSError:
+        return
+    # 檔名含時間戳記，依檔名排序即為時間順序
+    for name in sorted(names)[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError as e:
+            logger.warning("無法刪除分析檔 %s: %s", name, e)
+
+
+def _write_profile(profiler: cProfile.Profile, label: str) -> str:
+    """儲存分析結果 (.prof 可用 snakeviz 等工具檢視)，回傳前幾名函數的文字報告"""
+    directory = os.environ.get(PROFILE_DIR_ENV) or tempfile.gettempdir()
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1e6) % 1000000:06d}"
+    path = os.path.join(directory, f"optipower-{label}-{stamp}.prof")
+    with _profile_lock:
+        try:
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.warning("無法寫入分析檔 %s: %s", path, e)
+            path = None
+        _rotate_profiles(directory, label, _profile_keep())
+
+    buffer = io.StringIO()
+    pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    header = f"profile saved to {path}\n" if path else ""
+    return header + buffer.getvalue()
+
+
+class RerunTrace:
+    """
+    一次重新執行的計時結果
+
+    Attributes:
+        stages: 依執行順序的 (階段, 秒數)
+        seconds: 總耗時 (秒)，結束後才有值
+        profile_report: cProfile 報告文字，有分析且超過門檻時才有值
+    """
+
+    def __init__(self) -> None:
+        self.stages: List[Tuple[str, float]] = []
+        self.seconds: Optional[float] = None
+        self.profile_report: Optional[str] = None
+
+    def format(self) -> str:
+        """格式化為單行文字"""
+        parts = [f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.stages]
+        return f"rerun {self.seconds * 1000:.1f}ms: " + ", ".join(parts)
+
+
+@contextmanager
+def rerun(name: str = "rerun") -> Iterator[RerunTrace]:
+    """
+    記錄一次完整的重新執行，結束時輸出一行各階段耗時的紀錄
+
+    是否以 cProfile 分析只由伺服器端的環境變數決定，
+    分析報告只寫入紀錄，不回傳給使用者。
+
+    Args:
+        name: 總耗時記錄的階段名稱
+    """
+    trace = RerunTrace()
+    token = _current_rerun.set(trace.stages)
+
+    threshold_ms = _profile_threshold_ms()
+    profiler = None
+    if threshold_ms is not None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 其他執行緒已在分析中 (Python 3.12 起同時只能有一個 profiler)
+            profiler = None
+
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        _current_rerun.reset(token)
+        RECORDER.record(name, trace.seconds)
+        logger.info(trace.format())
+
+        if profiler is not None and trace.seconds * 1000 >= threshold_ms:
+            trace.profile_report = _write_profile(profiler, name)
+            logger.info("%s profile:\n%s", name, trace.profile_report)
+
+
+def _label(value: str) -> str:
+    """跳脫 Prometheus 標籤值中的反斜線與引號"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(recorder: Recorder = RECORDER) -> str:
+    """以 Prometheus 文字格式輸出各階段統計 (summary) 與註冊的其他統計 (gauge)"""
+    lines = [
+        "# HELP optipower_stage_seconds Time spent in each instrumented stage.",
+        "# TYPE optipower_stage_seconds summary",
+    ]
+    for stage, stats in recorder.snapshot().items():
+        label = _label(stage)
+        for q in QUANTILES:
+            lines.append(
+                f'optipower_stage_seconds{{stage="{label}",quantile="{q}"}} '
+                f'{stats[f"p{int(q * 100)}"]:.6f}'
+            )
+        lines.append(f'optipower_stage_seconds_sum{{stage="{label}"}} {stats["sum"]:.6f}')
+        lines.append(f'optipower_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+
+    for name, collect in sorted(_collectors.items()):
+        fields: Dict[str, List[str]] = {}
+        for target, values in sorted(collect().items()):
+            for field, value in values.items():
+                fields.setdefault(field, []).append(
+                    f'optipower_{name}_{field}{{{name}="{_label(target)}"}} {value}')
+        for field, samples in fields.items():
+            lines.append(f"# TYPE optipower_{name}_{field} gauge")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def json_report(recorder: Recorder = RECORDER) -> str:
+    """以 JSON 輸出各階段統計 (毫秒)，註冊的其他統計放在 "collectors" 之下"""
+    report = {
+        stage: {
+            key: value if key == "count" else round(value * 1000, 3)
+            for key, value in stats.items()
+        }
+        for stage, stats in recorder.snapshot().items()
+    }
+    if _collectors:
+        report["collectors"] = {name: collect() for name, collect in sorted(_collectors.items())}
+    return json.dumps(report, ensure_ascii=False)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Any:
+    """
+    在背景執行緒啟動只提供 /metrics 的 HTTP 服務 (給 Streamlit 程序使用)
+
+    GET /metrics 回傳 Prometheus 文字格式，GET /metrics?format=json 回傳 JSON。
+
+    Returns:
+        ThreadingHTTPServer 物件
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition("?")
+            if path != "/metrics":
+                self.send_error(404)
+                return
+            status, content_type, body = metrics_response(query)
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="optipower-metrics", daemon=True).start()
+    logger.info("metrics on http://%s:%d/metrics", *server.server_address[:2])
+    return server
+
+
+def metrics_response(query: str = "") -> Tuple[int, str, str]:
+    """
+    依查詢字串產生 /metrics 的回應
+
+    Returns:
+        (狀態碼, Content-Type, 內容)
+    """
+    if "format=json" in query:
+        return 200, "application/json; charset=utf-8", json_report()
+    return 200, "text/plain; version=0.0.4; charset=utf-8", prometheus_text()
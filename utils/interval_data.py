@@ -0,0 +1,444 @@
+"""
+智慧電表 (AMI) 15 分鐘需量資料讀取模組
+
+將每 15 分鐘一筆的需量資料 (每個電表一年 35,040 筆) 以固定大小的批次
+串流讀取，逐批以 NumPy 分組歸約成「電表 × 月份」的最高需量，記憶體
+用量只與批次大小有關。整理後的 12 個月需量可直接交給
+find_optimal_capacity 計算。
+"""
+import csv
+import io
+import itertools
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+import numpy as np
+
+
+# 台灣沒有日光節約時間，一律以 UTC+8 的當地時間計算月份
+TAIWAN_OFFSET_MINUTES = 8 * 60
+
+# 時間戳記結尾的時區，例如 +08:00、+0800、Z
+_OFFSET_PATTERN = re.compile(r"(Z|[+-]\d{2}:?\d{2})$")
+
+# 只有一個電表 (檔案沒有電表欄位) 時使用的電表代號
+DEFAULT_METER = "default"
+
+# 將 (電表代號, 月份) 合併成單一整數 key 時，月份所佔的範圍
+_MONTH_SPAN = 1 << 32
+
+
+@dataclass(frozen=True)
+class MonthlyPeaks:
+    """
+    各電表逐月的最高需量
+
+    Attributes:
+        meters: 電表代號 (依名稱排序)
+        months: 連續的月份 (numpy datetime64[M])
+        peaks: 形狀為 (電表數, 月份數) 的最高需量 (千瓦)，沒有資料的月份為 nan
+        readings: 與 peaks 相同形狀的有效筆數
+        interval_minutes: 每筆資料的間隔 (分鐘)
+        skipped_rows: 時間格式錯誤而略過的筆數
+        negative_rows: 需量為負數 (資料錯誤或逆送電) 而略過的筆數
+    """
+    meters: Tuple[str, ...]
+    months: np.ndarray
+    peaks: np.ndarray
+    readings: np.ndarray
+    interval_minutes: int = 15
+    skipped_rows: int = 0
+    negative_rows: int = 0
+
+    def _meter_row(self, meter: Optional[str]) -> int:
+        """取得電表在 peaks 中的列索引，只有一個電表時可省略"""
+        if meter is None:
+            if len(self.meters) != 1:
+                raise ValueError("檔案中有多個電表，請指定電表代號")
+            return 0
+        try:
+            return self.meters.index(meter)
+        except ValueError:
+            raise ValueError(f"找不到電表: {meter}") from None
+
+    def _window(self, row: int, end_month: Optional[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        monthly_demands 使用的連續 12 個月
+
+        Returns:
+            (12 個月份, 各月份在 months 中的索引, 索引是否在資料範圍內) 的元組
+        """
+        if end_month is None:
+            available = np.flatnonzero(~np.isnan(self.peaks[row]))
+            if available.size == 0:
+                raise ValueError("此電表沒有任何有效的需量資料")
+            end = self.months[available[-1]]
+        else:
+            end = np.datetime64(end_month, 'M')
+
+        window = np.arange(end - 11, end + 1)
+        idx = (window - self.months[0]).astype(int) if len(self.months) else np.full(12, -1)
+        inside = (idx >= 0) & (idx < len(self.months))
+        return window, idx, inside
+
+    def incomplete_months(self, meter: Optional[str] = None, end_month: Optional[str] = None,
+                          threshold: float = 1.0) -> List[Tuple[np.datetime64, float]]:
+        """
+        monthly_demands 使用的 12 個月中，資料完整度低於 threshold 的月份
+
+        缺少部分時段的月份仍會算出最高需量，但可能低於實際值。
+
+        Args:
+            meter: 電表代號，只有一個電表時可省略
+            end_month: 最後一個月，預設為最後一個有資料的月份
+            threshold: 完整度門檻 (0~1)
+
+        Returns:
+            [(月份, 完整度)] 列表，依月份排序；完全沒有資料的月份完整度為 0
+
+        Raises:
+            ValueError: 電表不存在或沒有任何有效資料時
+        """
+        row = self._meter_row(meter)
+        window, idx, inside = self._window(row, end_month)
+        ratios = np.zeros(12)
+        ratios[inside] = self.completeness[row][idx[inside]]
+        return [(month, float(ratio)) for month, ratio in zip(window, ratios) if ratio < threshold]
+
+    @property
+    def completeness(self) -> np.ndarray:
+        """各電表各月份的資料完整度 (有效筆數 / 應有筆數)"""
+        days = ((self.months + 1).astype('datetime64[D]') - self.months.astype('datetime64[D]')).astype(int)
+        expected = days * (24 * 60 // self.interval_minutes)
+        return self.readings / expected[np.newaxis, :]
+
+    def monthly_demands(self, meter: Optional[str] = None,
+                        end_month: Optional[str] = None) -> List[float]:
+        """
+        取得連續 12 個月的最高需量，並依 1~12 月排列
+
+        find_optimal_capacity 以索引判斷夏月與非夏月，因此跨年度的
+        12 個月 (例如 2023/7 ~ 2024/6) 會重新排成 1 月 ~ 12 月的順序。
+
+        Args:
+            meter: 電表代號，只有一個電表時可省略
+            end_month: 最後一個月 (例如 "2024-06")，預設為最後一個有資料的月份
+
+        Returns:
+            12 個月的最高需量列表 (千瓦)，依 1~12 月排列
+
+        Raises:
+            ValueError: 電表不存在或 12 個月中有月份沒有資料時
+        """
+        row = self._meter_row(meter)
+        window, idx, inside = self._window(row, end_month)
+        values = np.full(12, np.nan)
+        values[inside] = self.peaks[row][idx[inside]]
+
+        missing = window[np.isnan(values)]
+        if missing.size:
+            raise ValueError("以下月份沒有需量資料: " + ", ".join(str(m) for m in missing))
+
+        calendar_idx = window.astype(int) % 12
+        demands = np.empty(12)
+        demands[calendar_idx] = values
+        return demands.tolist()
+
+
+class _PeakAccumulator:
+    """逐批累計 (電表, 月份) 的最高需量與筆數"""
+
+    def __init__(self):
+        self.meter_codes: Dict[str, int] = {}
+        self.peaks: Dict[int, float] = {}
+        self.readings: Dict[int, int] = {}
+        self.skipped_rows = 0
+        self.negative_rows = 0
+
+    def _encode_meters(self, meters: Sequence[str]) -> np.ndarray:
+        """將電表代號轉為整數代碼 (只對批次中不重複的代號查表)"""
+        names, inverse = np.unique(np.asarray(meters, dtype=str), return_inverse=True)
+        codes = np.array([
+            self.meter_codes.setdefault(str(name), len(self.meter_codes)) for name in names
+        ], dtype=np.int64)
+        return codes[inverse]
+
+    def add(self, meters: Optional[Sequence[str]], stamps: np.ndarray, demands: np.ndarray) -> None:
+        """
+        加入一批資料
+
+        Args:
+            meters: 各筆資料的電表代號，None 表示只有一個電表
+            stamps: 當地時間 (datetime64[m])，格式錯誤的為 NaT
+            demands: 需量 (千瓦)，缺值為 nan
+        """
+        bad_stamps = np.isnat(stamps)
+        self.skipped_rows += int(bad_stamps.sum())
+        negative = ~bad_stamps & (demands < 0)
+        self.negative_rows += int(negative.sum())
+
+        if meters is None:
+            codes = np.full(len(stamps), self.meter_codes.setdefault(DEFAULT_METER, 0), dtype=np.int64)
+        else:
+            codes = self._encode_meters(meters)
+
+        # 缺值 (nan) 與負數不計入最高需量與筆數 (該月的完整度因此降低)
+        valid = ~bad_stamps & np.isfinite(demands) & ~negative
+        if not valid.any():
+            return
+
+        months = stamps[valid].astype('datetime64[M]').astype(np.int64)
+        keys = codes[valid] * _MONTH_SPAN + (months + _MONTH_SPAN // 2)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        chunk_peaks = np.full(len(unique_keys), -np.inf)
+        np.maximum.at(chunk_peaks, inverse, demands[valid])
+        chunk_counts = np.bincount(inverse, minlength=len(unique_keys))
+
+        for key, peak, count in zip(unique_keys.tolist(), chunk_peaks.tolist(), chunk_counts.tolist()):
+            self.peaks[key] = max(self.peaks.get(key, -np.inf), peak)
+            self.readings[key] = self.readings.get(key, 0) + count
+
+    def result(self, interval_minutes: int) -> MonthlyPeaks:
+        """整理成 MonthlyPeaks"""
+        meters = tuple(sorted(self.meter_codes))
+        code_rows = np.empty(len(meters), dtype=np.int64)
+        code_rows[[self.meter_codes[m] for m in meters]] = np.arange(len(meters))
+        if not self.peaks:
+            return MonthlyPeaks(
+                meters=meters,
+                months=np.array([], dtype='datetime64[M]'),
+                peaks=np.empty((len(meters), 0)),
+                readings=np.empty((len(meters), 0), dtype=np.int64),
+                interval_minutes=interval_minutes,
+                skipped_rows=self.skipped_rows,
+            negative_rows=self.negative_rows,
+            )
+
+        keys = np.fromiter(self.peaks, dtype=np.int64, count=len(self.peaks))
+        rows = code_rows[keys // _MONTH_SPAN]
+        months = keys % _MONTH_SPAN - _MONTH_SPAN // 2
+        first, last = months.min(), months.max()
+
+        peaks = np.full((len(meters), last - first + 1), np.nan)
+        readings = np.zeros(peaks.shape, dtype=np.int64)
+        peaks[rows, months - first] = [self.peaks[key] for key in keys.tolist()]
+        readings[rows, months - first] = [self.readings[key] for key in keys.tolist()]
+
+        return MonthlyPeaks(
+            meters=meters,
+            months=np.arange(first, last + 1).astype('datetime64[M]'),
+            peaks=peaks,
+            readings=readings,
+            interval_minutes=interval_minutes,
+            skipped_rows=self.skipped_rows,
+            negative_rows=self.negative_rows,
+        )
+
+
+def parse_timestamps(values: Sequence[str]) -> np.ndarray:
+    """
+    將時間戳記字串轉為台灣當地時間
+
+    支援 "2024-01-01 00:15"、"2024/01/01 00:15"、"2024-01-01T00:15:00+08:00"
+    等格式；帶有其他時區的時間會換算成 UTC+8，無法解析的為 NaT。
+
+    Returns:
+        datetime64[m] 陣列
+    """
+    normalized = []
+    shifts = {}
+    for idx, text in enumerate(values):
+        text = str(text).strip().replace('/', '-')
+        match = _OFFSET_PATTERN.search(text)
+        if match:
+            offset = match.group(1)
+            text = text[:match.start()]
+            if offset == 'Z':
+                minutes = 0
+            else:
+                digits = offset[1:].replace(':', '')
+                minutes = int(digits[:2]) * 60 + int(digits[2:])
+                minutes = minutes if offset[0] == '+' else -minutes
+            if minutes != TAIWAN_OFFSET_MINUTES:
+                shifts[idx] = TAIWAN_OFFSET_MINUTES - minutes
+        normalized.append(text)
+
+    try:
+        stamps = np.array(normalized, dtype='datetime64[m]')
+    except ValueError:
+        # 整批解析失敗時逐筆解析，只把格式錯誤的標為 NaT
+        stamps = np.empty(len(normalized), dtype='datetime64[m]')
+        for idx, text in enumerate(normalized):
+            try:
+                stamps[idx] = np.datetime64(text, 'm')
+            except ValueError:
+                stamps[idx] = np.datetime64('NaT')
+
+    for idx, minutes in shifts.items():
+        stamps[idx] += np.timedelta64(minutes, 'm')
+    return stamps
+
+
+def _parse_demands(values: Sequence[Any]) -> np.ndarray:
+    """將需量欄位轉為浮點數陣列，空白或非數值視為缺值 (nan)"""
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        demands = np.empty(len(values))
+        for idx, value in enumerate(values):
+            try:
+                demands[idx] = float(value)
+            except (TypeError, ValueError):
+                demands[idx] = np.nan
+        return demands
+
+
+def _column_index(header: List[str], name: str) -> int:
+    """取得欄位索引，找不到時提示檔案中的欄位"""
+    try:
+        return header.index(name)
+    except ValueError:
+        raise ValueError(f"找不到欄位 {name}，檔案欄位為: {', '.join(header)}") from None
+
+
+def _open_text(source: Union[str, os.PathLike, TextIO]) -> Tuple[TextIO, bool]:
+    """開啟檔案路徑或直接使用已開啟的文字串流，回傳 (串流, 是否需要關閉)"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, newline='', encoding='utf-8-sig'), True
+    if isinstance(source, io.RawIOBase) or isinstance(source, io.BufferedIOBase):
+        return io.TextIOWrapper(source, newline='', encoding='utf-8-sig'), False
+    return source, False
+
+
+def read_interval_csv(
+    source: Union[str, os.PathLike, TextIO],
+    timestamp_column: str = "timestamp",
+    demand_column: str = "demand_kw",
+    meter_column: Optional[str] = "meter_id",
+    chunk_size: int = 100_000,
+    interval_ending: bool = False,
+    interval_minutes: int = 15
+) -> MonthlyPeaks:
+    """
+    串流讀取 15 分鐘需量 CSV 並歸約為逐月最高需量
+
+    Args:
+        source: CSV 檔案路徑或已開啟的串流 (第一列為欄位名稱)
+        timestamp_column: 時間欄位名稱
+        demand_column: 需量欄位名稱 (千瓦)
+        meter_column: 電表代號欄位名稱；檔案沒有此欄位時視為單一電表
+        chunk_size: 每批次讀取的筆數
+        interval_ending: 時間是否為區間結束時間 (例如 2/1 00:00 代表 1/31 23:45~24:00)
+        interval_minutes: 每筆資料的間隔 (分鐘)
+
+    Returns:
+        MonthlyPeaks 結果物件
+
+    Raises:
+        ValueError: 當檔案格式不合理時
+        csv.Error: 當 CSV 本身無法解析時 (例如欄位過長)
+    """
+    if chunk_size <= 0:
+        raise ValueError("批次大小必須大於 0")
+
+    stream, should_close = _open_text(source)
+    try:
+        reader = csv.reader(stream)
+        header = [name.strip() for name in next(reader, [])]
+        if not header:
+            raise ValueError("CSV 檔案沒有欄位名稱")
+
+        time_idx = _column_index(header, timestamp_column)
+        demand_idx = _column_index(header, demand_column)
+        meter_idx = header.index(meter_column) if meter_column in header else None
+
+        def read_columns(rows: List[List[str]]) -> Tuple[Any, ...]:
+            padded = [row + [''] * (len(header) - len(row)) for row in rows if row]
+            stamps = [row[time_idx] for row in padded]
+            demands = [row[demand_idx] for row in padded]
+            meters = None if meter_idx is None else [row[meter_idx].strip() for row in padded]
+            return meters, stamps, demands
+
+        batches = (
+            read_columns(rows)
+            for rows in iter(lambda: list(itertools.islice(reader, chunk_size)), [])
+        )
+        return _reduce_batches(batches, interval_ending, interval_minutes)
+    finally:
+        if should_close:
+            stream.close()
+
+
+def read_interval_parquet(
+    path: Union[str, os.PathLike],
+    timestamp_column: str = "timestamp",
+    demand_column: str = "demand_kw",
+    meter_column: Optional[str] = "meter_id",
+    chunk_size: int = 100_000,
+    interval_ending: bool = False,
+    interval_minutes: int = 15
+) -> MonthlyPeaks:
+    """
+    串流讀取 15 分鐘需量 Parquet 檔 (需安裝 pyarrow)
+
+    參數與回傳值同 read_interval_csv。時間欄位可為字串或時間型別；
+    帶時區的時間會換算成台灣時間。
+    """
+    if chunk_size <= 0:
+        raise ValueError("批次大小必須大於 0")
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("讀取 Parquet 檔需要安裝 pyarrow (pip install pyarrow)") from None
+
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    for name in (timestamp_column, demand_column):
+        _column_index(names, name)
+    use_meter = meter_column in names
+    columns = [timestamp_column, demand_column] + ([meter_column] if use_meter else [])
+
+    def read_columns() -> Iterator[Tuple[Any, ...]]:
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            stamps = batch.column(timestamp_column)
+            tz = getattr(stamps.type, 'tz', None)
+            if hasattr(stamps.type, 'unit'):
+                # 時間型別：帶時區的值為 UTC，需換算成台灣時間
+                values = stamps.to_numpy(zero_copy_only=False).astype('datetime64[m]')
+                if tz is not None:
+                    values = values + np.timedelta64(TAIWAN_OFFSET_MINUTES, 'm')
+            else:
+                values = stamps.to_pylist()
+            demands = batch.column(demand_column).to_numpy(zero_copy_only=False)
+            meters = ([str(m).strip() for m in batch.column(meter_column).to_pylist()]
+                      if use_meter else None)
+            yield meters, values, np.asarray(demands, dtype=float)
+
+    return _reduce_batches(read_columns(), interval_ending, interval_minutes)
+
+
+def _reduce_batches(
+    batches: Iterable[Tuple[Optional[Sequence[str]], Any, Any]],
+    interval_ending: bool,
+    interval_minutes: int
+) -> MonthlyPeaks:
+    """將逐批的 (電表, 時間, 需量) 歸約為 MonthlyPeaks"""
+    accumulator = _PeakAccumulator()
+    for meters, stamps, demands in batches:
+        if not isinstance(stamps, np.ndarray) or stamps.dtype.kind != 'M':
+            stamps = parse_timestamps(stamps)
+        if interval_ending:
+            # 區間結束時間往前 1 分鐘，月底最後一筆才會算在當月
+            stamps = stamps - np.timedelta64(1, 'm')
+        accumulator.add(meters, stamps, _parse_demands(demands))
+    return accumulator.result(interval_minutes)
+
+
+def read_interval_file(path: Union[str, os.PathLike], **kwargs) -> MonthlyPeaks:
+    """依副檔名讀取 CSV 或 Parquet 的 15 分鐘需量資料 (參數同 read_interval_csv)"""
+    if str(path).lower().endswith(('.parquet', '.pq')):
+        return read_interval_parquet(path, **kwargs)
+    return read_interval_csv(path, **kwargs)
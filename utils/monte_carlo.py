@@ -0,0 +1,306 @@
+"""
+蒙地卡羅穩健契約容量模組
+
+find_optimal_capacity 只針對去年的需量求最佳解，負載成長或遇到熱夏時
+容易低估超約風險。這裡依成長率、逐月波動與熱夏機率產生大量需量情境，
+選出「期望費用最低」或「最差 (1 - alpha) 情境平均費用 (CVaR) 最低」
+的契約容量。相同的種子與情境數會得到相同的結果。
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.calculator import capacity_grid, find_optimal_capacity, monthly_terms
+from utils.tariffs import MonthlyTerms, Tariff, get_tariff
+
+
+# 每個亂數區塊的情境數；區塊各自以 SeedSequence 衍生亂數，結果與計算批次大小無關
+SCENARIO_BLOCK = 65536
+
+OBJECTIVES = ("expected", "cvar")
+
+
+@dataclass(frozen=True)
+class ScenarioModel:
+    """
+    需量情境模型
+
+    每個情境的需量 = 輸入需量 × (1 + 年成長率) × 逐月波動 × 熱夏加成
+
+    Args:
+        growth_mean: 年成長率平均值
+        growth_std: 年成長率標準差
+        volatility: 逐月波動 (對數常態分布的標準差)
+        hot_summer_probability: 遇到熱夏的機率
+        hot_summer_uplift: 熱夏時夏月需量的增加比例
+    """
+    growth_mean: float = 0.02
+    growth_std: float = 0.03
+    volatility: float = 0.05
+    hot_summer_probability: float = 0.2
+    hot_summer_uplift: float = 0.10
+
+    def __post_init__(self):
+        if self.growth_std < 0 or self.volatility < 0:
+            raise ValueError("標準差與波動不能為負數")
+        if not 0 <= self.hot_summer_probability <= 1:
+            raise ValueError("熱夏機率必須介於 0-1 之間")
+
+    def sample(self, monthly_demands: np.ndarray, size: int, summer_mask: np.ndarray,
+               rng: np.random.Generator) -> np.ndarray:
+        """產生 size 個情境，回傳形狀為 (size, 12) 的需量矩陣"""
+        growth = 1 + rng.normal(self.growth_mean, self.growth_std, size)
+        noise = rng.lognormal(-self.volatility ** 2 / 2, self.volatility, (size, 12))
+        hot = rng.random(size) < self.hot_summer_probability
+        uplift = np.where(hot[:, np.newaxis] & summer_mask, 1 + self.hot_summer_uplift, 1.0)
+        return np.maximum(monthly_demands * growth[:, np.newaxis] * noise * uplift, 0.0)
+
+
+def generate_scenarios(
+    monthly_demands: List[float],
+    n_scenarios: int,
+    model: ScenarioModel = ScenarioModel(),
+    seed: int = 0,
+    tariff: Optional[Tariff] = None
+) -> np.ndarray:
+    """
+    產生需量情境
+
+    Args:
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        n_scenarios: 情境數
+        model: 情境模型
+        seed: 亂數種子
+        tariff: 費率版本 (決定夏月月份)，預設為今日適用的費率
+
+    Returns:
+        形狀為 (n_scenarios, 12) 的需量矩陣 (千瓦)
+    """
+    if n_scenarios <= 0:
+        raise ValueError("情境數必須大於 0")
+
+    base = np.asarray(monthly_demands, dtype=float)
+    summer_mask = np.isin(np.arange(1, 13), (tariff or get_tariff()).summer_months)
+    n_blocks = -(-n_scenarios // SCENARIO_BLOCK)
+    seeds = np.random.SeedSequence(seed).spawn(n_blocks)
+
+    scenarios = np.empty((n_scenarios, 12))
+    for block, block_seed in enumerate(seeds):
+        start = block * SCENARIO_BLOCK
+        stop = min(start + SCENARIO_BLOCK, n_scenarios)
+        rng = np.random.default_rng(block_seed)
+        scenarios[start:stop] = model.sample(base, stop - start, summer_mask, rng)
+    return scenarios
+
+
+def expected_annual_fees(capacities: np.ndarray, scenarios: np.ndarray,
+                         terms: MonthlyTerms) -> np.ndarray:
+    """
+    以排序後的情境需量與後綴和，精確計算多組容量的期望年度費用
+
+    單月罰款可寫成 費率 × [2 × (d - c)+ + (d - 1.1c)+]，而 E[(d - t)+]
+    只需在排序後的需量中二分搜尋 t，再以後綴和求出超過 t 的需量總和，
+    每個容量只需 O(log N)。
+
+    Args:
+        capacities: 契約容量陣列 (千瓦)，長度 K
+        scenarios: 形狀為 (N, 12) 的情境需量 (千瓦)
+        terms: 1~12 月的計費向量
+
+    Returns:
+        長度 K 的期望年度費用 (元)
+    """
+    capacities = np.asarray(capacities, dtype=float)
+    n = scenarios.shape[0]
+    total = np.zeros(len(capacities))
+
+    for month in range(12):
+        ordered = np.sort(scenarios[:, month])
+        suffix = np.concatenate([np.cumsum(ordered[::-1])[::-1], [0.0]])
+
+        def expected_excess(thresholds: np.ndarray) -> np.ndarray:
+            idx = np.searchsorted(ordered, thresholds, side='right')
+            return (suffix[idx] - thresholds * (n - idx)) / n
+
+        rate = terms.rates[month]
+        within = terms.within_multipliers[month]
+        over = terms.over_multipliers[month]
+        allowance = terms.allowances[month]
+        total += rate * (
+            capacities
+            + within * expected_excess(capacities)
+            + (over - within) * expected_excess(capacities * (1 + allowance))
+        )
+    return total
+
+
+def scenario_annual_fees(capacity: float, scenarios: np.ndarray, terms: MonthlyTerms,
+                         chunk_size: int = 16384) -> np.ndarray:
+    """
+    以批次計算單一容量在每個情境下的年度費用，回傳長度 N 的陣列 (元)
+
+    罰款同樣寫成 (d - c)+ 與 (d - 1.1c)+ 兩項，各以一次矩陣乘法加總 12 個月。
+    """
+    base = capacity * float(np.sum(terms.rates))
+    within_weights = terms.rates * terms.within_multipliers
+    over_weights = terms.rates * (terms.over_multipliers - terms.within_multipliers)
+    over_threshold = capacity * (1 + terms.allowances)
+
+    fees = np.empty(scenarios.shape[0])
+    for start in range(0, scenarios.shape[0], chunk_size):
+        chunk = scenarios[start:start + chunk_size]
+        fees[start:start + chunk_size] = (
+            base
+            + np.maximum(chunk - capacity, 0.0) @ within_weights
+            + np.maximum(chunk - over_threshold, 0.0) @ over_weights
+        )
+    return fees
+
+
+def conditional_value_at_risk(fees: np.ndarray, alpha: float) -> float:
+    """最差 (1 - alpha) 比例情境的平均費用"""
+    tail = max(1, int(np.ceil(len(fees) * (1 - alpha))))
+    return float(np.partition(fees, len(fees) - tail)[len(fees) - tail:].mean())
+
+
+def _ternary_search(cost, lower: int, upper: int) -> int:
+    """
+    在整數區間 [lower, upper] 中尋找凸函數的最小值 (相同時取較小者)
+
+    Args:
+        cost: 以整數 (例如容量格點的索引) 為參數的費用函數
+    """
+    values: Dict[int, float] = {}
+
+    def evaluate(units: int) -> float:
+        if units not in values:
+            values[units] = cost(units)
+        return values[units]
+
+    while upper - lower > 2:
+        left = lower + (upper - lower) // 3
+        right = upper - (upper - lower) // 3
+        if evaluate(left) <= evaluate(right):
+            upper = right
+        else:
+            lower = left + 1
+
+    return min(range(lower, upper + 1), key=lambda units: (evaluate(units), units))
+
+
+@dataclass(frozen=True)
+class RobustCapacityResult:
+    """
+    穩健契約容量的計算結果
+
+    Attributes:
+        capacity: 建議契約容量 (千瓦)
+        objective: 目標 ("expected" 或 "cvar")
+        alpha: CVaR 的信賴水準
+        expected_fee: 建議容量的期望年度費用 (元)
+        cvar_fee: 建議容量在最差 (1 - alpha) 情境的平均費用 (元)
+        percentile_fees: 建議容量的年度費用百分位數 {50, 95, 99} (元)
+        penalty_probability: 建議容量下全年至少一個月超約的機率
+        deterministic_capacity: 只依輸入需量求得的最佳容量 (千瓦)
+        deterministic_expected_fee: 該容量在各情境下的期望年度費用 (元)
+        n_scenarios: 情境數
+        seed: 亂數種子
+    """
+    capacity: float
+    objective: str
+    alpha: float
+    expected_fee: float
+    cvar_fee: float
+    percentile_fees: Dict[int, float]
+    penalty_probability: float
+    deterministic_capacity: float
+    deterministic_expected_fee: float
+    n_scenarios: int
+    seed: int
+
+
+def robust_optimal_capacity(
+    monthly_demands: List[float],
+    n_scenarios: int = 100_000,
+    objective: str = "expected",
+    alpha: float = 0.95,
+    model: ScenarioModel = ScenarioModel(),
+    seed: int = 0,
+    step: float = 1,
+    tariff: Optional[Tariff] = None,
+    chunk_size: int = 16384
+) -> RobustCapacityResult:
+    """
+    依需量情境尋找穩健的契約容量
+
+    objective="expected" 時在容量格點上以排序與後綴和精確計算期望費用；
+    objective="cvar" 時 CVaR 對容量為凸函數，以三分搜尋只評估約
+    log(容量範圍) 個容量，每次以批次計算所有情境。
+
+    Args:
+        monthly_demands: 12個月的最高需量列表 (千瓦)
+        n_scenarios: 情境數
+        objective: "expected" (期望費用最低) 或 "cvar" (最差情境平均費用最低)
+        alpha: CVaR 的信賴水準，例如 0.95 表示最差 5% 的情境
+        model: 情境模型
+        seed: 亂數種子
+        step: 容量級距 (千瓦)
+        tariff: 費率版本，預設為今日適用的費率
+        chunk_size: 計算 CVaR 時每批次的情境數
+
+    Returns:
+        RobustCapacityResult 結果物件
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"目標必須為 {' 或 '.join(OBJECTIVES)}")
+    if not 0 < alpha < 1:
+        raise ValueError("信賴水準必須介於 0-1 之間")
+    if step <= 0:
+        raise ValueError("容量級距必須大於 0")
+
+    # 同時檢查需量並求出不考慮風險的最佳容量
+    tariff = tariff or get_tariff()
+    deterministic_capacity, _, _ = find_optimal_capacity(monthly_demands, step, tariff)
+
+    terms = monthly_terms(tariff)
+    scenarios = generate_scenarios(monthly_demands, n_scenarios, model, seed, tariff)
+
+    # 最佳容量必定落在所有情境的轉折點之間
+    grid = capacity_grid(scenarios, step, terms)
+
+    if objective == "expected":
+        expected = expected_annual_fees(grid, scenarios, terms)
+        best_idx = int(np.argmin(expected))
+    else:
+        best_idx = _ternary_search(
+            lambda idx: conditional_value_at_risk(
+                scenario_annual_fees(grid[idx], scenarios, terms, chunk_size), alpha
+            ),
+            0, len(grid) - 1
+        )
+
+    capacity = float(grid[best_idx])
+    if float(step).is_integer():
+        capacity = int(round(capacity))
+
+    fees = scenario_annual_fees(capacity, scenarios, terms, chunk_size)
+    over_contract = np.any(scenarios > capacity, axis=1)
+    deterministic_expected = expected_annual_fees([deterministic_capacity], scenarios, terms)[0]
+
+    return RobustCapacityResult(
+        capacity=capacity,
+        objective=objective,
+        alpha=alpha,
+        expected_fee=float(expected_annual_fees([capacity], scenarios, terms)[0]),
+        cvar_fee=conditional_value_at_risk(fees, alpha),
+        percentile_fees={q: float(np.percentile(fees, q)) for q in (50, 95, 99)},
+        penalty_probability=float(over_contract.mean()),
+        deterministic_capacity=deterministic_capacity,
+        deterministic_expected_fee=float(deterministic_expected),
+        n_scenarios=n_scenarios,
+        seed=seed,
+    )
@@ -0,0 +1,160 @@
+"""
+多年度需量的滾動 12 個月分析模組
+
+對多年的逐月最高需量，計算每個連續 12 個月區間的最佳契約容量、
+費用、浪費與罰款，觀察最佳容量隨時間的變化。區間每往後移一個月，
+只需從費用曲線扣掉移出月份的費用、加上移入月份的費用，不必重新
+掃描整個區間。
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from utils.calculator import (
+    capacity_grid,
+    fee_terms,
+    readonly_array,
+    sum_months,
+    waste_and_penalty_terms
+)
+from utils.tariffs import DEFAULT_TARIFF_TYPE, compile_terms
+
+
+@dataclass(frozen=True)
+class RollingAnalysis:
+    """
+    滾動 12 個月分析結果 (每個區間一筆，陣列皆為唯讀)
+
+    Attributes:
+        end_months: 各區間的最後一個月 (numpy datetime64[M])
+        optimal_capacities: 最佳契約容量 (千瓦)
+        optimal_fees: 最佳容量下的年度基本電費 (元)
+        wastes: 最佳容量下的浪費金額 (元)
+        penalties: 最佳容量下的罰款金額 (元)
+        current_capacity: 目前契約容量 (千瓦)，未提供時為 None
+        current_fees: 目前契約容量下的年度基本電費 (元)，未提供容量時為 None
+    """
+    end_months: np.ndarray
+    optimal_capacities: np.ndarray
+    optimal_fees: np.ndarray
+    wastes: np.ndarray
+    penalties: np.ndarray
+    current_capacity: Optional[float] = None
+    current_fees: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.end_months)
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """轉為逐區間的字典列表，方便畫圖或匯出 CSV / JSON"""
+        rows = []
+        for idx, end_month in enumerate(self.end_months):
+            row = {
+                'start_month': str(end_month - 11),
+                'end_month': str(end_month),
+                'optimal_capacity': float(self.optimal_capacities[idx]),
+                'optimal_fee': float(self.optimal_fees[idx]),
+                'waste': float(self.wastes[idx]),
+                'penalty': float(self.penalties[idx]),
+            }
+            if self.current_fees is not None:
+                row['current_fee'] = float(self.current_fees[idx])
+                row['saved_fee'] = float(self.current_fees[idx] - self.optimal_fees[idx])
+            rows.append(row)
+        return rows
+
+
+def rolling_optimal_capacity(
+    monthly_demands: Sequence[float],
+    start_month: Union[str, date, np.datetime64],
+    step: float = 1,
+    current_capacity: Optional[float] = None,
+    tariff_type: str = DEFAULT_TARIFF_TYPE,
+    resync_every: int = 12
+) -> RollingAnalysis:
+    """
+    計算每個連續 12 個月區間的最佳契約容量
+
+    在固定的容量格點上維護區間內 12 個月的費用，每移動一個月就扣掉
+    移出月份、加上移入月份；每 resync_every 個月以逐月加總重新計算一次，
+    避免浮點誤差累積。各月份以當時適用的費率計算，可跨越費率調整。
+
+    Args:
+        monthly_demands: 連續的逐月最高需量 (千瓦)，至少 12 個月
+        start_month: 第一個月 (例如 "2015-01")
+        step: 容量級距 (千瓦)
+        current_capacity: 目前契約容量 (千瓦)，提供時一併計算各區間的目前費用
+        tariff_type: 電價種類
+        resync_every: 重新完整加總的間隔 (月)
+
+    Returns:
+        RollingAnalysis 結果物件，區間數為月份數 - 11
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    demands = np.asarray(monthly_demands, dtype=float)
+    if demands.ndim != 1 or len(demands) < 12:
+        raise ValueError("至少需要連續 12 個月的需量資料")
+    if not np.all(np.isfinite(demands)):
+        raise ValueError("需量必須為有效數字")
+    if np.any(demands < 0):
+        raise ValueError("需量不能為負數")
+    if step <= 0:
+        raise ValueError("容量級距必須大於 0")
+    if current_capacity is not None and current_capacity <= 0:
+        raise ValueError("契約容量必須大於 0")
+    if resync_every <= 0:
+        raise ValueError("重新加總的間隔必須大於 0")
+
+    months = np.datetime64(start_month, 'M') + np.arange(len(demands))
+    terms = compile_terms(months.astype('datetime64[D]').tolist(), tariff_type)
+    grid = capacity_grid(demands, step, terms)
+
+    # window 保存區間內 12 個月的費用曲線，以 month % 12 作為位置循環使用
+    window = np.zeros((12, len(grid)))
+    totals = np.zeros(len(grid))
+    best_idx = np.empty(len(demands) - 11, dtype=np.intp)
+
+    for month_idx in range(len(demands)):
+        slot = month_idx % 12
+        column = fee_terms(grid, demands[month_idx], terms[month_idx])
+        totals -= window[slot]
+        window[slot] = column
+        totals += column
+
+        if (month_idx + 1) % resync_every == 0:
+            totals = sum_months(window.T)
+
+        if month_idx >= 11:
+            # 費用幾乎相同時選擇較小的容量
+            lowest = totals.min()
+            ties = np.flatnonzero(totals <= lowest + 1e-11 * max(1.0, abs(lowest)))
+            best_idx[month_idx - 11] = ties[0]
+
+    # 最佳容量確定後，以各區間的 12 個月重新計算精確的費用、浪費與罰款
+    window_idx = np.arange(len(best_idx))[:, np.newaxis] + np.arange(12)
+    window_demands = demands[window_idx]
+    window_terms = terms[window_idx]
+    optimal_capacities = grid[best_idx]
+
+    fees = sum_months(fee_terms(optimal_capacities[:, np.newaxis], window_demands, window_terms))
+    waste, penalty = waste_and_penalty_terms(optimal_capacities[:, np.newaxis], window_demands, window_terms)
+
+    current_fees = None
+    if current_capacity is not None:
+        current_fees = readonly_array(sum_months(fee_terms(
+            np.full((len(best_idx), 1), float(current_capacity)), window_demands, window_terms
+        )))
+
+    return RollingAnalysis(
+        end_months=readonly_array(months[11:].copy()),
+        optimal_capacities=readonly_array(optimal_capacities),
+        optimal_fees=readonly_array(fees),
+        wastes=readonly_array(sum_months(waste)),
+        penalties=readonly_array(sum_months(penalty)),
+        current_capacity=current_capacity,
+        current_fees=current_fees,
+    )
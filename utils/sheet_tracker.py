@@ -1,41 +1,509 @@
 # utils/sheet_tracker.py
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import date
+import atexit
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
 import uuid
 
+from utils.instrumentation import timed
+from utils.startup import timed_import
+from utils.stats_backends import JsonFileBackend, SQLiteBackend, StatsBackend, StatsSync
+
 SHEET_NAME = "OptipowerSheet"  # 你的 Google Sheet 名稱
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
+          "https://www.googleapis.com/auth/drive"]
+
+# 訪客統計的快取與檢查點設定
+STATS_REFRESH_SECONDS = 60  # 統計數字的重新整理間隔 (秒)
+STATS_CHECKPOINT_PATH = os.path.join(PROJECT_DIR, ".stats_checkpoint.json")
+
+# 統計後端設定 (可透過環境變數或 .env 調整)
+#   OPTIPOWER_STATS_BACKEND: sheets (預設) / json / sqlite
+#   OPTIPOWER_STATS_PATH: 本機後端的檔案路徑
+#   OPTIPOWER_STATS_SYNC_SECONDS: 本機後端定期同步到 Google Sheets 的間隔，0 表示不同步
+DEFAULT_STATS_PATHS = {
+    "json": os.path.join(PROJECT_DIR, ".local_stats.json"),
+    "sqlite": os.path.join(PROJECT_DIR, ".local_stats.sqlite3"),
+}
+
+# 背景寫入訪客紀錄的設定
+VISIT_QUEUE_SIZE = 1000      # 佇列上限，滿了就直接寫入暫存檔
+VISIT_BATCH_SIZE = 50        # 累積幾筆就送出
+VISIT_FLUSH_SECONDS = 5.0    # 最久幾秒送出一次
+VISIT_SPOOL_PATH = os.path.join(PROJECT_DIR, ".visit_spool.jsonl")
+
+# 關閉時放入佇列，讓等待中的背景執行緒立即醒來
+_WAKE_UP = object()
+
+
+@timed("sheets.connect")
+def _connect_google_sheet():
+    """建立憑證、授權並開啟工作表 (每次呼叫都會完整握手一次)"""
+    # gspread 與 google-auth 只在真正連線時才匯入，加快冷啟動
+    gspread = timed_import("gspread")
+    service_account = timed_import("google.oauth2.service_account")
 
-def get_sheet():
     # 使用 Cloud Secrets 裡的 [GOOGLE_SERVICE_ACCOUNT]
-    creds = Credentials.from_service_account_info(
+    creds = service_account.Credentials.from_service_account_info(
         st.secrets["GOOGLE_SERVICE_ACCOUNT"],  # <-- 注意這裡
-        scopes=["https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"]
+        scopes=SCOPES
     )
     client = gspread.authorize(creds)
     return client.open(SHEET_NAME).sheet1
 
 
-def log_visit():
-    """新增一筆訪客紀錄"""
-    sheet = get_sheet()
+def _is_auth_error(error: Exception) -> bool:
+    """判斷是否為授權過期或失效的錯誤"""
+    auth_exceptions = timed_import("google.auth.exceptions")
+    gspread = timed_import("gspread")
+    if isinstance(error, auth_exceptions.RefreshError):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        return getattr(error.response, "status_code", None) == 401
+    return False
+
+
+class SheetConnection:
+    """
+    整個程序共用的工作表連線
+
+    第一次使用時才授權並開啟工作表，之後重複使用同一個 client。
+    存取權杖由 google-auth 在過期時自動更新；若權杖已無法更新
+    (例如憑證被撤銷)，會重新建立連線並重試一次。
+
+    Args:
+        connect: 建立工作表物件的函數，預設連線 Google Sheets，
+                 測試時可替換成本機的假工作表
+    """
+
+    def __init__(self, connect=_connect_google_sheet):
+        self._connect = connect
+        self._lock = threading.RLock()
+        self._worksheet = None
+        self.handshakes = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self.last_handshake_seconds = 0.0
+        self.total_handshake_seconds = 0.0
+
+    def worksheet(self):
+        """取得工作表，尚未連線時才進行握手"""
+        with self._lock:
+            if self._worksheet is None:
+                started = time.perf_counter()
+                self._worksheet = self._connect()
+                self.last_handshake_seconds = time.perf_counter() - started
+                self.total_handshake_seconds += self.last_handshake_seconds
+                self.handshakes += 1
+            else:
+                self.reuses += 1
+            return self._worksheet
+
+    def reset(self):
+        """捨棄目前的連線，下次使用時重新握手"""
+        with self._lock:
+            self._worksheet = None
+
+    def run(self, operation):
+        """
+        以共用的工作表執行操作，授權失效時重新連線後重試一次
+
+        Args:
+            operation: 接收工作表物件的函數
+
+        Returns:
+            operation 的回傳值
+        """
+        with self._lock:
+            try:
+                return operation(self.worksheet())
+            except Exception as e:
+                if not _is_auth_error(e):
+                    raise
+                self.reset()
+                self.reconnects += 1
+                return operation(self.worksheet())
+
+    def stats(self):
+        """回傳握手次數、重複使用次數與估計省下的握手時間 (秒)"""
+        with self._lock:
+            average = (self.total_handshake_seconds / self.handshakes
+                       if self.handshakes else 0.0)
+            return {
+                "handshakes": self.handshakes,
+                "reuses": self.reuses,
+                "reconnects": self.reconnects,
+                "last_handshake_seconds": self.last_handshake_seconds,
+                "saved_seconds": self.reuses * average,
+            }
+
+
+_connection = SheetConnection()
+
+
+def get_connection() -> SheetConnection:
+    """取得整個程序共用的工作表連線"""
+    return _connection
+
+
+def set_connection(connection: SheetConnection) -> None:
+    """替換共用的工作表連線 (例如改用本機的假工作表)"""
+    global _connection
+    _connection = connection
+
+
+def get_sheet():
+    """取得共用的工作表物件"""
+    return _connection.worksheet()
+
+
+@timed("sheets.fetch_rows")
+def _fetch_rows_since(start_row):
+    """讀取工作表第 start_row 列 (含) 之後的日期欄 (A 欄)"""
+    return _connection.run(lambda sheet: sheet.get(f"A{start_row}:A"))
+
+
+class VisitStats:
+    """
+    訪客統計的增量彙總
+
+    記憶體中保留總數與每日人數，每隔 ttl 秒才向工作表讀取
+    上次之後新增的列；彙總結果會寫入檢查點檔案，重新啟動時
+    不必重新掃描整張工作表。刪除檢查點檔案即可重新完整計算。
+
+    Args:
+        fetch_rows: 讀取指定列之後資料的函數，每列的第一欄為日期
+        checkpoint_path: 檢查點檔案路徑，None 表示不寫檔
+        ttl: 重新整理間隔 (秒)
+        timer: 取得目前時間的函數 (測試時可替換)
+    """
+
+    def __init__(self, fetch_rows=_fetch_rows_since,
+                 checkpoint_path=STATS_CHECKPOINT_PATH,
+                 ttl=STATS_REFRESH_SECONDS, timer=time.monotonic):
+        self._fetch_rows = fetch_rows
+        self._checkpoint_path = checkpoint_path
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._refreshed_at = None
+        self.total = 0
+        self.daily = {}
+        self.last_row = 1  # 第 1 列為標題列
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        """讀取檢查點，檔案不存在或內容不符時從頭計算"""
+        if not self._checkpoint_path or not os.path.exists(self._checkpoint_path):
+            return
+        try:
+            with open(self._checkpoint_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("sheet") != SHEET_NAME:
+                return
+            self.total = int(data["total"])
+            self.daily = {day: int(count) for day, count in data["daily"].items()}
+            self.last_row = int(data["last_row"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.total, self.daily, self.last_row = 0, {}, 1
+
+    def _save_checkpoint(self):
+        """以暫存檔 + 取代的方式寫入檢查點，避免寫到一半的檔案"""
+        if not self._checkpoint_path:
+            return
+        data = {
+            "sheet": SHEET_NAME,
+            "total": self.total,
+            "daily": self.daily,
+            "last_row": self.last_row,
+        }
+        directory = os.path.dirname(self._checkpoint_path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._checkpoint_path)
+        except OSError:
+            pass
+
+    def refresh(self, force=False):
+        """超過重新整理間隔時，讀取新增的列並更新彙總"""
+        with self._lock:
+            now = self._timer()
+            if (not force and self._refreshed_at is not None
+                    and now - self._refreshed_at < self.ttl):
+                return
+
+            rows = self._fetch_rows(self.last_row + 1)
+            for row in rows:
+                day = row[0] if row else ""
+                if day:
+                    self.daily[day] = self.daily.get(day, 0) + 1
+            self.total += len(rows)
+            self.last_row += len(rows)
+            self._refreshed_at = now
+
+            if rows:
+                self._save_checkpoint()
+
+    def counts(self, day=None):
+        """回傳 (指定日期人數, 總人數)，預設為今日"""
+        self.refresh()
+        day = day or date.today().isoformat()
+        return self.daily.get(day, 0), self.total
+
 
+_visit_stats = VisitStats()
+
+
+class GoogleSheetsBackend(StatsBackend):
+    """以 Google Sheets 儲存訪客紀錄 (每列為 [日期, 訪客 ID])"""
+
+    def __init__(self, stats=None):
+        self._stats = stats or _visit_stats
+
+    def append_visits(self, rows):
+        _connection.run(lambda sheet: sheet.append_rows(rows))
+
+    def counts(self, day=None):
+        return self._stats.counts(day)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats_sync = None
+
+
+def _create_backend():
+    """依環境變數建立統計後端，本機後端可選擇定期同步到 Google Sheets"""
+    global _stats_sync
+    kind = os.getenv("OPTIPOWER_STATS_BACKEND", "sheets").strip().lower()
+    if kind == "sheets":
+        return GoogleSheetsBackend()
+    if kind not in DEFAULT_STATS_PATHS:
+        raise ValueError(f"不支援的統計後端: {kind}")
+
+    path = os.getenv("OPTIPOWER_STATS_PATH") or DEFAULT_STATS_PATHS[kind]
+    sync_seconds = float(os.getenv("OPTIPOWER_STATS_SYNC_SECONDS", "0") or 0)
+
+    if kind == "json":
+        backend = JsonFileBackend(path, keep_unsynced=sync_seconds > 0)
+    else:
+        backend = SQLiteBackend(path)
+
+    if sync_seconds > 0:
+        _stats_sync = StatsSync(backend, GoogleSheetsBackend(), interval=sync_seconds)
+        _stats_sync.start()
+    return backend
+
+
+def get_backend():
+    """取得目前使用的統計後端 (第一次呼叫時才依設定建立)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """替換統計後端 (例如測試或效能量測時改用本機後端)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+@timed("stats.append_visits")
+def _append_rows(rows):
+    """一次寫入多筆訪客紀錄"""
+    get_backend().append_visits(rows)
+
+
+class VisitWriter:
+    """
+    在背景執行緒批次寫入訪客紀錄
+
+    log_visit 只把資料放進佇列就返回，頁面不必等待 Google Sheets。
+    背景執行緒累積到 batch_size 筆或等待超過 flush_interval 秒即送出，
+    失敗時以指數退避重試；仍然失敗或佇列已滿時，資料會寫入本機暫存檔，
+    下次送出時一併補寫。
+
+    Args:
+        write_rows: 寫入多筆資料的函數
+        spool_path: 暫存檔路徑
+        maxsize: 佇列上限
+        batch_size: 每批最多筆數
+        flush_interval: 最長送出間隔 (秒)
+        max_retries: 每批最多重試次數
+        backoff: 第一次重試前等待的秒數，之後每次加倍
+    """
+
+    def __init__(self, write_rows=_append_rows, spool_path=VISIT_SPOOL_PATH,
+                 maxsize=VISIT_QUEUE_SIZE, batch_size=VISIT_BATCH_SIZE,
+                 flush_interval=VISIT_FLUSH_SECONDS, max_retries=3, backoff=1.0,
+                 sleep=time.sleep):
+        self._write_rows = write_rows
+        self._spool_path = spool_path
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self._spool_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.written = 0
+        self.spooled = 0
+        self.failed_batches = 0
+
+    def submit(self, row):
+        """加入一筆紀錄 (不會阻塞)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._spool([row])
+
+    def _ensure_started(self):
+        """第一次使用時才啟動背景執行緒"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="visit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        """背景執行緒：依筆數或時間觸發批次寫入"""
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+
+    def _collect_batch(self):
+        """收集一批資料，直到筆數足夠或超過送出間隔"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                row = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _WAKE_UP:
+                break
+            batch.append(row)
+        return batch
+
+    def _drain(self):
+        """取出佇列中所有資料"""
+        rows = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if row is not _WAKE_UP:
+                rows.append(row)
+
+    def _spool(self, rows):
+        """將資料附加到本機暫存檔"""
+        with self._spool_lock:
+            try:
+                with open(self._spool_path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                self.spooled += len(rows)
+            except OSError:
+                pass
+
+    def _take_spooled(self):
+        """讀出並清空暫存檔中的資料"""
+        with self._spool_lock:
+            if not os.path.exists(self._spool_path):
+                return []
+            try:
+                with open(self._spool_path, encoding="utf-8") as f:
+                    rows = [json.loads(line) for line in f if line.strip()]
+                os.remove(self._spool_path)
+            except (OSError, ValueError):
+                return []
+            return rows
+
+    def _flush(self, batch):
+        """寫入一批資料 (含暫存檔中的舊資料)，失敗時重試後改寫入暫存檔"""
+        with self._flush_lock:
+            rows = self._take_spooled() + batch
+            delay = self.backoff
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._write_rows(rows)
+                    self.written += len(rows)
+                    return True
+                except Exception:
+                    if attempt == self.max_retries or self._stopping.is_set():
+                        break
+                    self._sleep(delay)
+                    delay *= 2
+
+            self.failed_batches += 1
+            self._spool(rows)
+            return False
+
+    def flush(self):
+        """立即送出佇列中所有資料 (同步執行)"""
+        rows = self._drain()
+        if rows:
+            return self._flush(rows)
+        return True
+
+    def close(self, timeout=5.0):
+        """停止背景執行緒並送出剩餘資料"""
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_WAKE_UP)
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """回傳已寫入、寫入暫存檔與失敗批次的數量"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "spooled": self.spooled,
+            "failed_batches": self.failed_batches,
+        }
+
+
+_visit_writer = VisitWriter()
+atexit.register(_visit_writer.close)
+
+
+def log_visit():
+    """新增一筆訪客紀錄 (交由背景執行緒寫入，不會阻塞頁面)"""
     if "visitor_id" not in st.session_state:
         st.session_state.visitor_id = str(uuid.uuid4())
 
     today = date.today().isoformat()
-    sheet.append_row([today, st.session_state.visitor_id])
+    _visit_writer.submit([today, st.session_state.visitor_id])
 
 
+@timed()
 def get_stats():
     """回傳今日訪客數 & 總訪客數"""
-    sheet = get_sheet()
-    data = sheet.get_all_records()
-
-    total = len(data)
-    today = date.today().isoformat()
-    today_count = sum(1 for row in data if row.get("Date") == today)
-
-    return today_count, total
+    return get_backend().counts()
@@ -0,0 +1,125 @@
+"""
+程序啟動與一次性初始化模組
+
+Streamlit 每次重新執行都會重跑 app.py，但已匯入的模組只會載入一次；
+需要整個程序只做一次的初始化與啟動時間紀錄都放在這裡。
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("optipower.startup")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# 第一次匯入本模組的時間，作為啟動時間的基準
+STARTED_AT = time.perf_counter()
+
+_lock = threading.RLock()
+_once_results: Dict[str, Any] = {}
+_import_seconds: Dict[str, float] = {}
+_stage_seconds: Dict[str, float] = {}
+_first_render_seconds: Optional[float] = None
+_log_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    讓專案的紀錄 (optipower.*) 以 level 等級輸出 (由 app.main / api_server.main 呼叫)
+
+    主機已在 root logger 設定 handler 時只調整等級，紀錄照常往上傳遞；
+    否則在 "optipower" 加上輸出到 stderr 的 handler (Streamlit 預設不會
+    顯示 INFO 等級)。重複呼叫不會重複加上 handler。
+
+    Args:
+        level: 紀錄等級
+    """
+    global _log_handler
+    project_logger = logging.getLogger("optipower")
+    project_logger.setLevel(level)
+    if logging.getLogger().handlers:
+        return
+    with _lock:
+        if _log_handler is None:
+            _log_handler = logging.StreamHandler()
+            _log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            project_logger.addHandler(_log_handler)
+
+
+def timed_import(module_name: str) -> ModuleType:
+    """
+    匯入模組並記錄第一次匯入所花的時間
+
+    適合用在延遲匯入 (只在真正需要時才載入 Matplotlib、gspread 等)。
+
+    Args:
+        module_name: 模組名稱，例如 "matplotlib.pyplot"
+
+    Returns:
+        匯入的模組
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _import_seconds.setdefault(module_name, time.perf_counter() - started)
+    return module
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """記錄啟動階段 (例如匯入 utils 模組) 的耗時，只保留第一次的數值"""
+    with _lock:
+        _stage_seconds.setdefault(name, seconds)
+
+
+def run_once(key: str, func: Callable[[], Any]) -> Any:
+    """
+    整個程序只執行一次 func，之後直接回傳第一次的結果
+
+    Args:
+        key: 初始化項目名稱
+        func: 初始化函數
+
+    Returns:
+        func 第一次執行的回傳值
+    """
+    with _lock:
+        if key not in _once_results:
+            _once_results[key] = func()
+        return _once_results[key]
+
+
+def mark_first_render() -> None:
+    """在第一次完成頁面渲染時呼叫，記錄首次渲染時間並輸出啟動報告"""
+    global _first_render_seconds
+    with _lock:
+        if _first_render_seconds is not None:
+            return
+        _first_render_seconds = time.perf_counter() - STARTED_AT
+    logger.info(format_startup_report())
+
+
+def startup_report() -> Dict[str, Any]:
+    """回傳啟動時間報告 (秒)"""
+    with _lock:
+        return {
+            "imports": dict(_import_seconds),
+            "stages": dict(_stage_seconds),
+            "first_render": _first_render_seconds,
+        }
+
+
+def format_startup_report() -> str:
+    """將啟動時間報告格式化為單行文字"""
+    report = startup_report()
+    parts = [f"{name}={seconds * 1000:.1f}ms" for name, seconds in report["stages"].items()]
+    parts += [f"import {name}={seconds * 1000:.1f}ms" for name, seconds in report["imports"].items()]
+    if report["first_render"] is not None:
+        parts.append(f"first_render={report['first_render'] * 1000:.1f}ms")
+    return "startup: " + ", ".join(parts)
@@ -0,0 +1,271 @@
+"""
+訪客統計的儲存後端模組
+
+log_visit / get_stats 透過 StatsBackend 介面存取資料，
+可選擇 Google Sheets (見 sheet_tracker)、本機 JSON 檔或 SQLite。
+本機後端不需任何網路連線，也適合測試與效能量測使用。
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只保留同一程序內的鎖
+    fcntl = None
+
+
+VisitRow = Sequence[str]  # [日期 (YYYY-MM-DD), 訪客 ID]
+
+
+class StatsBackend(ABC):
+    """訪客統計後端介面 (子類別必須實作 append_visits 與 counts)"""
+
+    @abstractmethod
+    def append_visits(self, rows: List[VisitRow]) -> None:
+        """新增多筆訪客紀錄"""
+
+    @abstractmethod
+    def counts(self, day: Optional[str] = None) -> Tuple[int, int]:
+        """回傳 (指定日期人數, 總人數)，預設為今日"""
+
+    def unsynced_visits(self, limit: int = 500) -> List[Tuple[int, VisitRow]]:
+        """
+        回傳尚未同步到遠端的紀錄 (key, row)，不支援同步的後端回傳空列表
+
+        Args:
+            limit: 最多筆數
+        """
+        return []
+
+    def mark_synced(self, keys: List[int]) -> None:
+        """將 unsynced_visits 回傳的紀錄標記為已同步"""
+
+
+class JsonFileBackend(StatsBackend):
+    """
+    以 JSON 檔儲存總數與每日人數
+
+    寫入時先寫暫存檔再以 os.replace 取代，並以檔案鎖避免多個程序
+    同時寫入。
+
+    Args:
+        path: JSON 檔路徑 (格式同 .local_stats.json)
+        keep_unsynced: 是否保留尚未同步的紀錄 (啟用同步時才需要)
+    """
+
+    def __init__(self, path: str, keep_unsynced: bool = False):
+        self.path = path
+        self.keep_unsynced = keep_unsynced
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """取得程序內與跨程序的獨佔鎖"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        """讀取檔案內容，檔案不存在或損毀時回傳空的統計"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return {
+            "total": int(data.get("total", 0)),
+            "daily": dict(data.get("daily", {})),
+            "unsynced": list(data.get("unsynced", [])),
+        }
+
+    def _write(self, data: dict) -> None:
+        """以暫存檔 + 取代的方式寫入"""
+        if not data["unsynced"]:
+            data = {"total": data["total"], "daily": data["daily"]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def append_visits(self, rows: List[VisitRow]) -> None:
+        with self._locked():
+            data = self._read()
+            for row in rows:
+                day = row[0]
+                data["daily"][day] = data["daily"].get(day, 0) + 1
+            data["total"] += len(rows)
+            if self.keep_unsynced:
+                data["unsynced"].extend(list(row) for row in rows)
+            self._write(data)
+
+    def counts(self, day: Optional[str] = None) -> Tuple[int, int]:
+        day = day or date.today().isoformat()
+        data = self._read()
+        return data["daily"].get(day, 0), data["total"]
+
+    def unsynced_visits(self, limit: int = 500) -> List[Tuple[int, VisitRow]]:
+        # 新紀錄只會附加在尾端，因此以位置作為 key
+        return list(enumerate(self._read()["unsynced"][:limit]))
+
+    def mark_synced(self, keys: List[int]) -> None:
+        if not keys:
+            return
+        with self._locked():
+            data = self._read()
+            data["unsynced"] = data["unsynced"][len(keys):]
+            self._write(data)
+
+
+class SQLiteBackend(StatsBackend):
+    """
+    以 SQLite 儲存訪客紀錄
+
+    visits 表保留每筆紀錄 (日期有索引，供同步使用)，
+    daily_counts 表在同一個交易中累加每日人數，
+    查詢今日與總人數只需讀取彙總表，不必掃描所有紀錄。
+
+    Args:
+        path: 資料庫檔案路徑
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS visits (
+                    id INTEGER PRIMARY KEY,
+                    visit_date TEXT NOT NULL,
+                    visitor_id TEXT NOT NULL,
+                    synced INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_visits_date ON visits (visit_date);
+                CREATE INDEX IF NOT EXISTS idx_visits_unsynced ON visits (id) WHERE synced = 0;
+                CREATE TABLE IF NOT EXISTS daily_counts (
+                    visit_date TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL
+                );
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作開啟新連線，避免跨執行緒共用"""
+        return sqlite3.connect(self.path, timeout=10)
+
+    def append_visits(self, rows: List[VisitRow]) -> None:
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO visits (visit_date, visitor_id) VALUES (?, ?)",
+                [(row[0], row[1]) for row in rows]
+            )
+            daily = {}
+            for row in rows:
+                daily[row[0]] = daily.get(row[0], 0) + 1
+            conn.executemany(
+                "INSERT INTO daily_counts (visit_date, count) VALUES (?, ?) "
+                "ON CONFLICT (visit_date) DO UPDATE SET count = count + excluded.count",
+                list(daily.items())
+            )
+
+    def counts(self, day: Optional[str] = None) -> Tuple[int, int]:
+        day = day or date.today().isoformat()
+        with self._connect() as conn:
+            today = conn.execute(
+                "SELECT count FROM daily_counts WHERE visit_date = ?", (day,)
+            ).fetchone()
+            total = conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM daily_counts"
+            ).fetchone()
+        return (today[0] if today else 0), total[0]
+
+    def unsynced_visits(self, limit: int = 500) -> List[Tuple[int, VisitRow]]:
+        with self._connect() as conn:
+            result = conn.execute(
+                "SELECT id, visit_date, visitor_id FROM visits "
+                "WHERE synced = 0 ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, [visit_date, visitor_id]) for row_id, visit_date, visitor_id in result]
+
+    def mark_synced(self, keys: List[int]) -> None:
+        if not keys:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE visits SET synced = 1 WHERE id = ?", [(key,) for key in keys]
+            )
+
+
+class StatsSync:
+    """
+    定期將本機後端尚未同步的紀錄推送到遠端後端 (例如 Google Sheets)
+
+    Args:
+        source: 本機後端
+        target: 遠端後端
+        interval: 同步間隔 (秒)
+        batch_size: 每次最多推送筆數
+    """
+
+    def __init__(self, source: StatsBackend, target: StatsBackend,
+                 interval: float = 300.0, batch_size: int = 500):
+        self.source = source
+        self.target = target
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.synced = 0
+        self.last_error: Optional[str] = None
+
+    def sync_once(self) -> int:
+        """推送所有尚未同步的紀錄，回傳推送筆數"""
+        pushed = 0
+        while True:
+            pending = self.source.unsynced_visits(self.batch_size)
+            if not pending:
+                return pushed
+            self.target.append_visits([row for _, row in pending])
+            self.source.mark_synced([key for key, _ in pending])
+            pushed += len(pending)
+            self.synced += len(pending)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def start(self) -> None:
+        """啟動背景同步執行緒"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="stats-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """停止背景同步執行緒"""
+        self._stopping.set()
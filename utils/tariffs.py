@@ -0,0 +1,247 @@
+"""
+電價費率登錄模組
+
+台電會不定期調整費率，歷史帳單需以當時適用的費率重新計算。
+各版本費率依「電價種類 + 生效日」登錄在 TARIFF_REGISTRY，
+計算時編譯成逐月的費率與超約門檻向量，以陣列查表取代逐月判斷。
+"""
+import bisect
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 電價種類
+LV_DEMAND_NON_TOU = "lv-demand-non-tou"  # 低壓電力 (需量) 非時間電價
+DEFAULT_TARIFF_TYPE = LV_DEMAND_NON_TOU
+
+SUMMER_MONTHS = (6, 7, 8, 9)  # 夏月月份
+
+# 今日日期的快取 (到下一個午夜前有效)：date.today() 比單筆電費計算本身還慢
+_today_cache: Tuple[float, Optional[date]] = (0.0, None)
+
+
+def _today() -> date:
+    """今日日期 (每天只查詢一次系統時間與時區)"""
+    global _today_cache
+    expires, today = _today_cache
+    if today is None or time.time() >= expires:
+        today = date.today()
+        midnight = datetime.combine(today + timedelta(days=1), datetime.min.time())
+        _today_cache = (midnight.timestamp(), today)
+    return today
+
+
+@dataclass(frozen=True)
+class MonthlyTerms:
+    """
+    逐月的計費參數向量 (長度皆為月份數)
+
+    Attributes:
+        rates: 基本電費費率 (元/千瓦)
+        allowances: 超約 2 倍計費的容許比例 (例如 0.10)
+        within_multipliers: 容許範圍內的超約倍數
+        over_multipliers: 超過容許範圍的超約倍數
+    """
+    rates: np.ndarray
+    allowances: np.ndarray
+    within_multipliers: np.ndarray
+    over_multipliers: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def __getitem__(self, index) -> "MonthlyTerms":
+        """以切片或索引陣列取出部分月份"""
+        return MonthlyTerms(
+            rates=self.rates[index],
+            allowances=self.allowances[index],
+            within_multipliers=self.within_multipliers[index],
+            over_multipliers=self.over_multipliers[index],
+        )
+
+
+def _readonly(values: np.ndarray) -> np.ndarray:
+    """將陣列設為唯讀，避免共用的費率向量被就地修改"""
+    values.flags.writeable = False
+    return values
+
+
+@dataclass(frozen=True)
+class Tariff:
+    """
+    單一版本的基本電費費率
+
+    Args:
+        tariff_type: 電價種類
+        effective_date: 生效日
+        version: 版本名稱 (同時作為快取 key，費率不同時必須不同)
+        summer_rate: 夏月基本電費 (元/千瓦)
+        non_summer_rate: 非夏月基本電費 (元/千瓦)
+        allowance: 超約 2 倍計費的容許比例
+        within_multiplier: 容許範圍內的超約倍數
+        over_multiplier: 超過容許範圍的超約倍數
+        summer_energy_rate: 夏月流動電費 (元/度，僅供顯示)
+        non_summer_energy_rate: 非夏月流動電費 (元/度，僅供顯示)
+        summer_months: 夏月月份
+    """
+    tariff_type: str
+    effective_date: date
+    version: str
+    summer_rate: float
+    non_summer_rate: float
+    allowance: float = 0.10
+    within_multiplier: float = 2.0
+    over_multiplier: float = 3.0
+    summer_energy_rate: Optional[float] = None
+    non_summer_energy_rate: Optional[float] = None
+    summer_months: Tuple[int, ...] = SUMMER_MONTHS
+    terms: MonthlyTerms = field(init=False, repr=False, compare=False)
+    month_rates: Tuple[float, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.summer_rate <= 0 or self.non_summer_rate <= 0:
+            raise ValueError("基本電費費率必須大於 0")
+        if self.allowance < 0:
+            raise ValueError("超約容許比例不能為負數")
+        if any(month < 1 or month > 12 for month in self.summer_months):
+            raise ValueError("夏月月份必須介於 1-12 之間")
+
+        # 編譯成 1~12 月的計費向量
+        rates = np.array([
+            self.summer_rate if month in self.summer_months else self.non_summer_rate
+            for month in range(1, 13)
+        ])
+        # 單筆計算用的 1~12 月費率 (純 Python 數值，免去逐月判斷夏月)
+        object.__setattr__(self, 'month_rates', tuple(rates.tolist()))
+        object.__setattr__(self, 'terms', MonthlyTerms(
+            rates=_readonly(rates),
+            allowances=_readonly(np.full(12, self.allowance)),
+            within_multipliers=_readonly(np.full(12, self.within_multiplier)),
+            over_multipliers=_readonly(np.full(12, self.over_multiplier)),
+        ))
+
+    @property
+    def monthly_rates(self) -> np.ndarray:
+        """1~12 月的基本電費費率向量"""
+        return self.terms.rates
+
+
+class TariffRegistry:
+    """依電價種類與生效日登錄的費率版本"""
+
+    def __init__(self):
+        self._tariffs: Dict[str, List[Tariff]] = {}
+        # 各電價種類依序排列的生效日，查詢時不必每次重新建立
+        self._effective_dates: Dict[str, List[date]] = {}
+
+    def register(self, tariff: Tariff) -> Tariff:
+        """
+        登錄一個費率版本
+
+        Raises:
+            ValueError: 同一電價種類已有相同生效日或相同版本名稱時
+        """
+        versions = self._tariffs.setdefault(tariff.tariff_type, [])
+        if any(t.effective_date == tariff.effective_date for t in versions):
+            raise ValueError(f"{tariff.tariff_type} 已有 {tariff.effective_date} 生效的費率")
+        if any(t.version == tariff.version for t in versions):
+            raise ValueError(f"費率版本 {tariff.version} 已存在")
+
+        versions.append(tariff)
+        versions.sort(key=lambda t: t.effective_date)
+        self._effective_dates[tariff.tariff_type] = [t.effective_date for t in versions]
+        return tariff
+
+    def versions(self, tariff_type: str = DEFAULT_TARIFF_TYPE) -> List[Tariff]:
+        """回傳某電價種類的所有版本 (依生效日排序)"""
+        if tariff_type not in self._tariffs:
+            raise ValueError(f"未知的電價種類: {tariff_type}")
+        return list(self._tariffs[tariff_type])
+
+    def get(self, tariff_type: str = DEFAULT_TARIFF_TYPE, on: Optional[date] = None) -> Tariff:
+        """
+        取得指定日期適用的費率
+
+        Args:
+            tariff_type: 電價種類
+            on: 日期，預設為今日
+
+        Raises:
+            ValueError: 電價種類不存在或該日期沒有適用的費率時
+        """
+        if tariff_type not in self._tariffs:
+            raise ValueError(f"未知的電價種類: {tariff_type}")
+        versions = self._tariffs[tariff_type]
+        on = on or _today()
+        idx = bisect.bisect_right(self._effective_dates[tariff_type], on) - 1
+        if idx < 0:
+            raise ValueError(f"{on} 沒有適用的 {tariff_type} 費率")
+        return versions[idx]
+
+    def compile_terms(
+        self,
+        billing_months: Sequence[date],
+        tariff_type: str = DEFAULT_TARIFF_TYPE
+    ) -> MonthlyTerms:
+        """
+        將多個計費月份 (可跨越費率調整) 編譯成逐月的計費向量
+
+        以各月份的日期查出適用的版本，再以 (版本, 月份) 索引查表，
+        不需逐月判斷費率。
+
+        Args:
+            billing_months: 各計費月份的日期 (任一天皆可)
+            tariff_type: 電價種類
+
+        Returns:
+            長度與 billing_months 相同的 MonthlyTerms
+        """
+        versions = self.versions(tariff_type)
+        ordinals = np.array([t.effective_date.toordinal() for t in versions])
+        month_ordinals = np.array([d.toordinal() for d in billing_months], dtype=np.int64)
+        month_idx = np.array([d.month - 1 for d in billing_months], dtype=np.intp)
+
+        version_idx = np.searchsorted(ordinals, month_ordinals, side='right') - 1
+        if np.any(version_idx < 0):
+            first = billing_months[int(np.flatnonzero(version_idx < 0)[0])]
+            raise ValueError(f"{first} 沒有適用的 {tariff_type} 費率")
+
+        def table(name: str) -> np.ndarray:
+            return np.stack([getattr(t.terms, name) for t in versions])[version_idx, month_idx]
+
+        return MonthlyTerms(
+            rates=table('rates'),
+            allowances=table('allowances'),
+            within_multipliers=table('within_multipliers'),
+            over_multipliers=table('over_multipliers'),
+        )
+
+
+TARIFF_REGISTRY = TariffRegistry()
+
+# 目前的低壓電力非時間電價。較早的歷史費率尚未整理，先以 date.min 作為生效日，
+# 日後登錄新費率時只需加上新的版本與生效日。
+TARIFF_REGISTRY.register(Tariff(
+    tariff_type=LV_DEMAND_NON_TOU,
+    effective_date=date.min,
+    version="lv-demand-non-tou-v1",
+    summer_rate=236.2,
+    non_summer_rate=173.2,
+    summer_energy_rate=3.44,
+    non_summer_energy_rate=3.26,
+))
+
+
+def get_tariff(tariff_type: str = DEFAULT_TARIFF_TYPE, on: Optional[date] = None) -> Tariff:
+    """取得指定日期 (預設今日) 適用的費率"""
+    return TARIFF_REGISTRY.get(tariff_type, on)
+
+
+def compile_terms(billing_months: Sequence[date],
+                  tariff_type: str = DEFAULT_TARIFF_TYPE) -> MonthlyTerms:
+    """將多個計費月份編譯成逐月的計費向量 (見 TariffRegistry.compile_terms)"""
+    return TARIFF_REGISTRY.compile_terms(billing_months, tariff_type)
@@ -0,0 +1,380 @@
+"""
+時間電價 (多種契約容量) 計算與最佳化模組
+
+時間電價用戶同時擁有多種契約容量 (經常、半尖峰、週六半尖峰、離峰)，
+各時段的超約以「該時段及之前各種契約容量的合計」判定，因此各種容量
+必須一起最佳化。年度費用對累計容量為分段線性的凸函數，這裡把它寫成
+小型線性規劃 (LP) 以對偶單形法求解，再以局部搜尋取得整數容量。
+"""
+import itertools
+from dataclasses import dataclass
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.tariffs import SUMMER_MONTHS
+
+
+# 時段名稱 (依超約判定的累計順序排列)
+TOU_PERIODS = ("經常(尖峰)", "半尖峰", "週六半尖峰", "離峰")
+
+
+@dataclass(frozen=True)
+class TOUTariff:
+    """
+    時間電價的基本電費費率
+
+    Args:
+        name: 費率名稱 (同時作為快取 key 的版本)
+        periods: 各種契約容量的名稱
+        summer_rates: 夏月各種契約的基本電費 (元/千瓦)
+        non_summer_rates: 非夏月各種契約的基本電費 (元/千瓦)
+        allowance: 超約 2 倍計費的容許比例 (以經常契約容量計)
+    """
+    name: str
+    periods: Tuple[str, ...]
+    summer_rates: Tuple[float, ...]
+    non_summer_rates: Tuple[float, ...]
+    allowance: float = 0.10
+
+    def __post_init__(self):
+        if len(self.summer_rates) != len(self.periods) or len(self.non_summer_rates) != len(self.periods):
+            raise ValueError("費率數量必須與契約種類數量相同")
+        for rates in (self.summer_rates, self.non_summer_rates):
+            if any(rate < 0 for rate in rates):
+                raise ValueError("費率不能為負數")
+            # 費率需逐時段遞減，累計容量的成本係數才不會為負，LP 才能以對偶單形法直接求解
+            if any(later > earlier for earlier, later in zip(rates, rates[1:])):
+                raise ValueError("各時段契約費率必須依序遞減 (不可高於前一時段)")
+
+    @property
+    def monthly_rates(self) -> np.ndarray:
+        """形狀為 (12, P) 的各月各契約費率"""
+        return np.array([
+            self.summer_rates if month in SUMMER_MONTHS else self.non_summer_rates
+            for month in range(1, 13)
+        ], dtype=float)
+
+
+# 低壓二段式時間電價 (費率依台電電價表，調整時需一併更新 name)
+LV_TOU_TARIFF = TOUTariff(
+    name="lv-demand-tou-v1",
+    periods=TOU_PERIODS,
+    summer_rates=(236.2, 173.2, 47.2, 47.2),
+    non_summer_rates=(173.2, 173.2, 47.2, 47.2),
+)
+
+
+def _check_demands(monthly_demands: Sequence[Sequence[float]], tariff: TOUTariff) -> np.ndarray:
+    """檢查並轉換各月各時段需量為 (12, P) 陣列"""
+    demands = np.asarray(monthly_demands, dtype=float)
+    if demands.shape != (12, len(tariff.periods)):
+        raise ValueError(f"必須提供 12 個月、每月 {len(tariff.periods)} 個時段的需量資料")
+    if not np.all(np.isfinite(demands)):
+        raise ValueError("需量必須為有效數字")
+    if np.any(demands < 0):
+        raise ValueError("需量不能為負數")
+    return demands
+
+
+def _fees_from_cumulative(
+    cumulative: np.ndarray,
+    demands: np.ndarray,
+    tariff: TOUTariff
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    以累計容量計算各月基本電費與罰款
+
+    Args:
+        cumulative: 形狀為 (N, P) 的累計容量 (千瓦)，需逐時段遞增
+        demands: 形狀為 (12, P) 的需量 (千瓦)
+        tariff: 時間電價費率
+
+    Returns:
+        (基本電費矩陣, 罰款矩陣) 的元組，形狀皆為 (N, 12) (元)
+    """
+    rates = tariff.monthly_rates
+    contracts = np.diff(cumulative, axis=-1, prepend=0.0)
+    basic = contracts @ rates.T
+
+    # 各月超約量取各時段超出累計容量的最大值，罰款以經常契約費率計算
+    excess = np.max(demands[np.newaxis, :, :] - cumulative[:, np.newaxis, :], axis=-1)
+    excess = np.maximum(excess, 0.0)
+    allowed = cumulative[:, :1] * tariff.allowance
+    regular_rate = rates[np.newaxis, :, 0]
+    penalty = (excess * regular_rate * 2 +
+               np.maximum(excess - allowed, 0.0) * regular_rate)
+
+    return basic, penalty
+
+
+def calculate_tou_fee_matrix(
+    contracts: Sequence[Sequence[float]],
+    monthly_demands: Sequence[Sequence[float]],
+    tariff: TOUTariff = LV_TOU_TARIFF
+) -> np.ndarray:
+    """
+    一次計算多組契約容量在各月份的基本電費 (含超約罰款)
+
+    Args:
+        contracts: 形狀為 (N, P) 的各種契約容量 (千瓦)
+        monthly_demands: 形狀為 (12, P) 的各月各時段最高需量 (千瓦)
+        tariff: 時間電價費率
+
+    Returns:
+        形狀為 (N, 12) 的基本電費矩陣 (元)
+    """
+    demands = _check_demands(monthly_demands, tariff)
+    contracts = np.atleast_2d(np.asarray(contracts, dtype=float))
+    if contracts.shape[-1] != len(tariff.periods):
+        raise ValueError(f"必須提供 {len(tariff.periods)} 種契約容量")
+
+    basic, penalty = _fees_from_cumulative(np.cumsum(contracts, axis=-1), demands, tariff)
+    return basic + penalty
+
+
+def calculate_tou_annual_fee(
+    contracts: Sequence[float],
+    monthly_demands: Sequence[Sequence[float]],
+    tariff: TOUTariff = LV_TOU_TARIFF
+) -> Tuple[float, Dict[str, float]]:
+    """
+    計算時間電價的年度基本電費總額
+
+    Args:
+        contracts: 各種契約容量 (千瓦)，順序同 tariff.periods
+        monthly_demands: 形狀為 (12, P) 的各月各時段最高需量 (千瓦)
+        tariff: 時間電價費率
+
+    Returns:
+        (年度基本電費總額, 詳細資訊字典) 的元組
+        詳細資訊包含: basic (契約基本電費), penalty (超約罰款)
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    values = np.asarray(contracts, dtype=float)
+    if values.shape != (len(tariff.periods),):
+        raise ValueError(f"必須提供 {len(tariff.periods)} 種契約容量")
+    if values[0] <= 0:
+        raise ValueError("經常契約容量必須大於 0")
+    if np.any(values < 0):
+        raise ValueError("契約容量不能為負數")
+
+    demands = _check_demands(monthly_demands, tariff)
+    basic, penalty = _fees_from_cumulative(np.cumsum(values)[np.newaxis, :], demands, tariff)
+    basic_total = float(basic.sum())
+    penalty_total = float(penalty.sum())
+
+    return basic_total + penalty_total, {'basic': basic_total, 'penalty': penalty_total}
+
+
+def _dual_simplex(
+    costs: np.ndarray,
+    constraints: np.ndarray,
+    bounds: np.ndarray,
+    tol: float = 1e-9
+) -> np.ndarray:
+    """
+    以對偶單形法求解 min c·x, s.t. A x >= b, x >= 0 (c 需全為非負)
+
+    c >= 0 時以鬆弛變數為初始基底即為對偶可行解，不需第一階段。
+
+    Args:
+        costs: 目標函數係數 c，長度 n
+        constraints: 限制式係數 A，形狀 (k, n)
+        bounds: 限制式右側 b，長度 k
+
+    Returns:
+        最佳解 x
+
+    Raises:
+        ValueError: 限制式無可行解時
+        RuntimeError: 超過迭代上限時
+    """
+    rows, cols = constraints.shape
+    # 改寫為 -A x + s = -b，基底為 s
+    tableau = np.hstack([-constraints, np.eye(rows), -bounds[:, np.newaxis]])
+    reduced = np.concatenate([costs, np.zeros(rows)])
+    basis = np.arange(cols, cols + rows)
+
+    for _ in range(50 * (rows + cols)):
+        rhs = tableau[:, -1]
+        leaving = int(np.argmin(rhs))
+        if rhs[leaving] >= -tol:
+            solution = np.zeros(cols + rows)
+            solution[basis] = rhs
+            return solution[:cols]
+
+        row = tableau[leaving, :-1]
+        eligible = np.flatnonzero(row < -tol)
+        if eligible.size == 0:
+            raise ValueError("限制式無可行解")
+
+        # 比值相同時選索引最小的變數，避免退化時循環
+        ratios = reduced[eligible] / -row[eligible]
+        entering = int(eligible[np.flatnonzero(ratios <= ratios.min() + tol)[0]])
+
+        tableau[leaving] /= tableau[leaving, entering]
+        column = tableau[:, entering].copy()
+        column[leaving] = 0.0
+        tableau -= np.outer(column, tableau[leaving])
+        reduced = reduced - reduced[entering] * tableau[leaving, :-1]
+        basis[leaving] = entering
+
+    raise RuntimeError("線性規劃超過迭代上限")
+
+
+def _solve_tou_lp(demands: np.ndarray, tariff: TOUTariff) -> np.ndarray:
+    """
+    以線性規劃求出連續的最佳累計容量
+
+    變數為累計容量 C_p、各月超約量 E_m 與超過容許範圍的超約量 F_m:
+        min  Σ_p (R_p - R_{p+1}) C_p + Σ_m r_m (2 E_m + F_m)
+        s.t. E_m >= D_mp - C_p,  F_m >= E_m - allowance * C_0,  C_p >= C_{p-1}
+    其中 R_p 為第 p 種契約的全年費率合計、r_m 為當月經常契約費率。
+
+    Returns:
+        長度 P 的累計容量
+    """
+    rates = tariff.monthly_rates
+    months, periods = demands.shape
+    annual = rates.sum(axis=0)
+    regular = rates[:, 0]
+
+    n_vars = periods + 2 * months
+    e_idx = periods + np.arange(months)
+    f_idx = periods + months + np.arange(months)
+    costs = np.concatenate([annual - np.append(annual[1:], 0.0), regular * 2, regular])
+
+    constraints = []
+    bounds = []
+    for month in range(months):
+        for period in range(periods):
+            row = np.zeros(n_vars)
+            row[period] = 1.0
+            row[e_idx[month]] = 1.0
+            constraints.append(row)
+            bounds.append(demands[month, period])
+
+        row = np.zeros(n_vars)
+        row[f_idx[month]] = 1.0
+        row[e_idx[month]] = -1.0
+        row[0] = tariff.allowance
+        constraints.append(row)
+        bounds.append(0.0)
+
+    for period in range(1, periods):
+        row = np.zeros(n_vars)
+        row[period] = 1.0
+        row[period - 1] = -1.0
+        constraints.append(row)
+        bounds.append(0.0)
+
+    solution = _dual_simplex(costs, np.array(constraints), np.array(bounds))
+    return np.maximum.accumulate(solution[:periods])
+
+
+def _annual_totals(cumulative: np.ndarray, demands: np.ndarray, tariff: TOUTariff) -> np.ndarray:
+    """計算多組累計容量的年度費用總額"""
+    basic, penalty = _fees_from_cumulative(cumulative, demands, tariff)
+    return (basic + penalty).sum(axis=-1)
+
+
+def _pick_best(candidates: np.ndarray, fees: np.ndarray) -> int:
+    """選出費用最低的候選值，費用相同時選擇總容量較小者"""
+    lowest = fees.min()
+    ties = np.flatnonzero(fees <= lowest + 1e-9 * max(1.0, abs(lowest)))
+    return int(ties[np.argmin(candidates[ties, -1])])
+
+
+def _round_to_grid(
+    cumulative: np.ndarray,
+    demands: np.ndarray,
+    tariff: TOUTariff,
+    step: float
+) -> np.ndarray:
+    """
+    將連續解調整到 step 的倍數
+
+    先評估各累計容量取上下格點的所有組合，再以單一容量或一段連續
+    容量 ±step 的移動做局部搜尋，直到費用不再下降。
+    """
+    periods = cumulative.shape[0]
+    lower = np.maximum(np.floor(np.round(cumulative / step, 9)), 0)
+    choices = [(lower[p], lower[p] + 1) for p in range(periods)]
+    units = np.array(list(itertools.product(*choices)))
+    units[:, 0] = np.maximum(units[:, 0], 1)
+    units = np.maximum.accumulate(units, axis=-1)
+
+    fees = _annual_totals(units * step, demands, tariff)
+    best = units[_pick_best(units, fees)]
+    best_fee = _annual_totals(best[np.newaxis, :] * step, demands, tariff)[0]
+
+    # 移動單一累計容量，或同時移動第 p 種以後的所有累計容量
+    moves = []
+    for start in range(periods):
+        for stop in range(start + 1, periods + 1):
+            for sign in (-1, 1):
+                move = np.zeros(periods)
+                move[start:stop] = sign
+                moves.append(move)
+    moves = np.array(moves)
+
+    while True:
+        neighbours = best[np.newaxis, :] + moves
+        feasible = (neighbours[:, 0] >= 1) & np.all(np.diff(neighbours, axis=-1) >= 0, axis=-1)
+        neighbours = neighbours[feasible]
+        fees = _annual_totals(neighbours * step, demands, tariff)
+        idx = _pick_best(neighbours, fees)
+        improved = fees[idx] < best_fee - 1e-9 * max(1.0, abs(best_fee))
+        same_fee_smaller = (abs(fees[idx] - best_fee) <= 1e-9 * max(1.0, abs(best_fee))
+                            and neighbours[idx, -1] < best[-1])
+        if not (improved or same_fee_smaller):
+            return best * step
+        best, best_fee = neighbours[idx], fees[idx]
+
+
+def find_optimal_tou_capacities(
+    monthly_demands: Sequence[Sequence[float]],
+    tariff: TOUTariff = LV_TOU_TARIFF,
+    step: Optional[float] = 1
+) -> Tuple[List[float], float, Dict[str, float]]:
+    """
+    尋找時間電價的最佳契約容量組合
+
+    求解時間與用戶規模無關 (LP 只有 P + 24 個變數)。
+
+    Args:
+        monthly_demands: 形狀為 (12, P) 的各月各時段最高需量 (千瓦)，
+                         時段順序同 tariff.periods
+        tariff: 時間電價費率
+        step: 容量級距 (千瓦)，預設 1 千瓦；None 表示不限制
+
+    Returns:
+        (各種契約容量列表, 最低年度費用, 詳細資訊字典) 的元組
+        詳細資訊包含: basic (契約基本電費), penalty (超約罰款)
+
+    Raises:
+        ValueError: 當輸入不合理時
+    """
+    if step is not None and step <= 0:
+        raise ValueError("容量級距必須大於 0")
+
+    demands = _check_demands(monthly_demands, tariff)
+    cumulative = _solve_tou_lp(demands, tariff)
+
+    if step is None:
+        if cumulative[0] <= 0:
+            raise ValueError("需量全為 0 時無法決定最佳契約容量，請指定容量級距")
+    else:
+        cumulative = _round_to_grid(cumulative, demands, tariff, step)
+
+    contracts = np.round(np.diff(cumulative, prepend=0.0), 10)
+    if step is not None and float(step).is_integer():
+        values = [int(round(c)) for c in contracts]
+    else:
+        values = [float(c) for c in contracts]
+
+    fee, details = calculate_tou_annual_fee(values, demands, tariff)
+    return values, fee, details
@@ -1,7 +1,11 @@
 """
 輸入驗證模組
 """
-from typing import List, Tuple, Optional
+from dataclasses import dataclass
+from enum import IntFlag
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 
 class ValidationError(Exception):
@@ -9,6 +13,212 @@ class ValidationError(Exception):
     pass
 
 
+# 需量與契約容量的上限 (千瓦)
+MAX_KW = 10000
+
+
+class ValidationCode(IntFlag):
+    """
+    結構化的驗證結果代碼 (可用 | 組合)
+
+    逐月代碼: NEGATIVE_DEMAND, DEMAND_TOO_LARGE, DEMAND_OVER_CAPACITY, NON_FINITE
+    逐列代碼: ALL_UNDER_HALF, LARGE_SPREAD, CAPACITY_NOT_POSITIVE, CAPACITY_TOO_LARGE, NON_FINITE
+    """
+    NONE = 0
+    NEGATIVE_DEMAND = 1
+    DEMAND_TOO_LARGE = 2
+    DEMAND_OVER_CAPACITY = 4
+    ALL_UNDER_HALF = 8
+    LARGE_SPREAD = 16
+    CAPACITY_NOT_POSITIVE = 32
+    CAPACITY_TOO_LARGE = 64
+    NON_FINITE = 128  # NaN 或 ±Infinity
+
+
+# 會使輸入無效的代碼，其餘代碼僅為警告
+ERROR_CODES = (
+    ValidationCode.NEGATIVE_DEMAND | ValidationCode.DEMAND_TOO_LARGE
+    | ValidationCode.CAPACITY_NOT_POSITIVE | ValidationCode.CAPACITY_TOO_LARGE
+    | ValidationCode.NON_FINITE
+)
+
+
+def _demand_codes(demands: np.ndarray) -> np.ndarray:
+    """逐元素檢查需量，回傳相同形狀的代碼陣列"""
+    codes = np.where(demands < 0, ValidationCode.NEGATIVE_DEMAND, 0)
+    codes |= np.where(demands > MAX_KW, ValidationCode.DEMAND_TOO_LARGE, 0)
+    codes |= np.where(~np.isfinite(demands), ValidationCode.NON_FINITE, 0)
+    return codes.astype(np.uint8)
+
+
+def _capacity_codes(capacities: np.ndarray) -> np.ndarray:
+    """逐元素檢查契約容量，回傳相同形狀的代碼陣列"""
+    codes = np.where(capacities <= 0, ValidationCode.CAPACITY_NOT_POSITIVE, 0)
+    codes |= np.where(capacities > MAX_KW, ValidationCode.CAPACITY_TOO_LARGE, 0)
+    codes |= np.where(~np.isfinite(capacities), ValidationCode.NON_FINITE, 0)
+    return codes.astype(np.uint8)
+
+
+def _format_demand_error(code: int, month: int) -> str:
+    if code & ValidationCode.NON_FINITE:
+        return f"{month}月需量必須為有效數字"
+    if code & ValidationCode.NEGATIVE_DEMAND:
+        return f"{month}月需量不能為負數"
+    return f"{month}月需量過大 (超過 10,000 kW)，請確認輸入是否正確"
+
+
+def _format_capacity_error(code: int) -> str:
+    if code & ValidationCode.NON_FINITE:
+        return "契約容量必須為有效數字"
+    if code & ValidationCode.CAPACITY_NOT_POSITIVE:
+        return "契約容量必須大於 0"
+    return "契約容量過大 (超過 10,000 kW)，請確認輸入是否正確"
+
+
+@dataclass(frozen=True)
+class ValidationReport:
+    """
+    批次驗證結果
+
+    所有檢查都已在建立時以遮罩算好，訊息只有在呼叫 error_message /
+    warning_messages 時才逐列格式化。
+
+    Attributes:
+        demands: 形狀為 (N, 12) 的需量矩陣 (千瓦)
+        capacities: 長度 N 的契約容量 (千瓦)，未提供時為 None
+        warning_threshold: 需量超過契約容量的警告倍數
+        month_codes: 形狀為 (N, 12) 的逐月代碼
+        row_codes: 長度 N 的逐列代碼
+    """
+    demands: np.ndarray
+    capacities: Optional[np.ndarray]
+    warning_threshold: float
+    month_codes: np.ndarray
+    row_codes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.row_codes)
+
+    def _combined_codes(self) -> np.ndarray:
+        return np.bitwise_or.reduce(self.month_codes, axis=1) | self.row_codes
+
+    @property
+    def valid(self) -> np.ndarray:
+        """各列是否有效 (沒有錯誤代碼，警告不影響)"""
+        return (self._combined_codes() & ERROR_CODES) == 0
+
+    @property
+    def has_warnings(self) -> np.ndarray:
+        """各列是否有警告"""
+        return (self._combined_codes() & ~ERROR_CODES) != 0
+
+    def codes(self, row: int) -> ValidationCode:
+        """單列所有代碼的組合"""
+        return ValidationCode(int(np.bitwise_or.reduce(self.month_codes[row]) | self.row_codes[row]))
+
+    def error_message(self, row: int) -> Optional[str]:
+        """單列的第一個錯誤訊息 (先檢查契約容量，再依月份順序)，無錯誤時為 None"""
+        row_code = int(self.row_codes[row])
+        if row_code & ERROR_CODES:
+            return _format_capacity_error(row_code)
+
+        errors = np.flatnonzero(self.month_codes[row] & ERROR_CODES)
+        if len(errors):
+            month_idx = int(errors[0])
+            return _format_demand_error(int(self.month_codes[row, month_idx]), month_idx + 1)
+        return None
+
+    def warning_messages(self, row: int) -> List[str]:
+        """單列的警告訊息列表"""
+        warnings = []
+        demands = self.demands[row]
+        threshold = self.warning_threshold
+
+        for month_idx in np.flatnonzero(self.month_codes[row] & ValidationCode.DEMAND_OVER_CAPACITY):
+            warnings.append(
+                f"⚠️ {month_idx + 1}月需量 ({demands[month_idx]:.1f} kW) 超過契約容量 {threshold} 倍，"
+                f"將產生高額罰款，建議重新確認輸入是否正確"
+            )
+
+        row_code = int(self.row_codes[row])
+        if row_code & ValidationCode.ALL_UNDER_HALF:
+            warnings.append(
+                f"ℹ️ 所有月份需量都低於契約容量的 50%，"
+                f"建議可考慮調降契約容量以節省基本電費"
+            )
+        if row_code & ValidationCode.LARGE_SPREAD:
+            warnings.append(
+                f"ℹ️ 最高需量 ({demands.max():.1f} kW) 與最低需量 ({demands.min():.1f} kW) "
+                f"差異較大，可能是夏季與非夏季用電差異所致"
+            )
+        return warnings
+
+
+def _build_report(
+    demands: np.ndarray,
+    capacities: Optional[np.ndarray],
+    warning_threshold: float
+) -> ValidationReport:
+    """以一次陣列運算計算所有檢查"""
+    month_codes = _demand_codes(demands)
+    row_codes = np.zeros(demands.shape[0], dtype=np.uint8)
+
+    max_demands = demands.max(axis=1)
+    min_demands = demands.min(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        large_spread = (max_demands > 0) & (min_demands > 0) & (max_demands / min_demands > 3)
+    row_codes[large_spread] |= np.uint8(ValidationCode.LARGE_SPREAD)
+
+    if capacities is not None:
+        over = demands > capacities[:, np.newaxis] * warning_threshold
+        month_codes[over] |= np.uint8(ValidationCode.DEMAND_OVER_CAPACITY)
+        row_codes[max_demands < capacities * 0.5] |= np.uint8(ValidationCode.ALL_UNDER_HALF)
+        row_codes |= _capacity_codes(capacities)
+
+    return ValidationReport(
+        demands=demands,
+        capacities=capacities,
+        warning_threshold=warning_threshold,
+        month_codes=month_codes,
+        row_codes=row_codes,
+    )
+
+
+def validate_portfolio(
+    monthly_demands: Union[np.ndarray, Sequence[Sequence[float]]],
+    capacities: Optional[Union[np.ndarray, Sequence[float]]] = None,
+    warning_threshold: float = 2.0
+) -> ValidationReport:
+    """
+    一次驗證多個用戶 (電表) 的需量與契約容量
+
+    檢查項目與單筆驗證相同：需量為負數、超過 10,000 kW 或不是有限數字 (錯誤)、
+    需量超過契約容量 warning_threshold 倍、所有月份低於契約容量 50%、
+    最高與最低需量相差 3 倍以上 (警告)；提供契約容量時也檢查容量本身。
+
+    Args:
+        monthly_demands: 形狀為 (N, 12) 的需量矩陣 (千瓦)
+        capacities: 長度 N 的契約容量 (千瓦)，None 表示只檢查需量
+        warning_threshold: 警告閾值倍數
+
+    Returns:
+        ValidationReport 結果物件
+
+    Raises:
+        ValueError: 當輸入形狀不合理時
+    """
+    demands = np.asarray(monthly_demands, dtype=float)
+    if demands.ndim != 2 or demands.shape[1] != 12:
+        raise ValueError("需量矩陣的形狀必須為 (N, 12)")
+
+    if capacities is not None:
+        capacities = np.asarray(capacities, dtype=float)
+        if capacities.shape != (demands.shape[0],):
+            raise ValueError("契約容量數量必須與需量資料列數相同")
+
+    return _build_report(demands, capacities, warning_threshold)
+
+
 def validate_capacity(capacity: float) -> Tuple[bool, Optional[str]]:
     """
     驗證契約容量輸入
@@ -19,11 +229,9 @@ def validate_capacity(capacity: float) -> Tuple[bool, Optional[str]]:
     Returns:
         (是否有效, 錯誤訊息)
     """
-    if capacity <= 0:
-        return False, "契約容量必須大於 0"
-
-    if capacity > 10000:
-        return False, "契約容量過大 (超過 10,000 kW)，請確認輸入是否正確"
+    code = int(_capacity_codes(np.asarray(capacity, dtype=float)))
+    if code:
+        return False, _format_capacity_error(code)
 
     return True, None
 
@@ -39,11 +247,9 @@ def validate_demand(demand: float, month: int) -> Tuple[bool, Optional[str]]:
     Returns:
         (是否有效, 錯誤訊息)
     """
-    if demand < 0:
-        return False, f"{month}月需量不能為負數"
-
-    if demand > 10000:
-        return False, f"{month}月需量過大 (超過 10,000 kW)，請確認輸入是否正確"
+    code = int(_demand_codes(np.asarray(demand, dtype=float)))
+    if code:
+        return False, _format_demand_error(code, month)
 
     return True, None
 
@@ -61,11 +267,9 @@ def validate_monthly_demands(monthly_demands: List[float]) -> Tuple[bool, Option
     if len(monthly_demands) != 12:
         return False, f"必須提供 12 個月的資料，目前只有 {len(monthly_demands)} 個月"
 
-    for i, demand in enumerate(monthly_demands):
-        month = i + 1
-        is_valid, error_msg = validate_demand(demand, month)
-        if not is_valid:
-            return False, error_msg
+    error_msg = validate_portfolio([monthly_demands]).error_message(0)
+    if error_msg:
+        return False, error_msg
 
     return True, None
 
@@ -86,34 +290,12 @@ def validate_demand_vs_capacity(
     Returns:
         (是否有效, 錯誤訊息, 警告訊息列表)
     """
-    warnings = []
-
-    # 檢查是否有月份的需量遠超過契約容量
-    for i, demand in enumerate(monthly_demands):
-        month = i + 1
-        if demand > capacity * warning_threshold:
-            warnings.append(
-                f"⚠️ {month}月需量 ({demand:.1f} kW) 超過契約容量 {warning_threshold} 倍，"
-                f"將產生高額罰款，建議重新確認輸入是否正確"
-            )
-
-    # 檢查是否所有月份的需量都遠低於契約容量
-    max_demand = max(monthly_demands)
-    if max_demand < capacity * 0.5:
-        warnings.append(
-            f"ℹ️ 所有月份需量都低於契約容量的 50%，"
-            f"建議可考慮調降契約容量以節省基本電費"
-        )
-
-    # 檢查需量變化是否過大
-    min_demand = min(monthly_demands)
-    if max_demand > 0 and min_demand > 0 and (max_demand / min_demand) > 3:
-        warnings.append(
-            f"ℹ️ 最高需量 ({max_demand:.1f} kW) 與最低需量 ({min_demand:.1f} kW) "
-            f"差異較大，可能是夏季與非夏季用電差異所致"
-        )
-
-    return True, None, warnings
+    report = _build_report(
+        np.asarray([monthly_demands], dtype=float),
+        np.asarray([capacity], dtype=float),
+        warning_threshold
+    )
+    return True, None, report.warning_messages(0)
 
 
 def get_reasonable_capacity_range(monthly_demands: List[float]) -> Tuple[int, int]: